@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""Memory benchmark: size of parsed documents.
+
+Reports the memory used by the objects of a parsed document, i.e.
+all python objects reachable from the `fig.File` (each counted once,
+so that shared values like interned styles are only counted once).
+Where the `resource` module is available, the increase of the peak
+resident set size while parsing is reported, too (each file is parsed
+in a forked child process, so that the peaks of earlier runs do not
+hide it).
+
+Without arguments, a gnuplot-like document (many short polylines in a
+few styles) is generated and measured."""
+
+import sys, os, gc, time, random, tempfile, cPickle
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "figpy"))
+import fig
+
+try:
+	import resource
+except ImportError:
+	resource = None
+
+def documentSize(root):
+	"""Return the summed sys.getsizeof() of all objects reachable
+	from `root` (except for types and modules)."""
+	seen = set()
+	total = 0
+	todo = [root]
+	while todo:
+		o = todo.pop()
+		if id(o) in seen or isinstance(o, (type, type(sys))):
+			continue
+		seen.add(id(o))
+		total += sys.getsizeof(o)
+		todo.extend(gc.get_referents(o))
+	return total
+
+def gnuplotLike(filename, count, seed = 42):
+	"""Write a document with `count` polylines like those of a gnuplot
+	export (data curves with a few line styles and colors)."""
+	rnd = random.Random(seed)
+	f = fig.File()
+	colors = [f.getColor((rnd.randint(0, 255), rnd.randint(0, 255), rnd.randint(0, 255)))
+			  for i in range(8)]
+	x = 0
+	for i in xrange(count):
+		points = []
+		for j in range(rnd.randint(2, 6)):
+			x = (x + 15) % 12000
+			points.append((1200 + x, 1200 + rnd.randint(0, 600) * 15))
+		p = fig.Polyline(points)
+		p.penColor = colors[i % len(colors)]
+		p.depth = 500 + i % 4
+		p.lineStyle = fig.LineStyle.Dashed
+		p.styleValue = 4.0
+		f.append(p)
+	f.save(filename)
+
+def peakRSS():
+	"""Return the peak resident set size of this process in bytes, or
+	None if the `resource` module is not available."""
+	if resource is None:
+		return None
+	result = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform != "darwin":
+		result *= 1024 # kilobytes on Linux
+	return result
+
+def _measure(filename, **kwargs):
+	gc.collect()
+	before = peakRSS()
+	start = time.time()
+	f = fig.File(filename, **kwargs)
+	duration = time.time() - start
+	peak = None
+	if before is not None:
+		peak = peakRSS() - before
+	size = documentSize(f)
+	objects = len(list(f.allObjects()))
+	return duration, size, peak, objects
+
+def inChild(function, *args, **kwargs):
+	"""Return the result of calling `function` in a forked child
+	process (if possible), so that its memory usage does not raise
+	the peak RSS of this process."""
+	if not hasattr(os, "fork"):
+		return function(*args, **kwargs)
+	readEnd, writeEnd = os.pipe()
+	pid = os.fork()
+	if not pid:
+		os.close(readEnd)
+		status = 1
+		try:
+			with os.fdopen(writeEnd, "wb") as output:
+				cPickle.dump(function(*args, **kwargs), output, 2)
+			status = 0
+		finally:
+			os._exit(status)
+	os.close(writeEnd)
+	with os.fdopen(readEnd, "rb") as resultFile:
+		data = resultFile.read()
+	os.waitpid(pid, 0)
+	if not data:
+		raise RuntimeError("%s() failed in child process" % function.__name__)
+	return cPickle.loads(data)
+
+def measure(filename, **kwargs):
+	"""Parse `filename` (passing `kwargs` to `fig.File`) and return
+	the parse duration, the `documentSize`, the increase of the peak
+	RSS (or None), and the number of objects."""
+	return inChild(_measure, filename, **kwargs)
+
+def main(args):
+	if not args:
+		fd, filename = tempfile.mkstemp(".fig")
+		os.close(fd)
+		inChild(gnuplotLike, filename, 100000)
+		args = [filename]
+	else:
+		filename = None
+	try:
+		for path in args:
+			for compactPoints in (False, True):
+				duration, size, peak, objects = measure(
+					path, compactPoints = compactPoints)
+				print "%s%s: %d objects, parsed in %.2fs, %.1f MB (%d bytes/object)%s" % (
+					os.path.basename(path),
+					compactPoints and " (compactPoints)" or "",
+					objects, duration, size / 1e6, size / max(objects, 1),
+					peak is not None and ", peak RSS +%.1f MB" % (peak / 1e6) or "")
+	finally:
+		if filename:
+			os.remove(filename)
+
+if __name__ == "__main__":
+	main(sys.argv[1:])
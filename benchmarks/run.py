@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+"""Runs the figpy benchmarks on generated figures and saves the
+timings as JSON, e.g.::
+
+  benchmarks/run.py -o before.json
+  ...
+  benchmarks/run.py -o after.json --compare before.json
+
+Each benchmark is a function decorated with `benchmark`; it is given
+a `Workload` and returns the function to be timed.  With ``--large``,
+all benchmarks are run on a figure with 10**6 objects, too (which
+takes a long time)."""
+
+import sys, os, time, copy, json, random, platform, subprocess, tempfile, shutil
+from optparse import OptionParser
+
+import workloads
+fig = workloads.fig
+
+figpyDir = os.path.dirname(os.path.abspath(fig.__file__))
+
+class Workload(object):
+	"""Generated figure with a given number of objects, saved into
+	a temporary directory."""
+
+	def __init__(self, count, directory, seed = 0):
+		self.count = count
+		self.directory = directory
+		self.filename = os.path.join(directory, "objects%d.fig" % count)
+		workloads.generate(self.filename, count, seed)
+		self._document = None
+
+	def document(self):
+		"""Return the parsed figure (parsed only once, so benchmarks
+		must not modify it)."""
+		if self._document is None:
+			self._document = fig.File(self.filename)
+		return self._document
+
+	def tempFilename(self, suffix):
+		return os.path.join(self.directory, "output%s" % suffix)
+
+benchmarks = []
+
+def benchmark(maxCount = None):
+	"""Decorator registering a benchmark; it is skipped for workloads
+	with more than `maxCount` objects (unless ``--large`` is given)."""
+	def register(setup):
+		benchmarks.append((setup.__name__, setup, maxCount))
+		return setup
+	return register
+
+@benchmark()
+def parse(workload):
+	return lambda: fig.File(workload.filename)
+
+@benchmark()
+def parseLazy(workload):
+	return lambda: fig.File(workload.filename, lazy = True)
+
+@benchmark()
+def str_(workload):
+	document = workload.document()
+	return lambda: str(document)
+
+@benchmark()
+def save(workload):
+	document = workload.document()
+	filename = workload.tempFilename(".fig")
+	return lambda: document.save(filename)
+
+@benchmark()
+def findObjects(workload):
+	document = workload.document()
+	def run():
+		document.findObjects(type = fig.Polyline, depth__range = (20, 30))
+		document.findObjects(fig.Query(type = fig.Text) | fig.Query(lineWidth__gt = 2))
+	return run
+
+@benchmark(maxCount = 10**5)
+def layers(workload):
+	document = workload.document()
+	def run():
+		for depth in document.layers():
+			document.layer(depth)
+	return run
+
+@benchmark()
+def layersIndexed(workload):
+	filename = workload.filename
+	def run():
+		document = fig.File(filename)
+		document.enableDepthIndex()
+		for depth in document.layers():
+			document.layer(depth)
+	return run
+
+@benchmark()
+def getColorSimilarity(workload):
+	document = workload.document()
+	rnd = random.Random(1)
+	colors = [(rnd.randint(0, 255), rnd.randint(0, 255), rnd.randint(0, 255))
+			  for i in range(1000)]
+	def run():
+		f = fig.File()
+		f.colors.extend(document.colors)
+		for color in colors:
+			f.getColor(color, similarity = 20)
+	return run
+
+@benchmark()
+def copyObjects(workload):
+	document = workload.document()
+	return lambda: fig.copyObjects(document, fig.File())
+
+@benchmark()
+def deepcopy(workload):
+	document = workload.document()
+	return lambda: copy.deepcopy(document)
+
+@benchmark(maxCount = 10**5)
+def fig2tikz(workload):
+	command = [sys.executable, os.path.join(figpyDir, "fig2tikz"), workload.filename]
+	output = workload.tempFilename(".tikz")
+	def run():
+		with open(output, "w") as outputFile:
+			subprocess.check_call(command, stdout = outputFile, cwd = figpyDir)
+	return run
+
+def timeit(function, repeat, minTime):
+	"""Call `function` up to `repeat` times (but at least once), stopping
+	early when the total time exceeds `minTime` seconds.  Returns the
+	list of durations."""
+	result = []
+	total = 0.0
+	while len(result) < repeat and (total < minTime or len(result) < 1):
+		start = time.time()
+		function()
+		duration = time.time() - start
+		result.append(duration)
+		total += duration
+	return result
+
+def gitCommit():
+	try:
+		return subprocess.check_output(
+			["git", "rev-parse", "--short", "HEAD"], cwd = figpyDir,
+			stderr = open(os.devnull, "w")).strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+def compare(results, baseline, threshold):
+	"""Print the ratios of the median times compared to `baseline`
+	(both lists of result dicts); returns the number of regressions,
+	i.e. ratios above 1 + `threshold`."""
+	baseline = dict(((r["benchmark"], r["objects"]), r["median"]) for r in baseline)
+	regressions = 0
+	for r in results:
+		before = baseline.get((r["benchmark"], r["objects"]))
+		if not before:
+			continue
+		ratio = r["median"] / before
+		flag = ""
+		if ratio > 1 + threshold:
+			flag = "  REGRESSION"
+			regressions += 1
+		print "%-20s %8d  %9.4fs -> %9.4fs  %5.2fx%s" % (
+			r["benchmark"], r["objects"], before, r["median"], ratio, flag)
+	return regressions
+
+def main():
+	op = OptionParser(
+		usage = "%prog [options]",
+		description = "Runs the figpy benchmarks on generated figures and writes the timings as JSON.")
+	op.add_option("-s", "--sizes", action = "store", default = "1000,10000,100000",
+				  help = "comma-separated object counts of the generated figures (default: %default; see --large)")
+	op.add_option("--large", action = "store_true", default = False,
+				  help = "also run all benchmarks (even those limited to smaller figures) with 1000000 objects, which is slow")
+	op.add_option("-b", "--benchmark", action = "append", dest = "names",
+				  help = "only run the given benchmark (may be given more than once)")
+	op.add_option("-r", "--repeat", action = "store", type = "int", default = 5,
+				  help = "maximum number of runs per benchmark (default: %default)")
+	op.add_option("--min-time", action = "store", type = "float", default = 1.0, dest = "minTime",
+				  help = "stop repeating a benchmark after this many seconds (default: %default)")
+	op.add_option("--seed", action = "store", type = "int", default = 0,
+				  help = "random seed for the generated figures (default: %default)")
+	op.add_option("-o", "--output", action = "store",
+				  help = "write results as JSON to this file")
+	op.add_option("-c", "--compare", action = "store",
+				  help = "compare with the results in this JSON file")
+	op.add_option("--threshold", action = "store", type = "float", default = 0.1,
+				  help = "relative slowdown reported as regression by --compare (default: %default)")
+	options, args = op.parse_args()
+
+	if args:
+		op.error("no arguments expected")
+	sizes = [int(size) for size in options.sizes.split(",")]
+	if options.large and 10**6 not in sizes:
+		sizes.append(10**6)
+	selected = [b for b in benchmarks
+				if not options.names or b[0].rstrip("_") in options.names]
+	if not selected:
+		op.error("no such benchmark (available: %s)" % ", ".join(
+			b[0].rstrip("_") for b in benchmarks))
+
+	results = []
+	directory = tempfile.mkdtemp(prefix = "figpy-benchmarks")
+	try:
+		for count in sizes:
+			workload = Workload(count, directory, options.seed)
+			for name, setup, maxCount in selected:
+				if maxCount is not None and count > maxCount and not options.large:
+					continue
+				times = timeit(setup(workload), options.repeat, options.minTime)
+				times.sort()
+				result = dict(benchmark = name.rstrip("_"), objects = count,
+							  times = times, min = times[0],
+							  median = times[len(times) // 2])
+				results.append(result)
+				print "%-20s %8d  %9.4fs (min %.4fs, %d runs)" % (
+					result["benchmark"], count, result["median"], result["min"], len(times))
+				sys.stdout.flush()
+			del workload
+	finally:
+		shutil.rmtree(directory)
+
+	if options.output:
+		with open(options.output, "w") as outputFile:
+			json.dump(dict(commit = gitCommit(),
+						   date = time.strftime("%Y-%m-%dT%H:%M:%S"),
+						   python = platform.python_version(),
+						   numpy = fig.numpy is not None and fig.numpy.__version__ or None,
+						   seed = options.seed,
+						   results = results),
+					  outputFile, indent = 1, separators = (",", ": "), sort_keys = True)
+
+	if options.compare:
+		print
+		with open(options.compare) as baselineFile:
+			baseline = json.load(baselineFile)
+		if compare(results, baseline["results"], options.threshold):
+			sys.exit(1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,18 @@
+"""Synthetic figures for the benchmarks.
+
+The figures are produced with the ``figgen`` tool, which writes a
+reproducible mix of polylines, polygons, splines, arcs, ellipses and
+texts, part of which is grouped into (nested) compounds."""
+
+import sys, os, subprocess
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "figpy"))
+import fig
+
+figgen = os.path.join(os.path.dirname(os.path.abspath(fig.__file__)), "figgen")
+
+def generate(filename, count, seed = 0, *options):
+	"""Write a figure with `count` random objects (not counting
+	compounds) to `filename`.  Further `options` are passed to
+	``figgen`` (e.g. "--nesting", "5")."""
+	subprocess.check_call([sys.executable, figgen, "-n", str(count),
+						   "-s", str(seed)] + list(options) + [filename])
@@ -3,15 +3,27 @@
 You can read fig files into a `File` object 'f' with::
 
   import fig
-  f = fig.File(filename) # or pass a file-like object"""
+  f = fig.File(filename) # or pass a file-like object
+
+For huge files, `iterObjects` reads the objects one at a time
+without building the whole document in memory, and `loadMany`
+reads many files in parallel worker processes.  Use `tracing` to
+find out where the time goes."""
 
 __author__ = "Hans Meine <hans_meine@gmx.net>"
 __version__ = "0.9"
 
-import sys, re, math, os, operator, copy
+import sys, re, math, os, operator, copy, copy_reg, array, tempfile
+import hashlib, shutil, marshal, itertools, gc, time, types
+import collections, contextlib
 
 from named_constants import Constants
 
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
 class FigConstants(Constants):
     @classmethod
     def read(cls, i):
@@ -380,24 +392,214 @@ paperSizes = ["Letter", "Legal", "Ledger", "Tabloid",
 unitCM = 450
 """fig units per centimeter (used for positions, radii, ...)"""
 
+def _reduceNamedConstant(constant):
+	"""Pickle/copy support for the named constants above: the very
+	same constant object is looked up in its namespace again."""
+	if constant._namespace is None:
+		return (int, (int(constant), ))
+	return (getattr, (constant._namespace, constant.name()))
+
+_NamedInt = type(Constants).NamedValue(int)
+
+copy_reg.pickle(_NamedInt, _reduceNamedConstant)
+
 # --------------------------------------------------------------------
 #                              helpers
 # --------------------------------------------------------------------
 
+class _InternTable(dict):
+	"""Maps tokens of the file format to their parsed values, so that
+	all objects read from a file share the values of equal tokens
+	(e.g. coordinates and depths above 256, or floats like
+	`Object.styleValue`, would be separate python objects otherwise).
+	Cleared when it gets too large."""
+
+	__slots__ = ("convert", )
+
+	maxSize = 1 << 14
+
+	def __init__(self, convert):
+		dict.__init__(self)
+		self.convert = convert
+
+	def __missing__(self, token):
+		if len(self) >= self.maxSize:
+			self.clear()
+		result = self[token] = self.convert(token)
+		return result
+
+class _InternTables(object):
+	"""The `_InternTable` objects (and shared arrows, see `readArrow`)
+	used while reading one file; every parse has its own, so that
+	nothing is kept after reading, and concurrent parses (e.g. by
+	`loadMany`) do not interfere."""
+
+	__slots__ = ("ints", "floats", "arrows")
+
+	def __init__(self):
+		self.ints = _InternTable(int)
+		self.floats = _InternTable(float)
+		self.arrows = {}
+
+def _formatFloat(item):
+	return str(int(round(item)))
+
+def _formatBool(item):
+	return str(int(item))
+
+_itemFormatters = {int: str, long: str, str: str,
+				   float: _formatFloat, bool: _formatBool}
+"""Cache of the formatting function used by `_join` for each type."""
+
+_plainTypes = set((int, long, str))
+
+def _itemFormatter(itemType):
+	"""Return (and cache) the function `_join` uses for formatting
+	items of the given type."""
+	if issubclass(itemType, float):
+		result = _formatFloat
+	elif issubclass(itemType, bool):
+		result = _formatBool
+	else:
+		result = str
+	_itemFormatters[itemType] = result
+	return result
+
+def _formatItems(sequence):
+	"""Return list of the `_join`-formatted items of `sequence`."""
+	formatters = _itemFormatters
+	types = set(map(type, sequence))
+	if len(types) == 1:
+		itemType, = types
+		format = formatters.get(itemType) or _itemFormatter(itemType)
+		return map(format, sequence)
+	for itemType in types:
+		if (formatters.get(itemType) or _itemFormatter(itemType)) is not str:
+			break
+	else:
+		return map(str, sequence)
+	result = []
+	for item in sequence:
+		format = formatters.get(type(item)) or _itemFormatter(type(item))
+		result.append(format(item))
+	return result
+
+_integerChars = "0123456789- \t\n"
+"""Characters of `_join`-formatted integers; str() of floats or bools
+contains others, so formatting integers needs no type checks."""
+
+_joinTemplates = [" ".join(["%s"] * count) for count in range(24)]
+
 def _join(*sequence):
 	"""Helper function to bring internal object parameters into XFig
 	string format.  Attention: floating point numbers are rounded and
 	converted to integer - if floats are to be output, call str() on
 	them before passing to this function."""
-	parts = []
-	for item in sequence:
-		if isinstance(item, float):
-			parts.append(str(int(round(item))))
-		elif isinstance(item, bool):
-			parts.append(str(int(item)))
-		else:
-			parts.append(str(item))
-	return " ".join(parts)
+	if len(sequence) < len(_joinTemplates):
+		result = _joinTemplates[len(sequence)] % sequence
+		if isinstance(result, str) and not result.translate(None, _integerChars):
+			return result
+	return " ".join(_formatItems(sequence))
+
+_lineTemplates = {}
+
+def _lineTemplate(count, perLine):
+	"""Return (cached) format string for `count` items that need no
+	conversion except str(), on tab-indented lines of `perLine` items."""
+	result = _lineTemplates.get((count, perLine))
+	if result is None:
+		fullLines, rest = divmod(count, perLine)
+		result = ("\t" + " ".join(["%s"] * perLine) + "\n") * fullLines
+		if rest:
+			result += "\t" + " ".join(["%s"] * rest) + "\n"
+		_lineTemplates[count, perLine] = result
+	return result
+
+def _joinLines(sequence, perLine):
+	"""Return a string of tab-indented lines with `perLine` items
+	each, formatted like `_join` (used for blocks of points and shape
+	factors).  Blocks of plain integers (or strings) are formatted
+	with a single format operation."""
+	result = _lineTemplate(len(sequence), perLine) % tuple(sequence)
+	if isinstance(result, str) and not result.translate(None, _integerChars):
+		return result
+	if set(map(type, sequence)) <= _plainTypes:
+		return result
+	parts = _formatItems(sequence)
+	return "".join(["\t" + " ".join(parts[i:i+perLine]) + "\n"
+					for i in range(0, len(parts), perLine)])
+
+_modificationCount = 0
+"""incremented on each modification of a document (see
+`_documentModified`), used to detect stale cached bounds"""
+
+_pointModificationCount = 0
+"""incremented on each in-place modification of points (`Vector`,
+`PointArray`), which do not know the object they belong to"""
+
+def _documentModified(container):
+	"""Invalidate cached bounds.  `container` is the `Container`
+	whose contents have changed (i.e. the parent of a modified
+	object, or None); its spatial index and those of its ancestors
+	are marked as stale."""
+	global _modificationCount
+	_modificationCount += 1
+	while container is not None:
+		if container._spatialIndex is not None:
+			container._spatialIndex.stale = True
+		container = container._parent
+
+def _pointsModified():
+	"""Like `_documentModified`, for in-place modifications of points
+	(`Vector` coordinates, `PointArray` and `_PointList` contents).
+	Points do not know the object they belong to (they may even be
+	shared), so this makes the cached bounds and spatial indices of
+	all documents stale (see `_SpatialIndex.isStale`)."""
+	global _modificationCount, _pointModificationCount
+	_modificationCount += 1
+	_pointModificationCount += 1
+
+def _arrowProperty(slot, doc = None):
+	"""Return a property for an `Arrow` stored in the given `slot`.
+	Arrows read from files are shared between objects (see
+	`readArrow`), so the getter replaces a shared arrow with a copy
+	of its own first, which may then be modified in place."""
+
+	def getter(self):
+		arrow = getattr(self, slot)
+		if type(arrow) is _SharedArrow:
+			arrow = Arrow(arrow.type, arrow.style,
+						  arrow.thickness, arrow.width, arrow.height)
+			setattr(self, slot, arrow)
+		return arrow
+
+	def setter(self, value):
+		setattr(self, slot, value)
+
+	return property(getter, setter, doc = doc)
+
+def _pointsProperty(slot, doc = None):
+	"""Like `_geometryProperty`, for lists of points, which are
+	stored as `_PointList` (so that modifying them in place is
+	noticed, too).  Other sequences (e.g. a `PointArray`) are stored
+	as given."""
+
+	def setter(self, value):
+		_documentModified(self._parent)
+		if type(value) is list:
+			value = _PointList(value)
+		setattr(self, slot, value)
+	return property(operator.attrgetter(slot), setter, doc = doc)
+
+def _geometryProperty(slot, doc = None):
+	"""Return a property for an attribute which is stored in the
+	given `slot`, and which calls `_documentModified` when assigned
+	(because it influences the bounds of the object)."""
+
+	def setter(self, value):
+		_documentModified(self._parent)
+		setattr(self, slot, value)
+	return property(operator.attrgetter(slot), setter, doc = doc)
 
 def _formatComment(comment):
 	if not comment:
@@ -451,18 +653,30 @@ def parseGeometry(geometryString):
 		else:
 			return Rect(x1, y1, vx2, vy2)
 
+def _coordinateProperty(slot, doc = None):
+	"""Return a property for a coordinate of a point stored in the
+	given `slot`, which calls `_pointsModified` when assigned."""
+
+	def setter(self, value):
+		_pointsModified()
+		setattr(self, slot, value)
+	return property(operator.attrgetter(slot), setter, doc = doc)
+
 class Vector(object):
-	__slots__ = ("x", "y")
+	__slots__ = ("_x", "_y")
 	
 	def __init__(self, x, y):
-		self.x = x
-		self.y = y
+		self._x = x
+		self._y = y
+
+	x = _coordinateProperty("_x")
+	y = _coordinateProperty("_y")
 
 	def __getitem__(self, index):
 		if index == 0 or index == -2:
-			return self.x
+			return self._x
 		if index == 1 or index == -1:
-			return self.y
+			return self._y
 		raise IndexError("Vector only has two components")
 
 	def __setitem__(self, index, value):
@@ -519,6 +733,216 @@ class Vector(object):
 	def __repr__(self):
 		return "fig.Vector(%s, %s)" % (self.x, self.y)
 
+	def __reduce__(self):
+		return (Vector, (self.x, self.y))
+
+class PointArray(object):
+	"""Compact storage for the `points` of `PolylineBase` and
+	`SplineBase` objects.  Instead of a list of `Vector` objects, the
+	coordinates are kept interleaved (x1, y1, x2, y2, ...) in one
+	contiguous buffer of C ints (``array('i')``); if NumPy is
+	available, it is used for bulk operations like `bounds()`.
+
+	A PointArray behaves like a list of points: ``len(points)``,
+	``points[i][0]``, iteration, slicing, `append()` and ``del`` work
+	as usual.  ``points[i]`` (and iteration) returns `Vector` objects
+	which write through to the array, i.e. ``points[i].x = 42`` works,
+	too (as long as no points before i are removed or inserted).
+	Coordinates are rounded to integers.
+
+	You can pass ``compactPoints = True`` to `File` or `iterObjects`
+	to let the parser use PointArrays, or convert existing objects
+	with ``o.points = fig.PointArray(o.points)``."""
+
+	__slots__ = ("_xy", )
+
+	def __init__(self, points = ()):
+		self._xy = array.array("i")
+		for p in points:
+			self.append(p)
+
+	def append(self, point):
+		_pointsModified()
+		self._xy.append(int(round(point[0])))
+		self._xy.append(int(round(point[1])))
+
+	def extend(self, points):
+		for p in points:
+			self.append(p)
+
+	def extendFlat(self, coords):
+		"""Append points given as flat sequence of coordinates
+		(x1, y1, x2, y2, ...), e.g. the string parameters of a .fig
+		file line."""
+		_pointsModified()
+		self._xy.extend(map(int, coords))
+
+	def flat(self):
+		"""Return the flat (x1, y1, x2, y2, ...) coordinate buffer.
+		(This is the internal storage, not a copy.)"""
+		return self._xy
+
+	def bounds(self):
+		"""Return the bounding `Rect` of all points."""
+		xy = self._xy
+		if not xy:
+			return Rect()
+		if numpy is not None:
+			xy = numpy.frombuffer(xy, numpy.intc)
+			x, y = xy[0::2], xy[1::2]
+			return Rect(int(x.min()), int(y.min()), int(x.max()), int(y.max()))
+		x, y = xy[0::2], xy[1::2]
+		return Rect(min(x), min(y), max(x), max(y))
+
+	def __len__(self):
+		return len(self._xy) / 2
+
+	def _index(self, index):
+		if index < 0:
+			index += len(self)
+		if not 0 <= index < len(self):
+			raise IndexError("PointArray index out of range")
+		return 2*index
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			result = PointArray()
+			for i in range(*index.indices(len(self))):
+				result._xy.extend(self._xy[2*i:2*i+2])
+			return result
+		return _PointArrayItem(self, self._index(index))
+
+	def __setitem__(self, index, point):
+		i = self._index(index)
+		_pointsModified()
+		self._xy[i] = int(round(point[0]))
+		self._xy[i+1] = int(round(point[1]))
+
+	def __delitem__(self, index):
+		_pointsModified()
+		if isinstance(index, slice):
+			start, stop, step = index.indices(len(self))
+			assert step == 1, "PointArray only supports contiguous slice deletion"
+			del self._xy[2*start:2*max(start, stop)]
+		else:
+			i = self._index(index)
+			del self._xy[i:i+2]
+
+	def __getslice__(self, start, stop):
+		return self.__getitem__(slice(start, stop))
+
+	def __delslice__(self, start, stop):
+		self.__delitem__(slice(start, stop))
+
+	def __iter__(self):
+		for i in range(0, len(self._xy), 2):
+			yield _PointArrayItem(self, i)
+
+	def __eq__(self, other):
+		if isinstance(other, PointArray):
+			return self._xy == other._xy
+		try:
+			if len(other) != len(self):
+				return False
+		except TypeError:
+			return False
+		for p, q in zip(self, other):
+			if p != q:
+				return False
+		return True
+
+	def __ne__(self, other):
+		return not self.__eq__(other)
+
+	def __copy__(self):
+		result = PointArray()
+		result._xy = array.array("i", self._xy)
+		return result
+
+	def __deepcopy__(self, memo):
+		return self.__copy__()
+
+	def __repr__(self):
+		return "fig.PointArray(%s)" % ([tuple(p) for p in self], )
+
+class _PointArrayItem(Vector):
+	"""`Vector` returned by `PointArray.__getitem__`, whose coordinates
+	are the ones stored at the given offset in the array."""
+
+	__slots__ = ("_array", "_offset")
+
+	def __init__(self, array, offset):
+		self._array = array
+		self._offset = offset
+
+	def _getX(self):
+		return self._array._xy[self._offset]
+
+	def _setX(self, value):
+		_pointsModified()
+		self._array._xy[self._offset] = int(round(value))
+
+	def _getY(self):
+		return self._array._xy[self._offset + 1]
+
+	def _setY(self, value):
+		_pointsModified()
+		self._array._xy[self._offset + 1] = int(round(value))
+
+	x = property(_getX, _setX)
+	y = property(_getY, _setY)
+
+	def __getitem__(self, index):
+		if index == 0 or index == -2:
+			return self.x
+		if index == 1 or index == -1:
+			return self.y
+		raise IndexError("Vector only has two components")
+
+def _notifyingMethods(cls):
+	"""Override all modifying methods of the list subclass `cls`
+	such that they call ``self._modified()`` first."""
+
+	def wrap(name):
+		method = getattr(list, name)
+		def wrapper(self, *args, **kwargs):
+			self._modified()
+			return method(self, *args, **kwargs)
+		wrapper.__name__ = name
+		return wrapper
+
+	for name in ("append", "extend", "insert", "pop", "remove", "reverse", "sort",
+				 "__setitem__", "__delitem__", "__setslice__", "__delslice__",
+				 "__iadd__", "__imul__"):
+		setattr(cls, name, wrap(name))
+	return cls
+
+class _PointList(list):
+	"""List of the `Vector` points of an object (see `_pointsProperty`),
+	whose modifications invalidate cached bounds like those of the
+	points themselves."""
+
+	__slots__ = ()
+
+	def _modified(self):
+		_pointsModified()
+
+	def __reduce_ex__(self, protocol):
+		return (_PointList, (list(self), ))
+
+_notifyingMethods(_PointList)
+
+def _flatCoordinates(points):
+	"""Return a new flat list [x1, y1, x2, y2, ...] of the coordinates
+	of the given points (list of `Vector` objects / pairs, or a
+	`PointArray`)."""
+	if isinstance(points, PointArray):
+		return points.flat().tolist()
+	try:
+		return [c for p in points for c in (p._x, p._y)]
+	except AttributeError: # not all points are (plain) Vectors
+		return [c for p in points for c in (p[0], p[1])]
+
 class Rect(object):
 	"""This is a simple, half-internal helper class for handling
 	Rectangles (e.g. used for bounding boxes).  If you are looking for
@@ -552,8 +976,15 @@ class Rect(object):
 		if isinstance(other, Rect):
 			if other._empty:
 				return
-			self.__call__((other.x1, other.y1))
-			self.__call__((other.x2, other.y2))
+			if self._empty:
+				self.x1, self.y1, self.x2, self.y2 = \
+						 other.x1, other.y1, other.x2, other.y2
+				self._empty = False
+			else:
+				if other.x1 < self.x1: self.x1 = other.x1
+				if other.y1 < self.y1: self.y1 = other.y1
+				if other.x2 > self.x2: self.x2 = other.x2
+				if other.y2 > self.y2: self.y2 = other.y2
 		else:
 			if self._empty:
 				self.x1 = other[0]
@@ -577,6 +1008,15 @@ class Rect(object):
 				self.contains(other.lowerRight()))
 		return ((self.x1 <= other[0]) and (self.y1 <= other[1]) and
 				(other[0] <= self.x2) and (other[1] <= self.y2))
+
+	def intersects(self, other):
+		"""Return True iff this Rect and the Rect `other` overlap.
+		(Rects touching only at their borders are considered to
+		overlap, empty Rects never overlap anything.)"""
+		if self._empty or other._empty:
+			return False
+		return ((self.x1 <= other.x2) and (other.x1 <= self.x2) and
+				(self.y1 <= other.y2) and (other.y1 <= self.y2))
 	
 	def width(self):
 		return self.x2 - self.x1
@@ -695,10 +1135,183 @@ class CustomColor(object):
 	def setRGB(self, r, g, b):
 		self.hexCode = "#%02x%02x%02x" % (r, g, b)
 
+class _ColorList(list):
+	"""helper class for `File.colors`, a list whose `version` is
+	incremented on each modification (used to detect a stale
+	`_ColorIndex`)."""
+
+	version = 0
+
+	def _modified(self):
+		self.version += 1
+
+_notifyingMethods(_ColorList)
+
+class _ColorIndex(object):
+	"""helper class, see `File.getColor`
+
+	Uniform 8x8x8 bucket grid over the RGB cube, holding all custom
+	colors of a document.  Nearest-color queries visit the buckets
+	in shells of increasing distance around the query color and
+	stop as soon as no unvisited bucket can contain a closer one."""
+
+	__slots__ = ("version", "cells")
+
+	cellShift = 5
+	cellSize = 1 << cellShift
+	gridSize = 256 >> cellShift
+
+	def __init__(self, colors):
+		self.cells = {}
+		for color in colors:
+			self.add(color)
+		self.version = colors.version
+
+	def add(self, color):
+		r, g, b = color.rgb()
+		s = self.cellShift
+		self.cells.setdefault((r >> s, g >> s, b >> s), []).append(
+			(r, g, b, color))
+
+	def nearest(self, r, g, b, maxDist = None):
+		"""Return (squaredDistance, color) of the custom color
+		closest to r,g,b (ties are resolved in favor of the lower
+		color index), or (None, None) if there is none closer than
+		`maxDist` (if given)."""
+
+		s, size, grid = self.cellShift, self.cellSize, self.gridSize
+		cells = self.cells
+		cr, cg, cb = r >> s, g >> s, b >> s
+		best = bestColor = None
+		for k in range(grid):
+			for i in range(max(cr-k, 0), min(cr+k, grid-1) + 1):
+				for j in range(max(cg-k, 0), min(cg+k, grid-1) + 1):
+					if k == abs(i-cr) or k == abs(j-cg):
+						blues = range(max(cb-k, 0), min(cb+k, grid-1) + 1)
+					else: # only the two faces of the shell
+						blues = [l for l in (cb-k, cb+k) if 0 <= l < grid]
+					for l in blues:
+						for cellR, cellG, cellB, color in cells.get((i, j, l), ()):
+							d = (cellR-r)**2 + (cellG-g)**2 + (cellB-b)**2
+							if best is None or d < best or (
+								d == best and color.index < bestColor.index):
+								best, bestColor = d, color
+			# lower bound for the distance of all unvisited buckets:
+			bound = min([c - (cc-k)*size for c, cc in ((r, cr), (g, cg), (b, cb))
+						 if cc-k > 0] +
+						[(cc+k+1)*size - c for c, cc in ((r, cr), (g, cg), (b, cb))
+						 if cc+k+1 < grid] or [None])
+			if bound is None:
+				break
+			if best is not None and best < bound*bound:
+				break
+			if maxDist is not None and bound >= maxDist:
+				break
+		if best is not None and maxDist is not None and best >= maxDist*maxDist:
+			return None, None
+		return best, bestColor
+
+def _medianCut(rgb, weights, count):
+	"""Median cut quantization of the colors in the Nx3 array `rgb`
+	with the given weights (usage counts) into (at most) `count`
+	colors.  Returns (palette, labels), i.e. the weighted mean color
+	of each box and the box index for each input color.  The box
+	with the largest weighted squared extent is split first, at the
+	weighted median of its widest channel."""
+
+	import heapq
+
+	def boxEntry(box):
+		values = rgb[box]
+		extent = values.max(0) - values.min(0)
+		channel = extent.argmax()
+		return (-float(extent[channel])**2 * weights[box].sum(),
+				next(serial), box, channel)
+
+	serial = itertools.count() # (for stable ordering; boxes are not comparable)
+	boxes = []
+	heap = [boxEntry(numpy.arange(len(rgb)))]
+	while heap and len(heap) + len(boxes) < count:
+		priority, _, box, channel = heapq.heappop(heap)
+		if priority == 0: # only one color left in this box
+			boxes.append(box)
+			continue
+		box = box[numpy.argsort(rgb[box, channel], kind = "mergesort")]
+		cumulative = numpy.cumsum(weights[box])
+		cut = numpy.searchsorted(cumulative, cumulative[-1] / 2.0) + 1
+		cut = min(max(cut, 1), len(box) - 1)
+		for part in (box[:cut], box[cut:]):
+			heapq.heappush(heap, boxEntry(part))
+	boxes.extend([entry[2] for entry in heap])
+
+	palette = numpy.empty((len(boxes), 3))
+	labels = numpy.empty(len(rgb), numpy.intp)
+	for i, box in enumerate(boxes):
+		palette[i] = numpy.average(rgb[box], axis = 0, weights = weights[box])
+		labels[box] = i
+	return palette, labels
+
+def _nearestCenters(rgb, centers, blockSize = 2048):
+	"""Return the index of the closest row of `centers` for each
+	row of `rgb` (both Nx3 arrays)."""
+
+	result = numpy.empty(len(rgb), numpy.intp)
+	for start in range(0, len(rgb), blockSize):
+		block = rgb[start:start+blockSize]
+		sqDiffs = sum([(block[:,i,None] - centers[None,:,i])**2
+					   for i in range(3)])
+		result[start:start+blockSize] = sqDiffs.argmin(1)
+	return result
+
+def _kMeans(rgb, weights, count, iterations = 10):
+	"""Weighted k-means quantization of the colors in `rgb`,
+	initialized with the result of `_medianCut` (see there)."""
+
+	palette, labels = _medianCut(rgb, weights, count)
+	rgb = rgb.astype(float)
+	for i in range(iterations):
+		totals = numpy.bincount(labels, weights, len(palette))
+		used = totals > 0 # empty clusters keep their color
+		for channel in range(3):
+			sums = numpy.bincount(labels, weights * rgb[:,channel], len(palette))
+			palette[used, channel] = sums[used] / totals[used]
+		newLabels = _nearestCenters(rgb, palette)
+		if (newLabels == labels).all():
+			break
+		labels = newLabels
+	return palette, labels
+
 # --------------------------------------------------------------------
 # 				Object: base class for all fig objects
 # --------------------------------------------------------------------
 
+def _parentContainer(self):
+	"""Return the `Container` (`File` or `Compound`) this object
+	has been added to last, or None."""
+	return self._parent
+
+def _detach(self):
+	"""Remove this object from its `parentContainer()` (if any),
+	without searching the document.  Returns self."""
+	if self._parent is not None:
+		self._parent._removeChildren((self, ))
+	return self
+
+_stateSlots = {}
+
+def _stateSlotDescriptors(cls):
+	"""Return (cached) list of (name, descriptor) pairs for all slots
+	of the `Object` subclass `cls` that are pickled, i.e. all but the
+	`Object._transientSlots` (see `Object.__getstate__`)."""
+	result = _stateSlots.get(cls)
+	if result is None:
+		result = _stateSlots[cls] = [
+			(name, klass.__dict__[name])
+			for klass in cls.__mro__
+			for name in getattr(klass, "__slots__", ())
+			if name not in Object._transientSlots]
+	return result
+
 class Object(object):
 	"""Base class of all fig objects.  Handles common properties like
 	
@@ -712,11 +1325,18 @@ class Object(object):
 	- capStyle (see `CapStyle.XXX` constants)
 	- forwardArrow/backwardArrow (`Arrow` objects)"""
 
-	__slots__ = ("lineStyle", "lineWidth", "penColor", "fillColor", "depth",
+	__slots__ = ("lineStyle", "lineWidth", "penColor", "fillColor", "_depth",
 				 "penStyle", "fillStyle", "styleValue", "joinStyle", "capStyle",
-				 "forwardArrow", "backwardArrow", "comment")
+				 "_forwardArrow", "_backwardArrow", "comment", "_parent",
+				 "_depthIndices", "_boundsCache", "_lazySource", "_source")
+
+	_transientSlots = ("_parent", "_depthIndices", "_boundsCache",
+					   "_lazySource", "_source")
+	"""internal back-references / caches that are not copied or pickled"""
 
 	def __init__(self):
+		self._parent = self._depthIndices = self._boundsCache = \
+			self._lazySource = self._source = None
 		self.lineStyle = LineStyle.Default
 # Line thicknesses are given in 1/80 inch (0.3175mm) or 1 screen pixel.
 # When exporting to EPS, PostScript or any bitmap format (e.g. GIF),  the
@@ -724,25 +1344,188 @@ class Object(object):
 		self.lineWidth = 1
 		self.penColor = Color.Default
 		self.fillColor = Color.Default
-		self.depth = 50
+		self._depth = 50 # (not in any depth index yet)
 		self.penStyle = 0 # not used
 		self.fillStyle = FillStyle.None_
 		self.styleValue = 3.0
 		self.joinStyle = JoinStyle(0)
 		self.capStyle = CapStyle(0)
-		self.forwardArrow = None
-		self.backwardArrow = None
+		self._forwardArrow = None
+		self._backwardArrow = None
 		self.comment = ""
 
+	def _getDepth(self):
+		return self._depth
+
+	def _setDepth(self, depth):
+		if self._depthIndices:
+			for index in self._depthIndices:
+				index.moved(self, self._depth, depth)
+		self._depth = depth
+
+	depth = property(_getDepth, _setDepth, doc = "depth (0-999)")
+
+	forwardArrow = _arrowProperty(
+		"_forwardArrow", "`Arrow` at the end of the object, or None")
+	backwardArrow = _arrowProperty(
+		"_backwardArrow", "`Arrow` at the start of the object, or None")
+
+	parentContainer = _parentContainer
+	detach = _detach
+
+	def bounds(self):
+		"""Return the bounding box of this object as `Rect`.
+
+		The result is cached until anything in any document is
+		modified; assignments to geometric properties (like `points`,
+		`center`, or `pos`), changing point coordinates
+		(``o.points[0][0] = 42`` or ``o.points[0].x = 42``), and
+		modifying lists of points in place (append, del, ...) are
+		detected automatically.  (Lists assigned to `points` are
+		stored as a list subclass for that purpose.)  If you modify
+		the object in some other way that affects its bounds, call
+		`changed()` afterwards.  (Saving never uses cached bounds, so
+		the compound headers written are always exact.)"""
+
+		cache = self._boundsCache
+		if cache is None or cache[0] != _modificationCount:
+			cache = self._boundsCache = (_modificationCount, self._bounds())
+		result = Rect()
+		result(cache[1])
+		return result
+
+	def changed(self):
+		"""Notify fig.py that this object has been changed in a way
+		that cannot be detected automatically (e.g. by modifying a
+		`points` sequence that is neither a list nor a `PointArray`),
+		see `bounds()`."""
+		_documentModified(self._parent)
+		self._source = None
+
+	def __getattr__(self, name):
+		# only called for attributes that are not set; objects of
+		# lazily read files (see `File`) are read on first access:
+		try:
+			source = Object._lazySource.__get__(self)
+		except AttributeError:
+			source = None
+		if source is None:
+			raise AttributeError("'%s' object has no attribute '%s'" % (
+				type(self).__name__, name))
+		self._readLazily()
+		return getattr(self, name)
+
+	def _readLazily(self):
+		"""Read all properties of this (lazily read) object from its
+		source, except for those that have been assigned already."""
+		source = self._lazySource
+		data, begin, end, compactPoints = source
+		self._lazySource = None
+		unchanged = self._isUnreadSource()
+		if unchanged:
+			object.__setattr__(self, "__class__", type(self)._readClass)
+		try:
+			tables = _InternTables()
+			lines = data[begin:end].split("\n")
+			line = lines[0].strip()
+			params = line.split()
+			result, subLineExpected = _readObject(
+				ObjectType(int(params[0])), params, line, compactPoints, tables)
+			for line in lines[1:]:
+				if not subLineExpected:
+					break
+				params = line.split()
+				if params and not line.startswith("#"):
+					subLineExpected = result._readSub(params, tables)
+		except:
+			self._lazySource = source
+			if unchanged:
+				object.__setattr__(self, "__class__", _unreadClass(type(self)))
+			raise
+		for klass in type(result).__mro__:
+			for name in getattr(klass, "__slots__", ()):
+				if name in Object._transientSlots or hasattr(self, name):
+					continue
+				try:
+					setattr(self, name, klass.__dict__[name].__get__(result))
+				except AttributeError: # not set in result either
+					pass
+
+		# remember the normalized representation of the source, see
+		# `_sourceText()`:
+		if unchanged:
+			self._source = self._source[:5] + (hashlib.md5(str(self)).digest(), )
+		else:
+			self._source = None
+
+	_unread = False
+	"""True for lazily read objects that have neither been read nor
+	changed since `_scanObjects` created them, see `_unreadClass`"""
+
+	def _isUnreadSource(self):
+		"""Return whether this lazily read object has not been read
+		yet and has not been changed since `_scanObjects` created it."""
+		return self._unread and self._source is not None
+
+	def _sourceText(self):
+		"""Return the XFig representation of this object like
+		__str__(), but if it is unchanged since it was read lazily
+		(see `File`), its original text is returned verbatim.
+		Returns a pair (text, isOriginal)."""
+		source = self._source
+		if source is not None:
+			data, begin, end, depth, comment, digest = source
+			if digest is None:
+				if self._isUnreadSource():
+					return _formatComment(comment) + _sourceLines(data, begin, end), True
+			else:
+				result = str(self)
+				if hashlib.md5(result).digest() == digest:
+					return _formatComment(comment) + _sourceLines(data, begin, end), True
+				return result, False
+		return str(self), False
+
+	def __getstate__(self):
+		state = {}
+		for name, slot in _stateSlotDescriptors(type(self)):
+			# (access slots directly, lazily read objects are pickled
+			# as their unparsed source)
+			try:
+				state[name] = slot.__get__(self)
+			except AttributeError:
+				pass
+		if self._lazySource is not None:
+			data, begin, end, compactPoints = self._lazySource
+			state["_lazySource"] = (data[begin:end], 0, end - begin, compactPoints)
+		# keep the original text for saving (see `_sourceText`),
+		# unless the object has been changed before being read:
+		source = self._source
+		if source is not None and (source[5] is not None or self._isUnreadSource()):
+			data, begin, end = source[:3]
+			state["_source"] = (data[begin:end], 0, end - begin) + source[3:]
+		return state
+
+	def __setstate__(self, state):
+		for name in Object._transientSlots:
+			setattr(self, name, None)
+		for name, value in state.items():
+			setattr(self, name, value)
+		source = self._source
+		if source is not None and source[5] is None:
+			# (still unread, see `_unreadClass`)
+			object.__setattr__(self, "__class__", _unreadClass(type(self)))
+
 	def _joinWithProperties(self, figType, subType, *rest):
-		return _formatComment(self.comment) + _join(
-			figType, subType,
-			self.lineStyle, self.lineWidth,
-			self.penColor is None and Color.Default or self.penColor,
-			self.fillColor is None and Color.Default or self.fillColor,
-			self.depth, self.penStyle,
-			self.fillStyle, str(self.styleValue),
-			*rest)
+		# (the float styleValue is joined separately, so that the
+		# other fields are usually just integers, see `_join`)
+		return "%s%s %s %s" % (
+			_formatComment(self.comment), _join(
+				figType, subType,
+				self.lineStyle, self.lineWidth,
+				self.penColor is None and Color.Default or self.penColor,
+				self.fillColor is None and Color.Default or self.fillColor,
+				self.depth, self.penStyle,
+				self.fillStyle), self.styleValue, _join(*rest))
 
 class Arrow(object):
 	"""Arrow objects store arrow parameters of open arcs, splines, or
@@ -765,14 +1548,39 @@ class Arrow(object):
 		self.width = width
 		self.height = height
 
+	def __reduce__(self):
+		# (keeps _SharedArrow objects shared after unpickling)
+		return (type(self), (self.type, self.style, self.thickness,
+							 self.width, self.height))
+
 	def __str__(self):
 		return _join(self.type, self.style,
 					 str(self.thickness),
 					 str(self.width), str(self.height)) + "\n"
 
-def readArrow(params):
-	return Arrow(int(params[0]), int(params[1]),
-				 float(params[2]), float(params[3]), float(params[4]))
+class _SharedArrow(Arrow):
+	"""`Arrow` shared by several objects read from the same file,
+	which is copied when accessed (see `_arrowProperty`)."""
+
+	__slots__ = ()
+
+def readArrow(params, tables = None):
+	"""Return `Arrow` for the fields of an arrow line.  If the
+	`_InternTables` of the current parse are given, equal arrows are
+	shared between the objects read (copy-on-write)."""
+	if tables is None:
+		return Arrow(int(params[0]), int(params[1]),
+					 float(params[2]), float(params[3]), float(params[4]))
+	key = tuple(params[:5])
+	result = tables.arrows.get(key)
+	if result is None:
+		if len(tables.arrows) >= _InternTable.maxSize:
+			tables.arrows.clear()
+		ints, floats = tables.ints, tables.floats
+		result = tables.arrows[key] = _SharedArrow(
+			ints[params[0]], ints[params[1]],
+			floats[params[2]], floats[params[3]], floats[params[4]])
+	return result
 
 # --------------------------------------------------------------------
 #                                arcs
@@ -781,7 +1589,9 @@ def readArrow(params):
 class ArcBase(Object):
 	"""Base class of Arc-like objects (`PieArc`, `OpenArc`)."""
 
-	__slots__ = ("points", "direction", "center", "_pointCount")
+	__slots__ = ("_points", "direction", "center", "_pointCount")
+
+	points = _pointsProperty("_points")
 	
 	def __init__(self, center = None,
 				 point1 = None, point2 = None,
@@ -852,8 +1662,8 @@ class ArcBase(Object):
 
 	def __str__(self):
 		assert len(self.points) == 3
-		hasForwardArrow = (self.forwardArrow != None and 1 or 0)
-		hasBackwardArrow = (self.backwardArrow != None and 1 or 0)
+		hasForwardArrow = (self._forwardArrow != None and 1 or 0)
+		hasBackwardArrow = (self._backwardArrow != None and 1 or 0)
 		
 		result = self._joinWithProperties(
 			ObjectType.Arc, self.arcType(),
@@ -865,24 +1675,24 @@ class ArcBase(Object):
 			self.points[2][0], self.points[2][1]) + "\n"
 
 		if hasForwardArrow:
-			result += "\t" + str(self.forwardArrow)
+			result += "\t" + str(self._forwardArrow)
 		if hasBackwardArrow:
-			result += "\t" + str(self.backwardArrow)
+			result += "\t" + str(self._backwardArrow)
 		return result
 
-	def bounds(self):
+	def _bounds(self):
 		result = Rect()
 		for point in self.points:
 			result(point)
 		return result
 
-	def _readSub(self, params):
-		if self.forwardArrow == True:
-			self.forwardArrow = readArrow(params)
-			return self.backwardArrow == True
+	def _readSub(self, params, tables):
+		if self._forwardArrow == True:
+			self._forwardArrow = readArrow(params, tables)
+			return self._backwardArrow == True
 
-		if self.backwardArrow == True:
-			self.backwardArrow = readArrow(params)
+		if self._backwardArrow == True:
+			self._backwardArrow = readArrow(params, tables)
 			return False
 
 		sys.stderr.write("Unhandled subline while loading arc object!\n")
@@ -916,30 +1726,31 @@ class OpenArc(ArcBase):
 		`OpenArc` objects.)"""
 		return False
 
-def _readArcBase(params):
+def _readArcBase(params, tables):
+	ints, floats = tables.ints, tables.floats
 	result = ArcBase()
 	result.changeType(int(params[0]))
 	result.lineStyle = LineStyle.read(params[1])
-	result.lineWidth = int(params[2])
-	result.penColor = Color.read(params[3])
-	result.fillColor = Color.read(params[4])
-	result.depth = int(params[5])
-	result.penStyle = int(params[6])
+	result.lineWidth = ints[params[2]]
+	result.penColor = Color.read(ints[params[3]])
+	result.fillColor = Color.read(ints[params[4]])
+	result.depth = ints[params[5]]
+	result.penStyle = ints[params[6]]
 	result.fillStyle = FillStyle.read(params[7])
-	result.styleValue = float(params[8])
+	result.styleValue = floats[params[8]]
 	result.capStyle = CapStyle.read(params[9])
-	result.direction = int(params[10])
+	result.direction = ints[params[10]]
 	subLines = 0
 	if int(params[11]):
-		result.forwardArrow = True
+		result._forwardArrow = True
 		subLines += 1
 	if int(params[12]):
-		result.backwardArrow = True
+		result._backwardArrow = True
 		subLines += 1
-	result.center = (float(params[13]), float(params[14]))
-	result.points = [Vector(int(params[15]), int(params[16])),
-					 Vector(int(params[17]), int(params[18])),
-					 Vector(int(params[19]), int(params[20]))]
+	result.center = (floats[params[13]], floats[params[14]])
+	result.points = [Vector(ints[params[15]], ints[params[16]]),
+					 Vector(ints[params[17]], ints[params[18]]),
+					 Vector(ints[params[19]], ints[params[20]])]
 	return result, subLines
 
 # --------------------------------------------------------------------
@@ -949,7 +1760,10 @@ def _readArcBase(params):
 class EllipseBase(Object):
 	"""Base class of Ellipse-like objects (`Ellipse`, `Circle`)."""
 	
-	__slots__ = ("angle", "center", "radius", "start", "end")
+	__slots__ = ("angle", "_center", "_radius", "start", "end")
+
+	center = _geometryProperty("_center")
+	radius = _geometryProperty("_radius")
 
 	def __init__(self):
 		Object.__init__(self)
@@ -988,7 +1802,7 @@ class EllipseBase(Object):
 			self.start[0], self.start[1],
 			self.end[0], self.end[1]) + "\n"
 
-	def bounds(self):
+	def _bounds(self):
 		result = Rect()
 		result(((self.center[0] - self.radius[0]),
 				(self.center[1] - self.radius[1])))
@@ -1015,22 +1829,23 @@ class EllipseBase(Object):
 		self.center = center
 		self.setRadius(radius)
 
-def _readEllipseBase(params):
+def _readEllipseBase(params, tables):
+	ints, floats = tables.ints, tables.floats
 	result = EllipseBase()
 	result.changeType(int(params[0]))
 	result.lineStyle = LineStyle.read(params[1])
-	result.lineWidth = int(params[2])
-	result.penColor = Color.read(params[3])
-	result.fillColor = Color.read(params[4])
-	result.depth = int(params[5])
-	result.penStyle = int(params[6])
+	result.lineWidth = ints[params[2]]
+	result.penColor = Color.read(ints[params[3]])
+	result.fillColor = Color.read(ints[params[4]])
+	result.depth = ints[params[5]]
+	result.penStyle = ints[params[6]]
 	result.fillStyle = FillStyle.read(params[7])
-	result.styleValue = float(params[8])
-	result.angle = float(params[10])
-	result.center = Vector(int(params[11]), int(params[12]))
-	result.radius = Vector(int(params[13]), int(params[14]))
-	result.start = Vector(int(params[15]), int(params[16]))
-	result.end = Vector(int(params[17]), int(params[18]))
+	result.styleValue = floats[params[8]]
+	result.angle = floats[params[10]]
+	result.center = Vector(ints[params[11]], ints[params[12]])
+	result.radius = Vector(ints[params[13]], ints[params[14]])
+	result.start = Vector(ints[params[15]], ints[params[16]])
+	result.end = Vector(ints[params[17]], ints[params[18]])
 	return result, 0
 
 class Ellipse(EllipseBase):
@@ -1113,11 +1928,13 @@ class PolylineBase(Object):
 	"""Base class of Polygon-like objects (`Polygon`,
 	`Polyline`, `PictureBBox`)."""
 
-	__slots__ = ("points", "filename", "flipped", "radius", "_pointCount")
+	__slots__ = ("_points", "filename", "flipped", "radius", "_pointCount")
+
+	points = _pointsProperty("_points")
 	
 	def __init__(self):
 		Object.__init__(self)
-		self.points = []
+		self._points = _PointList()
 		self.filename = None
 		self.flipped = False
 		self.radius = -1
@@ -1161,6 +1978,7 @@ class PolylineBase(Object):
 				del self.points[-1]
 		else:
 			self.points.append(copy.copy(self.points[0]))
+		self.changed()
 
 	def segments(self):
 		it = iter(self.points)
@@ -1175,58 +1993,61 @@ class PolylineBase(Object):
 		pointCount = len(self.points)
 		if self.closed():
 			pointCount += 1
-		hasForwardArrow = (self.forwardArrow != None and 1 or 0)
-		hasBackwardArrow = (self.backwardArrow != None and 1 or 0)
+		hasForwardArrow = (self._forwardArrow != None and 1 or 0)
+		hasBackwardArrow = (self._backwardArrow != None and 1 or 0)
 		
-		result = self._joinWithProperties(
+		result = [self._joinWithProperties(
 			ObjectType.Polygon, self.polylineType(),
 			self.joinStyle, self.capStyle, self.radius,
 			hasForwardArrow, hasBackwardArrow,
-			pointCount) + "\n"
+			pointCount) + "\n"]
 
 		if hasForwardArrow:
-			result += "\t" + str(self.forwardArrow)
+			result.append("\t" + str(self._forwardArrow))
 		if hasBackwardArrow:
-			result += "\t" + str(self.backwardArrow)
+			result.append("\t" + str(self._backwardArrow))
 		if isinstance(self, PictureBBox):
-			result += "\t" + _join(self.flipped, self.filename) + "\n"
-		i = self._savePointIter()
-		for linePoints in map(None, *(i, )*12):
-			result += "\t" + _join(*[p for p in linePoints if p != None]) + "\n"
-		return result
+			result.append("\t" + _join(self.flipped, self.filename) + "\n")
+		result.append(_joinLines(self._savePointCoordinates(), 12))
+		return "".join(result)
 
-	def _savePointIter(self):
-		for p in self.points:
-			yield p[0]
-			yield p[1]
+	def _savePointCoordinates(self):
+		"""Return flat sequence of point coordinates to be saved."""
+		result = _flatCoordinates(self.points)
 		if self.closed():
-			yield self.points[0][0]
-			yield self.points[0][1]
+			result.extend((self.points[0][0], self.points[0][1]))
+		return result
 
-	def bounds(self):
+	def _bounds(self):
+		if isinstance(self.points, PointArray):
+			return self.points.bounds()
 		result = Rect()
 		for point in self.points:
 			result(point)
 		return result
 
-	def _readSub(self, params):
-		if self.forwardArrow == True:
-			self.forwardArrow = readArrow(params)
+	def _readSub(self, params, tables):
+		if self._forwardArrow == True:
+			self._forwardArrow = readArrow(params, tables)
 			return True
 
-		if self.backwardArrow == True:
-			self.backwardArrow = readArrow(params)
+		if self._backwardArrow == True:
+			self._backwardArrow = readArrow(params, tables)
 			return True
 
 		if isinstance(self, PictureBBox) and self.filename == None:
-			self.flipped = int(params[0])
-			self.filename = params[1]
+			self.flipped = tables.ints[params[0]]
+			self.filename = " ".join(params[1:]) # may contain spaces
 			return True
 
-		pointCount = len(params) / 2
-		for pointIndex in range(pointCount):
-			self.points.append(Vector(int(params[pointIndex * 2]),
-									  int(params[pointIndex * 2 + 1])))
+		if isinstance(self.points, PointArray):
+			self.points.extendFlat(params)
+		else:
+			pointCount = len(params) / 2
+			coords = map(tables.ints.__getitem__, params)
+			list.extend(self._points, [
+				Vector(coords[pointIndex * 2], coords[pointIndex * 2 + 1])
+				for pointIndex in range(pointCount)])
 
 		expectedPoints = (self._pointCount + (self.closed() and 1 or 0))
 		moreToCome = len(self.points) < expectedPoints
@@ -1237,27 +2058,28 @@ class PolylineBase(Object):
 
 		return moreToCome
 
-def _readPolylineBase(params):
+def _readPolylineBase(params, tables):
+	ints, floats = tables.ints, tables.floats
 	result = PolylineBase()
 	# retainPoints is not actually necessary for PolylineBase objects:
 	result.changeType(int(params[0]), retainPoints = True)
 	result.lineStyle = LineStyle.read(params[1])
-	result.lineWidth = int(params[2])
-	result.penColor = Color.read(params[3])
-	result.fillColor = Color.read(params[4])
-	result.depth = int(params[5])
-	result.penStyle = int(params[6])
+	result.lineWidth = ints[params[2]]
+	result.penColor = Color.read(ints[params[3]])
+	result.fillColor = Color.read(ints[params[4]])
+	result.depth = ints[params[5]]
+	result.penStyle = ints[params[6]]
 	result.fillStyle = FillStyle.read(params[7])
-	result.styleValue = float(params[8])
+	result.styleValue = floats[params[8]]
 	result.joinStyle = JoinStyle.read(params[9])
 	result.capStyle = CapStyle.read(params[10])
-	result.radius = int(params[11])
+	result.radius = ints[params[11]]
 	subLines = 0
 	if int(params[12]):
-		result.forwardArrow = True
+		result._forwardArrow = True
 		subLines += 1
 	if int(params[13]):
-		result.backwardArrow = True
+		result._backwardArrow = True
 		subLines += 1
 	result._pointCount = int(params[14])
 	subLines += (result._pointCount+5)/6 # sublines to read for the points
@@ -1395,7 +2217,9 @@ class SplineBase(Object):
 	"""Base class of Spline objects (`ApproximatedSpline`,
 	`InterpolatedSpline`, `XSpline`)."""
 	
-	__slots__ = ("points", "_shapeFactors", "_closed", "_pointCount")
+	__slots__ = ("_points", "_shapeFactors", "_closed", "_pointCount")
+
+	points = _pointsProperty("_points")
 
 	def __init__(self, points = None, shapeFactors = None, closed = True):
 		Object.__init__(self)
@@ -1457,70 +2281,68 @@ class SplineBase(Object):
 	def __str__(self):
 		pointCount = len(self.points)
 
-		hasForwardArrow = (self.forwardArrow != None and 1 or 0)
-		hasBackwardArrow = (self.backwardArrow != None and 1 or 0)
+		hasForwardArrow = (self._forwardArrow != None and 1 or 0)
+		hasBackwardArrow = (self._backwardArrow != None and 1 or 0)
 
-		result = self._joinWithProperties(
+		result = [self._joinWithProperties(
 			ObjectType.Spline, self.splineType(),
 			self.capStyle,
 			hasForwardArrow, hasBackwardArrow,
-			pointCount) + "\n"
+			pointCount) + "\n"]
 
 		if hasForwardArrow:
-			result += "\t" + str(self.forwardArrow)
+			result.append("\t" + str(self._forwardArrow))
 		if hasBackwardArrow:
-			result += "\t" + str(self.backwardArrow)
-
-		i = self._savePointIter()
-		for linePoints in map(None, *(i, )*12):
-			result += "\t" + _join(*[p for p in linePoints if p != None]) + "\n"
+			result.append("\t" + str(self._backwardArrow))
 
-		i = iter(self.shapeFactors())
-		for lineSF in map(None, *(i, )*8):
-			result += "\t" + _join(*[str(sf) for sf in lineSF if sf != None]) + "\n"
+		result.append(_joinLines(self._savePointCoordinates(), 12))
+		result.append(_joinLines(map(str, self.shapeFactors()), 8))
 
-		return result
+		return "".join(result)
 
-	def _savePointIter(self):
-		for p in self.points:
-			yield p[0]
-			yield p[1]
+	def _savePointCoordinates(self):
+		"""Return flat sequence of point coordinates to be saved."""
+		return _flatCoordinates(self.points)
 
-	def bounds(self):
+	def _bounds(self):
 		"""Return the bounds of this object.  This is not accurate at
 		all, since it simply returns the bounding box of the support
 		points, but the curve may well run outside of that box."""
 		# FIXME
+		if isinstance(self.points, PointArray):
+			return self.points.bounds()
 		result = Rect()
 		for point in self.points:
 			result(point)
 		return result
 
-	def _readSub(self, params):
-		if self.forwardArrow == True:
-			self.forwardArrow = readArrow(params)
+	def _readSub(self, params, tables):
+		if self._forwardArrow == True:
+			self._forwardArrow = readArrow(params, tables)
 			return True
 
-		if self.backwardArrow == True:
-			self.backwardArrow = readArrow(params)
+		if self._backwardArrow == True:
+			self._backwardArrow = readArrow(params, tables)
 			return True
 
 		expectedPoints = self._pointCount
 
 		if len(self.points) < expectedPoints:
-			pointCount = len(params) / 2
-			for pointIndex in range(pointCount):
-				self.points.append(Vector(int(params[pointIndex * 2]),
-										  int(params[pointIndex * 2 + 1])))
+			if isinstance(self.points, PointArray):
+				self.points.extendFlat(params)
+			else:
+				pointCount = len(params) / 2
+				coords = map(tables.ints.__getitem__, params)
+				list.extend(self._points, [
+					Vector(coords[pointIndex * 2], coords[pointIndex * 2 + 1])
+					for pointIndex in range(pointCount)])
 			if len(self.points) > expectedPoints:
 				sys.stderr.write("WARNING: read too many points?!\n")
 				del self.points[expectedPoints:]
 			return True
 
 		if len(self._shapeFactors) < expectedPoints:
-			sfCount = len(params)
-			for sfIndex in range(sfCount):
-				self._shapeFactors.append(float(params[sfIndex]))
+			self._shapeFactors.extend(map(tables.floats.__getitem__, params))
 			moreToCome = len(self._shapeFactors) < expectedPoints
 			if len(self._shapeFactors) > expectedPoints:
 				sys.stderr.write("WARNING: read too many shapeFactors?!\n")
@@ -1563,24 +2385,25 @@ class XSpline(SplineBase):
 	def splineType(self):
 		return self._closed and SplineType.ClosedXSpline or SplineType.OpenXSpline
 
-def _readSplineBase(params):
+def _readSplineBase(params, tables):
+	ints, floats = tables.ints, tables.floats
 	result = SplineBase()
 	result.changeType(int(params[0]))
 	result.lineStyle = LineStyle.read(params[1])
-	result.lineWidth = int(params[2])
-	result.penColor = Color.read(params[3])
-	result.fillColor = Color.read(params[4])
-	result.depth = int(params[5])
-	result.penStyle = int(params[6])
+	result.lineWidth = ints[params[2]]
+	result.penColor = Color.read(ints[params[3]])
+	result.fillColor = Color.read(ints[params[4]])
+	result.depth = ints[params[5]]
+	result.penStyle = ints[params[6]]
 	result.fillStyle = FillStyle.read(params[7])
-	result.styleValue = float(params[8])
+	result.styleValue = floats[params[8]]
 	result.capStyle = CapStyle.read(params[9])
 	subLines = 0
 	if int(params[10]):
-		result.forwardArrow = True
+		result._forwardArrow = True
 		subLines += 1
 	if int(params[11]):
-		result.backwardArrow = True
+		result._backwardArrow = True
 		subLines += 1
 	result._pointCount = int(params[12])
 	subLines += (result._pointCount+5)/6 # sublines to read for the points
@@ -1604,9 +2427,14 @@ class Text(Object):
 	- length, height (dummy values, no guarantee about correctness)
 	"""
 
-	__slots__ = ("text", "pos", "alignment",
+	__slots__ = ("text", "_pos", "_alignment",
 				 "font", "fontSize", "fontFlags", "angle",
-				 "length", "height")
+				 "_textLength", "_textHeight")
+
+	pos = _geometryProperty("_pos")
+	alignment = _geometryProperty("_alignment")
+	length = _geometryProperty("_textLength")
+	height = _geometryProperty("_textHeight")
 
 	def __init__(self, pos, text,
 				 font = None, fontSize = 12, fontFlags = FontFlag.PostScript,
@@ -1630,7 +2458,7 @@ class Text(Object):
 		"""FIXME: If this is corrected, remove underscore prefix."""
 		return 100
 
-	def bounds(self):
+	def _bounds(self):
 		result = Rect()
 		if self.alignment == Alignment.Left:
 			result((self.pos[0],                 self.pos[1] - self.height))
@@ -1647,7 +2475,7 @@ class Text(Object):
 		font = self.font
 		if self.font is None:
 			font = self.fontFlags & FontFlag.PostScript \
-				   and fontDefault or LaTeXFont.Default
+				   and Font.Default or LaTeXFont.Default
 		result = _formatComment(self.comment) + \
 				 _join(ObjectType.Text, self.alignment,
 					   self.penColor is None and Color.Default or self.penColor,
@@ -1679,19 +2507,20 @@ def _unescapeText(text):
 			i += 2
 	return result
 
-def _readText(params, text):
-	result = Text(Vector(int(params[10]), int(params[11])), _unescapeText(text),
+def _readText(params, text, tables):
+	ints, floats = tables.ints, tables.floats
+	result = Text(Vector(ints[params[10]], ints[params[11]]), _unescapeText(text),
 				  alignment = int(params[0]))
-	result.penColor = Color.read(params[1])
-	result.depth = int(params[2])
-	result.penStyle = int(params[3])
+	result.penColor = Color.read(ints[params[1]])
+	result.depth = ints[params[2]]
+	result.penStyle = ints[params[3]]
 	result.font = Font.read(params[4])
-	result.fontSize = float(params[5])
-	result.angle = float(params[6])
-	result.fontFlags = int(params[7])
+	result.fontSize = floats[params[5]]
+	result.angle = floats[params[6]]
+	result.fontFlags = ints[params[7]]
 	#print float(params[8])/result.fontSize, float(params[9])/len(result.text)
-	result.height = float(params[8])
-	result.length = float(params[9])
+	result.height = floats[params[8]]
+	result.length = floats[params[9]]
 	return result, 0
 
 # --------------------------------------------------------------------
@@ -1724,13 +2553,667 @@ class _AllObjectIter(object):
 			del self.iters[-1]
 		return self.next()
 
+def _indexIdentical(objects, obj):
+	"""Return the index of `obj` in the list `objects`, comparing by
+	identity (`Compound` objects are lists and would compare by
+	contents)."""
+	if not isinstance(obj, list):
+		# fig objects compare by identity anyway:
+		return list.index(objects, obj)
+	for i, o in enumerate(objects):
+		if o is obj:
+			return i
+	raise ValueError("object not found")
+
+def _removeIdentical(objects, obj):
+	"""Remove `obj` from the list `objects`, comparing by identity."""
+	del objects[_indexIdentical(objects, obj)]
+
+class _DepthIndex(object):
+	"""helper class, see `Container.enableDepthIndex`
+
+	Maps depths to the direct (non-compound) children of a container
+	at that depth.  Children get increasing order keys when they are
+	added, which allows to restore document order within a layer
+	(and to merge the results of child compounds) without walking
+	the whole container."""
+
+	__slots__ = ("container", "layers", "order", "nextKey",
+				 "unsorted", "compounds", "stale")
+
+	def __init__(self, container):
+		self.container = container
+		self.reset()
+		for o in container:
+			self.add(o)
+
+	def reset(self):
+		self.layers = {}
+		self.order = {}
+		self.nextKey = 0
+		self.unsorted = {}
+		self.compounds = []
+		self.stale = False
+
+	def add(self, o):
+		if self.stale:
+			return
+		self.order[id(o)] = self.nextKey
+		self.nextKey += 1
+		if isinstance(o, Compound):
+			self.compounds.append(o)
+			o.enableDepthIndex()
+			return
+		self.layers.setdefault(o.depth, []).append(o)
+		if o._depthIndices is None:
+			o._depthIndices = [self]
+		else:
+			o._depthIndices.append(self)
+
+	def discard(self, o):
+		if self.stale or self.order.pop(id(o), None) is None:
+			return
+		if isinstance(o, Compound):
+			_removeIdentical(self.compounds, o)
+			return
+		self.layers[o.depth].remove(o)
+		_removeIdentical(o._depthIndices, self)
+
+	def moved(self, o, oldDepth, newDepth):
+		if self.stale or oldDepth == newDepth:
+			return
+		self.layers[oldDepth].remove(o)
+		self.layers.setdefault(newDepth, []).append(o)
+		self.unsorted[newDepth] = True
+
+	def clear(self):
+		"""Unregister from all indexed objects."""
+		for objects in self.layers.values():
+			for o in objects:
+				_removeIdentical(o._depthIndices, self)
+		self.reset()
+
+	def invalidate(self):
+		"""Let the index be rebuilt on the next query.  It is cleared
+		right away, so that it does not keep objects removed in the
+		meantime (nor do they keep referring to it)."""
+		if not self.stale:
+			self.clear()
+			self.stale = True
+
+	def rebuild(self):
+		self.clear()
+		for o in self.container:
+			self.add(o)
+
+	def check(self):
+		if self.stale:
+			self.rebuild()
+
+	def layer(self, depth):
+		return self.select((depth, ))
+
+	def select(self, depths):
+		"""Return all objects with one of the given depths, in
+		document order."""
+		self.check()
+		order = self.order
+		layers = []
+		for depth in depths:
+			objects = self.layers.get(depth)
+			if not objects:
+				continue
+			if depth in self.unsorted:
+				objects.sort(key = lambda o: order[id(o)])
+				del self.unsorted[depth]
+			layers.append(objects)
+		if not self.compounds and len(layers) < 2:
+			return layers and list(layers[0]) or []
+		parts = [(order[id(o)], [o]) for objects in layers for o in objects]
+		for c in self.compounds:
+			sub = c._depthIndex.select(depths)
+			if sub:
+				parts.append((order[id(c)], sub))
+		parts.sort(key = operator.itemgetter(0))
+		result = []
+		for key, objects in parts:
+			result.extend(objects)
+		return result
+
+	def depths(self):
+		self.check()
+		result = dict.fromkeys(
+			[depth for depth, objects in self.layers.items() if objects])
+		for c in self.compounds:
+			result.update(dict.fromkeys(c._depthIndex.depths()))
+		return result.keys()
+
+class _SpatialIndex(object):
+	"""helper class, see `Container.enableSpatialIndex`
+
+	Uniform grid over the bounding boxes of all objects within a
+	container.  Each object is registered in all grid cells its
+	bounds overlap; objects spanning too many cells are kept in a
+	separate list that is always checked."""
+
+	__slots__ = ("container", "stale", "modificationCount", "objects",
+				 "origin", "cellSize", "gridSize", "cells", "large", "empty")
+
+	maxCellsPerObject = 16
+
+	def __init__(self, container):
+		self.container = container
+		self.build()
+
+	def _currentCount(self):
+		# (the objects of an `ObjectProxy` do not know the proxy, so
+		# modifications of any document make its index stale)
+		if isinstance(self.container, ObjectProxy):
+			return _modificationCount
+		return _pointModificationCount
+
+	def isStale(self):
+		"""Return whether objects within the container have been
+		modified, added, or removed since the index was built
+		(modifications of other documents only matter if they change
+		points in-place, see `_documentModified`)."""
+		return self.stale or self.modificationCount != self._currentCount()
+
+	def build(self):
+		self.stale = False
+		self.modificationCount = self._currentCount()
+		self.objects = list(self.container.allObjects())
+		self.cells = {}
+		self.large = []
+		self.empty = []
+
+		entries = []
+		total = Rect()
+		for i, o in enumerate(self.objects):
+			b = o.bounds()
+			if b.empty():
+				self.empty.append(i)
+				continue
+			entries.append((b.x1, b.y1, b.x2, b.y2, i))
+			total(b)
+
+		if not entries:
+			self.origin = (0, 0)
+			self.cellSize = 1.0
+			self.gridSize = (0, 0)
+			return
+
+		self.origin = (total.x1, total.y1)
+		self.cellSize = max(total.width(), total.height(), 1) / \
+						max(1.0, math.sqrt(len(entries)))
+		self.gridSize = (self._cell(total.x2, 0) + 1,
+						 self._cell(total.y2, 1) + 1)
+
+		for entry in entries:
+			cx1, cy1, cx2, cy2 = self._cellRange(entry)
+			if (cx2-cx1+1)*(cy2-cy1+1) > self.maxCellsPerObject:
+				self.large.append(entry)
+				continue
+			for cx in range(cx1, cx2+1):
+				for cy in range(cy1, cy2+1):
+					self.cells.setdefault((cx, cy), []).append(entry)
+
+	def _cell(self, coord, dim):
+		return int(math.floor((coord - self.origin[dim]) / self.cellSize))
+
+	def _cellRange(self, entry):
+		x1, y1, x2, y2 = entry[:4]
+		return (max(0, self._cell(x1, 0)),
+				max(0, self._cell(y1, 1)),
+				min(self.gridSize[0]-1, self._cell(x2, 0)),
+				min(self.gridSize[1]-1, self._cell(y2, 1)))
+
+	def candidates(self, rect):
+		"""Return all entries whose bounds intersect `rect`."""
+		if self.isStale():
+			self.build()
+		x1, y1, x2, y2 = rect
+		result = {}
+		for entry in self.large:
+			result[entry[4]] = entry
+		cx1, cy1, cx2, cy2 = self._cellRange((x1, y1, x2, y2, None))
+		cells = self.cells
+		for cx in range(cx1, cx2+1):
+			for cy in range(cy1, cy2+1):
+				for entry in cells.get((cx, cy), ()):
+					result[entry[4]] = entry
+		return [entry for entry in result.values()
+				if entry[0] <= x2 and x1 <= entry[2] and
+				entry[1] <= y2 and y1 <= entry[3]]
+
+	def _objects(self, indices):
+		indices.sort()
+		return [self.objects[i] for i in indices]
+
+	def intersecting(self, rect):
+		return self._objects([entry[4] for entry in self.candidates(rect)])
+
+	def within(self, rect):
+		x1, y1, x2, y2 = rect
+		return self._objects(
+			[entry[4] for entry in self.candidates(rect)
+			 if x1 <= entry[0] and entry[2] <= x2 and
+			 y1 <= entry[1] and entry[3] <= y2] + self.empty)
+
+# --------------------------------------------------------------------
+#                               queries
+# --------------------------------------------------------------------
+
+class _Missing(object):
+	"""Value of attributes an object does not have (see `Query`);
+	does not fulfill any comparison."""
+
+	__slots__ = ()
+
+	def __eq__(self, other):
+		return False
+
+	__ne__ = __lt__ = __le__ = __gt__ = __ge__ = __eq__
+
+	def __hash__(self):
+		return 0
+
+_missing = _Missing()
+
+_hashConsistentTypes = frozenset((int, long, float, bool, str, unicode,
+								  type(None), _NamedInt))
+"""types whose instances have equal hashes whenever they compare
+equal to each other (used for ``__in`` queries)"""
+
+_queryOperators = {
+	"eq" : "%s == %s",
+	"ne" : "%s != %s",
+	"lt" : "%s < %s",
+	"le" : "%s <= %s",
+	"gt" : "%s > %s",
+	"ge" : "%s >= %s",
+	"in" : "%s in %s",
+	"range" : "%s[0] <= %s <= %s[1]",
+	}
+
+def _queryCondition(key, value):
+	"""Parse a keyword condition of a `Query` into a
+	(key, operator, value) triple."""
+
+	op = "eq"
+	if "__" in key:
+		key, op = key.rsplit("__", 1)
+		if op not in _queryOperators:
+			raise TypeError("Query: unknown operator %r (in %s__%s)" % (op, key, op))
+	if key in ("type", "within") and op not in ("eq", "in") \
+		   or key == "within" and op == "in":
+		raise TypeError("Query: operator %r not supported for %r" % (op, key))
+	if op == "in":
+		value = tuple(value)
+	elif op == "range":
+		low, high = value
+		value = (low, high)
+	return key, op, value
+
+def _conditionSource(condition, values, subject):
+	"""Return python expression for the given (key, op, value)
+	condition of a `Query`, testing the object `subject`.  The value
+	is stored in the dictionary `values` (used as namespace of the
+	expression)."""
+
+	key, op, value = condition
+	name = "_v%d" % len(values)
+	values[name] = value
+	if key == "type":
+		return "isinstance(%s, %s)" % (subject, name)
+	if key == "within":
+		return "%s.contains(%s.bounds())" % (name, subject)
+	if subject == "o":
+		subject = "getattr(o, %r, _missing)" % key
+	if op == "range":
+		return _queryOperators[op] % (name, subject, name)
+	if op == "in" and key != "type" and value and \
+		   set(map(type, value)) <= _hashConsistentTypes:
+		# a set is faster for many values, but only usable for
+		# attribute values that hash consistently with == as well
+		# (not e.g. `CustomColor` objects, which are equal to ints):
+		setName = name + "set"
+		values[setName] = frozenset(value)
+		values["_hashConsistentTypes"] = _hashConsistentTypes
+		return "(%s in %s if type(%s) in _hashConsistentTypes else %s in %s)" % (
+			subject, setName, subject, subject, name)
+	return _queryOperators[op] % (subject, name)
+
+class Query(object):
+	"""Conditions for `Container.findObjects`, which can be combined
+	with ``&`` (and), ``|`` (or), and ``~`` (not), e.g.::
+
+	  q = fig.Query(depth__in = (10, 20)) | fig.Query(type = fig.Text)
+	  figFile.findObjects(q, lineWidth__gt = 1)
+
+	All keyword conditions given to the constructor must be
+	fulfilled.  Each keyword is an attribute name, optionally
+	followed by two underscores and one of these operators:
+
+	- ``eq`` (default), ``ne``, ``lt``, ``le``, ``gt``, ``ge``
+	- ``in``: the value is contained in the given sequence
+	- ``range``: ``low <= value <= high`` for the given (low, high)
+
+	The key "type" (with ``eq`` or ``in``) tests the class of the
+	objects, "within" tests whether their bounds lie within the
+	given `Rect`.  Objects without the attribute do not match any
+	condition on it.
+
+	A query is compiled into a single python function (see
+	`predicate`) when it is first used, and `findObjects` uses the
+	depth and spatial indices (if enabled) to determine the objects
+	this function has to be applied to."""
+
+	__slots__ = ("op", "args", "_predicate")
+
+	def __init__(self, **conditions):
+		self.op = "and"
+		self.args = [_queryCondition(key, value)
+					 for key, value in sorted(conditions.items())]
+		self._predicate = None
+
+	def _combine(self, op, others):
+		result = Query()
+		result.op = op
+		for arg in others:
+			if isinstance(arg, Query) and arg.op == op:
+				result.args.extend(arg.args)
+			else:
+				result.args.append(arg)
+		return result
+
+	def __and__(self, other):
+		if not isinstance(other, Query):
+			return NotImplemented
+		return self._combine("and", (self, other))
+
+	def __or__(self, other):
+		if not isinstance(other, Query):
+			return NotImplemented
+		return self._combine("or", (self, other))
+
+	def __invert__(self):
+		return self._combine("not", (self, ))
+
+	def _source(self, values, subject = "o", key = None):
+		"""Return python expression for this query (see
+		`_conditionSource`).  If `key` is given, return a (weaker)
+		condition that only tests the attribute `key` of all objects
+		matching the query, or None if there is none."""
+
+		terms = []
+		for arg in self.args:
+			if isinstance(arg, Query):
+				term = arg._source(values, subject, key)
+				if term is not None:
+					term = "(%s)" % term
+			elif key is None or arg[0] == key:
+				term = _conditionSource(arg, values, subject)
+			else:
+				term = None
+			if term is None:
+				if self.op != "and":
+					return None
+			else:
+				terms.append(term)
+
+		if self.op == "not":
+			if key is not None:
+				return None
+			return "not %s" % terms[0]
+		if not terms:
+			return key is None and "True" or None
+		return (" %s " % self.op).join(terms)
+
+	def predicate(self):
+		"""Return a function that tells whether a given object
+		matches this query."""
+
+		if self._predicate is None:
+			values = {"_missing" : _missing}
+			self._predicate = eval("lambda o: " + self._source(values), values)
+		return self._predicate
+
+	def depthPredicate(self):
+		"""Return a function that tells whether objects with a given
+		depth may match this query, or None if the query does not
+		restrict the depth."""
+
+		values = {}
+		source = self._source(values, "depth", "depth")
+		if source is None:
+			return None
+		return eval("lambda depth: " + source, values)
+
+	def includesCompounds(self):
+		"""Return whether this query explicitly asks for `Compound`
+		objects (i.e. contains type = Compound)."""
+
+		for arg in self.args:
+			if isinstance(arg, Query):
+				if arg.includesCompounds():
+					return True
+			elif arg[0] == "type" and (
+				arg[2] == Compound or arg[1] == "in" and Compound in arg[2]):
+				return True
+		return False
+
+	def within(self):
+		"""Return the `Rect` all objects matching this query must
+		lie within, if any."""
+
+		if self.op == "and":
+			for arg in self.args:
+				if not isinstance(arg, Query) and arg[0] == "within":
+					return arg[2]
+		return None
+
+_classAttributes = {}
+
+def _hasAttribute(cls, key):
+	"""Return whether instances of `cls` have the attribute `key`,
+	or None if this depends on the instance (slots may be unset, and
+	instances with a __dict__ may have extra attributes).  Only
+	properties and slots count (not e.g. methods).  Used by
+	`ObjectProxy` for checking each class only once."""
+	try:
+		return _classAttributes[cls, key]
+	except KeyError:
+		for klass in cls.__mro__:
+			if key in klass.__dict__:
+				attribute = klass.__dict__[key]
+				if isinstance(attribute, property):
+					result = True
+				elif isinstance(attribute, types.MemberDescriptorType):
+					result = None
+				else:
+					result = False
+				break
+		else:
+			result = False
+			if cls.__dictoffset__:
+				result = None
+		_classAttributes[cls, key] = result
+		return result
+
+def _makeQuery(queries, conditions):
+	"""Return `Query` requiring all given queries and keyword
+	conditions (see `Container.findObjects`)."""
+	query = Query(**conditions)
+	if queries:
+		query = query._combine("and", queries + (query, ))
+	return query
+
 class Container(list):
 	"""Container for fig objects, derived from the standard python
 	list.  This is the common superclass of `File` (for the whole
 	document), `Compound`, and `ObjectProxy` (for search results, see
 	`findObjects()` or `layer()`)."""
 	
-	__slots__ = ()
+	__slots__ = ("_depthIndex", "_spatialIndex")
+
+	_transientSlots = ("_depthIndex", "_spatialIndex")
+	"""indices that are not copied or pickled (but rebuilt on demand)"""
+
+	_parent = None # (only a `Compound` has a parent)
+
+	def __init__(self, objects = ()):
+		list.__init__(self, objects)
+		self._depthIndex = None
+		self._spatialIndex = None
+		self._link(self)
+
+	def enableDepthIndex(self):
+		"""container.enableDepthIndex()
+
+		Maintain an index from depths to the objects within this
+		container (and, recursively, within contained `Compound`
+		objects), which makes `layer()` and `layers()` cost time
+		proportional to the size of the result instead of walking
+		all objects.  The index is kept up-to-date by `append()`,
+		`remove()`, and assignments to the `depth` of contained
+		objects; other list modifications (insert, slicing, sort,
+		...) let it be rebuilt on the next query.
+
+		This is useful for large documents on which `layer()` is
+		called repeatedly, e.g. for all `layers()`."""
+
+		if self._depthIndex is None:
+			self._depthIndex = _DepthIndex(self)
+
+	def disableDepthIndex(self):
+		"""Stop maintaining the depth index, see `enableDepthIndex`."""
+		if self._depthIndex is not None:
+			self._depthIndex.clear()
+			self._depthIndex = None
+
+	def enableSpatialIndex(self):
+		"""container.enableSpatialIndex()
+
+		Build a spatial index (a uniform grid) over the bounding
+		boxes of all objects within this container, which is then
+		used by `objectsIntersecting()`, `objectsWithin()`,
+		`objectsAt()`, and ``findObjects(within = ...)`` to answer
+		region queries without checking every object.
+
+		The index is rebuilt automatically on the next query after
+		the document has been modified, i.e. it is only as accurate
+		as the cached object bounds (see `Object.bounds`)."""
+
+		self._spatialIndex = _SpatialIndex(self)
+
+	def disableSpatialIndex(self):
+		"""Drop the spatial index, see `enableSpatialIndex`."""
+		self._spatialIndex = None
+
+	def __reduce_ex__(self, protocol):
+		# the objects are restored by __setstate__, since append()
+		# needs the (transient) slots to be initialized:
+		return (copy_reg.__newobj__, (type(self), ), self.__getstate__())
+
+	def __getstate__(self):
+		state = {}
+		for klass in type(self).__mro__:
+			for name in getattr(klass, "__slots__", ()):
+				if name not in self._transientSlots and hasattr(self, name):
+					state[name] = getattr(self, name)
+		return (list(self), state)
+
+	def __setstate__(self, state):
+		objects, state = state
+		for name in self._transientSlots:
+			object.__setattr__(self, name, None)
+		for name, value in state.items():
+			object.__setattr__(self, name, value)
+		list.extend(self, objects)
+		self._link(objects)
+
+	def _modified(self):
+		_documentModified(self)
+		if self._depthIndex is not None:
+			self._depthIndex.invalidate()
+
+	def _link(self, objects):
+		"""Set the parent pointers of the given new children (see
+		`Object.parentContainer()`)."""
+		for o in objects:
+			o._parent = self
+
+	def _unlink(self, objects):
+		"""Reset the parent pointers of the given removed children."""
+		for o in objects:
+			if getattr(o, "_parent", None) is self:
+				o._parent = None
+
+	def append(self, object):
+		list.append(self, object)
+		object._parent = self
+		_documentModified(self)
+		if self._depthIndex is not None:
+			self._depthIndex.add(object)
+
+	def extend(self, objects):
+		for o in objects:
+			self.append(o)
+
+	def __iadd__(self, objects):
+		self.extend(objects)
+		return self
+
+	def insert(self, index, object):
+		list.insert(self, index, object)
+		self._link((object, ))
+		self._modified()
+
+	def pop(self, *args):
+		self._modified()
+		result = list.pop(self, *args)
+		self._unlink((result, ))
+		return result
+
+	def __setitem__(self, index, value):
+		if isinstance(index, slice):
+			value = list(value)
+			old, new = list.__getitem__(self, index), value
+		else:
+			old, new = (list.__getitem__(self, index), ), (value, )
+		list.__setitem__(self, index, value)
+		self._unlink(old)
+		self._link(new)
+		self._modified()
+
+	def __delitem__(self, index):
+		old = list.__getitem__(self, index)
+		list.__delitem__(self, index)
+		self._unlink(isinstance(index, slice) and old or (old, ))
+		self._modified()
+
+	def __setslice__(self, start, stop, values):
+		values = list(values)
+		old = list.__getslice__(self, start, stop)
+		list.__setslice__(self, start, stop, values)
+		self._unlink(old)
+		self._link(values)
+		self._modified()
+
+	def __delslice__(self, start, stop):
+		old = list.__getslice__(self, start, stop)
+		list.__delslice__(self, start, stop)
+		self._unlink(old)
+		self._modified()
+
+	def sort(self, *args, **kwargs):
+		list.sort(self, *args, **kwargs)
+		self._modified()
+
+	def reverse(self):
+		list.reverse(self)
+		self._modified()
 
 	def allObjects(self, includeCompounds = False):
 		"""container.allObjects(includeCompounds = False) -> iterator
@@ -1742,7 +3225,7 @@ class Container(list):
 		
 		return _AllObjectIter(self, includeCompounds)
 
-	def findObjects(self, **kwargs):
+	def findObjects(self, *queries, **kwargs):
 		"""Return a list of objects which have attribute/value pairs
 		matching the given keyword parameters.  The key "type" is
 		treated special, see these useful examples::
@@ -1751,40 +3234,114 @@ class Container(list):
 		  figFile.findObjects(type = fig.Polygon)
 		  # all conditions must be fulfilled:
 		  figFile.findObjects(lineWidth = 10, depth = 100)
-		  # for disjunctive conditions, use list concatenation:
-		  figFile.findObjects(depth = 10) + figFile.findObjects(depth = 20)
+		  # operators (see `Query`):
+		  figFile.findObjects(depth__in = (10, 20), lineWidth__gt = 1)
+		  # for disjunctive conditions, combine `Query` objects:
+		  figFile.findObjects(fig.Query(depth = 10) | fig.Query(type = fig.Text))
+
+		All given `Query` objects and keyword conditions must be
+		fulfilled.  Compounds are only returned when asked for with
+		``type = fig.Compound``.  All objects are checked in a single
+		pass; if the depth or spatial index is enabled (see
+		`enableDepthIndex`, `enableSpatialIndex`), only the objects
+		in the matching layers resp. area are checked.
 
 		The returned object is actually an `ObjectProxy`, which is a
 		special `Container` (which is a special python list) and allows
 		to quickly change properties on all contained objects.  See
 		the `Container` and `ObjectProxy` classes."""
 
-		result = ObjectProxy(parent = self)
-		for o in self.allObjects("type" in kwargs and kwargs["type"] == Compound):
-			match = True
-			for key, value in kwargs.items():
-				if key == "type":
-					if not isinstance(o, value):
-						match = False
-						break
-				elif key == "within":
-					if not value.contains(o.bounds()):
-						match = False
-						break
-				elif getattr(o, key, "attribNotPresent") != value:
-					match = False
-					break
-			if match:
-				result.append(o)
+		query = _makeQuery(queries, kwargs)
+		if not _tracers:
+			return ObjectProxy(filter(query.predicate(), self._candidates(query)),
+							   parent = self)
+
+		trace = _startTrace("findObjects",
+							self.filename if isinstance(self, File) else None)
+		candidates = list(self._candidates(query))
+		result = ObjectProxy(filter(query.predicate(), candidates), parent = self)
+		trace.counts["scanned"] = len(candidates)
+		trace.counts["matched"] = len(result)
+		trace.finish()
 		return result
 
+	def query(self, *queries, **kwargs):
+		"""container.query(...) -> `QueryView`
+
+		Like `findObjects`, but returns a lazy `QueryView`, i.e. the
+		objects are only searched when the result is used, and
+		further conditions can be added without building
+		intermediate lists::
+
+		  figFile.query(depth = 10).findObjects(type = fig.Polyline).count()"""
+
+		return QueryView(self, _makeQuery(queries, kwargs))
+
+	def _candidates(self, query):
+		"""Return iterable over all objects that have to be checked
+		for matching the given `Query`."""
+
+		objects = None
+		includeCompounds = query.includesCompounds()
+		if not includeCompounds:
+			within = query.within()
+			if within is not None and self._spatialIndex is not None:
+				objects = self._spatialIndex.within(within)
+			elif self._depthIndex is not None:
+				depthPredicate = query.depthPredicate()
+				if depthPredicate is not None:
+					objects = self._depthIndex.select(
+						filter(depthPredicate, self._depthIndex.depths()))
+		if objects is None:
+			objects = self.allObjects(includeCompounds)
+		return objects
+
+	def objectsWithin(self, rect):
+		"""container.objectsWithin(rect) -> `ObjectProxy`
+
+		Returns all objects whose bounds lie entirely within the
+		`Rect` `rect`; same as ``findObjects(within = rect)``."""
+
+		if self._spatialIndex is not None:
+			return ObjectProxy(self._spatialIndex.within(rect), parent = self)
+		return self.findObjects(within = rect)
+
+	def objectsIntersecting(self, rect):
+		"""container.objectsIntersecting(rect) -> `ObjectProxy`
+
+		Returns all objects whose bounds overlap the `Rect` `rect`.
+		(See `enableSpatialIndex` for making this fast.)"""
+
+		if rect.empty():
+			return ObjectProxy(parent = self)
+		if self._spatialIndex is not None:
+			return ObjectProxy(self._spatialIndex.intersecting(rect),
+							   parent = self)
+		return ObjectProxy([o for o in self.allObjects()
+							if rect.intersects(o.bounds())], parent = self)
+
+	def objectsAt(self, point, tolerance = 0):
+		"""container.objectsAt(point, tolerance = 0) -> `ObjectProxy`
+
+		Returns all objects whose bounds contain `point` (or come
+		closer than `tolerance` in x- and y-direction), e.g. for
+		hit-testing mouse clicks.  Note that this tests bounding
+		boxes only, not the actual shape."""
+
+		return self.objectsIntersecting(Rect(
+			point[0] - tolerance, point[1] - tolerance,
+			point[0] + tolerance, point[1] + tolerance))
+
 	def layer(self, layer):
 		"""container.layer(layer) -> `ObjectProxy`
 
 		Returns an `ObjectProxy` for all objects within this container
 		that have the given depth; convenience shortcut for
-		``findObjects(depth = layer)``."""
+		``findObjects(depth = layer)``.  (See `enableDepthIndex`
+		for making this fast on large containers.)"""
 		
+		if self._depthIndex is not None:
+			return ObjectProxy(self._depthIndex.layer(layer), parent = self)
 		return self.findObjects(depth = layer)
 
 	def layers(self):
@@ -1793,6 +3350,10 @@ class Container(list):
 		Returns the list of all integer depths that are assigned to at
 		least one object within this container."""
 		
+		if self._depthIndex is not None:
+			result = self._depthIndex.depths()
+			result.sort()
+			return result
 		result = dict.fromkeys([ob.depth for ob in self.allObjects()]).keys()
 		result.sort()
 		return result
@@ -1808,7 +3369,16 @@ class Container(list):
 		recursively for objects within `Compound` objects within this
 		`Container`.  Raises a ValueError if `obj` is not
 		contained."""
-		
+
+		# the object's container is known unless obj is in an ObjectProxy:
+		parent = getattr(obj, "_parent", None)
+		if parent is not None and self._isAncestorOf(parent):
+			try:
+				parent._removeChildren((obj, ))
+				return
+			except ValueError: # obj has been moved into another container
+				pass
+
 		try:
 			list.remove(self, obj)
 		except ValueError:
@@ -1820,6 +3390,84 @@ class Container(list):
 					except ValueError:
 						pass
 			raise ValueError("remove(): Given object not found in Container.")
+		self._unlink((obj, ))
+		_documentModified(self)
+		if self._depthIndex is not None:
+			self._depthIndex.discard(obj)
+
+	def _isAncestorOf(self, container):
+		"""Return whether `container` is self or (recursively)
+		contained in self."""
+		while container is not None:
+			if container is self:
+				return True
+			container = getattr(container, "_parent", None)
+		return False
+
+	def _removeChildren(self, objects):
+		"""Remove the given direct children from this container."""
+		if len(objects) == 1:
+			obj, = objects
+			list.__delitem__(self, _indexIdentical(self, obj))
+			self._unlink(objects)
+			_documentModified(self)
+			if self._depthIndex is not None:
+				self._depthIndex.discard(obj)
+		else:
+			self._removeIds(set(map(id, objects)))
+
+	def adopt(self, objects):
+		"""container.adopt(objects)
+
+		Moves the given objects from their current containers (see
+		`Object.parentContainer()`) to the end of this one.  Only the
+		affected containers are touched (i.e. the document does not
+		have to be searched), so regrouping many objects is fast."""
+
+		objects = list(objects)
+		for o in objects:
+			if isinstance(o, Container) and o._isAncestorOf(self):
+				raise ValueError("adopt(): cannot move a compound into itself")
+		parents = {}
+		for o in objects:
+			parent = o._parent
+			if parent is not None:
+				parents.setdefault(id(parent), (parent, []))[1].append(o)
+		for parent, children in parents.values():
+			parent._removeChildren(children)
+		for o in objects:
+			self.append(o)
+
+	def removeAll(self, objects):
+		"""container.removeAll(objects) -> int
+
+		Removes all given objects from this `Container` (and, like
+		`remove`, from all `Compound` objects within it) in a single
+		pass, comparing the objects by identity.  Objects that are not
+		contained are ignored.  Returns the number of removed
+		objects."""
+
+		objects = list(objects) # (keeps the ids valid)
+		return self._removeIds(set(map(id, objects)))
+
+	def _removeIds(self, ids):
+		"""Remove all objects whose id() is in the set `ids` (which
+		is updated) from this container and its compounds."""
+
+		removed = [o for o in self if id(o) in ids]
+		if removed:
+			list.__setslice__(self, 0, len(self),
+							  [o for o in self if id(o) not in ids])
+			ids.difference_update(map(id, removed))
+			self._unlink(removed)
+			self._modified()
+		count = len(removed)
+		for o in self:
+			if not ids:
+				break
+			if isinstance(o, Compound):
+				count += o._removeIds(ids)
+		return count
 
 	def container(self):
 		"""Return self, see `ObjectProxy.container()`."""
@@ -1827,9 +3475,8 @@ class Container(list):
 
 	def bounds(self):
 		"""Return the union of all bounding boxes of the contained
-		objects.  This value is not cached (because it cannot be
-		reliably updated if childrens change) but will be determined
-		on each call."""
+		objects.  (The bounds of the objects themselves and those of
+		`Compound` objects are cached, see `Object.bounds`.)"""
 		
 		result = Rect()
 		for object in self:
@@ -1860,21 +3507,89 @@ class ObjectProxy(Container):
 	  Objects that do not have the attribute are gracefully skipped;
 	  `None` is returned if the objects do not all have the same value
 	  for the requested attribute.  (An `AttributeError` is only
-	  raised if none of the objects has the requested attribute.)"""
+	  raised if none of the objects has the requested attribute.)
+
+	update(**attributes):
+	  ``foo.layer(50).update(penColor = fig.Color.Red, lineWidth = 2)``
+
+	  Sets several attributes at once (again, only on the objects
+	  that have the respective attribute).
+
+	values(key):
+	  ``file.findObjects(type = fig.Text).values("fontSize")``
+
+	  Returns a list of (value, count) pairs for all distinct values
+	  of the attribute (in the order of their first occurrence).
+
+	Whether an object has an attribute is determined once per class
+	(i.e. from the slots and properties of the class), which makes
+	these operations fast even for many objects."""
 	
 	__slots__ = ("parent", )
 
 	def __init__(self, objects = [], parent = None):
 		Container.__init__(self, objects)
 		self.parent = parent
+
+	# search results are never indexed and do not modify the document:
+	append = list.append
+
+	def _link(self, objects):
+		pass # (the objects stay in their containers)
+
+	_unlink = _link
+
+	def adopt(self, objects):
+		raise TypeError("adopt(): search results do not contain objects themselves")
 	
+	def _byClass(self):
+		"""Return list of (class, objects) pairs for all classes of
+		the contained objects."""
+		classes = map(type, self)
+		distinct = set(classes)
+		if len(distinct) == 1:
+			return [(classes[0], self)]
+		return [(cls, list(itertools.compress(self, itertools.imap(
+					operator.is_, classes, itertools.repeat(cls)))))
+				for cls in distinct]
+
+	def _membersWith(self, key):
+		"""Return list of the contained objects that may have the
+		attribute `key` (see `_hasAttribute`), in their order, and
+		whether they certainly have it (slots may be unset)."""
+		classes = map(type, self)
+		has = dict([(cls, _hasAttribute(cls, key)) for cls in set(classes)])
+		certain = None not in has.values()
+		if False not in has.values():
+			return self, certain
+		keep = dict([(cls, value is not False) for cls, value in has.items()])
+		return list(itertools.compress(self, itertools.imap(
+			keep.__getitem__, classes))), certain
+
 	def __setattr__(self, key, value):
-		if key == "parent":
+		if key in ("parent", "_depthIndex", "_spatialIndex"):
 			Container.__setattr__(self, key, value)
 			return
-		for ob in self:
-			if hasattr(ob, key):
-				setattr(ob, key, value)
+		objects, certain = self._membersWith(key)
+		if certain:
+			map(setattr, objects, [key] * len(objects), [value] * len(objects))
+		else:
+			for o in objects:
+				if hasattr(o, key):
+					setattr(o, key, value)
+
+	def update(self, **attributes):
+		"""Set all given attributes on the contained objects that
+		have the respective attribute."""
+		for cls, objects in self._byClass():
+			for key, value in attributes.items():
+				has = _hasAttribute(cls, key)
+				if has:
+					map(setattr, objects, [key] * len(objects), [value] * len(objects))
+				elif has is None: # (slots may be unset)
+					for o in objects:
+						if hasattr(o, key):
+							setattr(o, key, value)
 
 	def __getattr__(self, key):
 		"""Forwards attribute lookup to the contained objects.
@@ -1887,21 +3602,47 @@ class ObjectProxy(Container):
 		ignored (i.e. proxy.font will gracefully skip non-`Text`
 		objects).  An `AttributeError` is only raised of none of the
 		objects has the requested attribute."""
-		
-		found = False
-		result = None # (prevent false positive in pyflakes)
-		for ob in self:
-			if hasattr(ob, key):
-				if found:
-					if getattr(ob, key) != result:
-						return None
-				else:
-					result = getattr(ob, key)
-					found = True
-		if not found:
+
+		values = itertools.imap(getattr, self._membersWith(key)[0],
+								itertools.repeat(key), itertools.repeat(_missing))
+		for result in values:
+			if result is not _missing:
+				break
+		else:
 			raise AttributeError("No Object within ObjectProxy has a '%s' attribute!" % key)
+		# (stops at the first differing value; _missing != x is False)
+		if any(itertools.imap(operator.ne, values, itertools.repeat(result))):
+			return None
 		return result
 
+	def values(self, key):
+		"""Return list of (value, count) pairs for all distinct values
+		of the attribute `key` among the contained objects, in the
+		order of their first occurrence.  Objects that do not have
+		the attribute are ignored."""
+
+		result, index, unhashable = [], {}, []
+		for value in itertools.imap(getattr, self._membersWith(key)[0],
+									itertools.repeat(key), itertools.repeat(_missing)):
+			if value is _missing:
+				continue
+			try:
+				entry = index.get(value)
+			except TypeError: # e.g. lists of points
+				for entry in unhashable:
+					if entry[0] == value:
+						break
+				else:
+					entry = [value, 0]
+					unhashable.append(entry)
+					result.append(entry)
+			else:
+				if entry is None:
+					entry = index[value] = [value, 0]
+					result.append(entry)
+			entry[1] += 1
+		return [tuple(entry) for entry in result]
+
 	def __getslice__(self, *args):
 		"""Support slicing, i.e. returns an ObjectProxy with the same
 		parent."""
@@ -1910,14 +3651,16 @@ class ObjectProxy(Container):
 
 	def remove(self, *args):
 		"""When no arguments are given, remove all objects from parent
-		container.  Else, remove given object from this container."""
+		container (raising a ValueError if any of them is no longer
+		contained in it, after removing all others).  Else, remove
+		given object from this container."""
 		
 		if not args:
 			parent = self.container()
 			assert parent is not None, \
 				   "ObjectProxy.remove() needs access to the parent"
-			for ob in self:
-				parent.remove(ob)
+			if parent.removeAll(self) < len(set(map(id, self))):
+				raise ValueError("remove(): Given object not found in Container.")
 		else:
 			Container.remove(self, *args)
 
@@ -1935,11 +3678,91 @@ class ObjectProxy(Container):
 		source ObjectProxies being added together have different
 		parents, the result will have a parent of None.)"""
 		parent = self.container()
-		if parent is not other.container():
+		if isinstance(other, ObjectProxy):
+			if parent is not other.container():
+				parent = None
+		elif parent is not other:
 			parent = None
 		if isinstance(other, list):
 			return ObjectProxy(list.__add__(self, other), parent)
 
+class QueryView(object):
+	"""Lazy search result, see `Container.query`.  A QueryView only
+	stores the container and the `Query`; the objects are searched
+	whenever the view is iterated over, e.g. by:
+
+	- ``count()``, ``first()``, ``exists()`` (which stop as early as
+	  possible; ``bool()`` is the same as ``exists()``), or ``list()``
+	- ``proxy()``, which returns the current objects as `ObjectProxy`
+	- setting or querying attributes, or ``remove()``, which work
+	  like with an `ObjectProxy`
+
+	There is no ``len()``, since every call would search again (and
+	``list()`` would search twice); use ``count()`` instead.
+	``findObjects()``, ``query()``, and ``layer()`` return a new
+	QueryView with the additional conditions."""
+
+	__slots__ = ("container", "_query")
+
+	def __init__(self, container, query):
+		object.__setattr__(self, "container", container)
+		object.__setattr__(self, "_query", query)
+
+	def __iter__(self):
+		return itertools.ifilter(self._query.predicate(),
+								 self.container._candidates(self._query))
+
+	def findObjects(self, *queries, **kwargs):
+		return QueryView(self.container, self._query._combine(
+			"and", (self._query, _makeQuery(queries, kwargs))))
+
+	query = findObjects
+
+	def layer(self, layer):
+		return self.findObjects(depth = layer)
+
+	def count(self):
+		"""Return the number of matching objects."""
+		result = 0
+		for o in self:
+			result += 1
+		return result
+
+	def first(self):
+		"""Return the first matching object, or None."""
+		for o in self:
+			return o
+		return None
+
+	def exists(self):
+		"""Return whether there is any matching object."""
+		for o in self:
+			return True
+		return False
+
+	__nonzero__ = exists
+
+	def proxy(self):
+		"""Return `ObjectProxy` with all currently matching objects."""
+		return ObjectProxy(list(self), parent = self.container)
+
+	def remove(self):
+		"""Remove all matching objects from the container."""
+		self.proxy().remove()
+
+	def __setattr__(self, key, value):
+		# (changing the objects may affect the query and the indices,
+		# so the matching objects are collected first)
+		setattr(self.proxy(), key, value)
+
+	def __getattr__(self, key):
+		if key.startswith("_"):
+			raise AttributeError(key)
+		return getattr(self.proxy(), key)
+
+	def __repr__(self):
+		return "<QueryView of %d objects>" % (self.count(), )
+
 # --------------------------------------------------------------------
 #                             compounds
 # --------------------------------------------------------------------
@@ -1947,53 +3770,411 @@ class ObjectProxy(Container):
 class Compound(Container):
 	"""Represents a group of XFig objects."""
 
-	__slots__ = ("comment", )
+	__slots__ = ("comment", "_parent", "_boundsCache", "_source")
+
+	_transientSlots = Container._transientSlots + (
+		"_parent", "_boundsCache", "_source")
 	
 	def __init__(self, parent = None):
 		Container.__init__(self)
 		self.comment = ""
+		self._parent = None
+		self._boundsCache = None
+		self._source = None
 		if parent != None:
 			parent.append(self)
 
+	parentContainer = _parentContainer
+	detach = _detach
+
+	def __getstate__(self):
+		objects, state = Container.__getstate__(self)
+		# (keep the source text of lazily read compounds for saving,
+		# see `_sourceChunks`)
+		if self._source is not None:
+			state["_source"] = self._source
+		return objects, state
+
 	def __deepcopy__(self, memo):
 		result = Compound()
+		result.comment = self.comment
 		for o in self:
 			result.append(copy.deepcopy(o, memo))
+		source = self._source
+		if source is not None and tuple(self) == source[2]:
+			header, comment, objects, footer = source
+			result._source = (header, comment, tuple(result), footer)
 		return result
 
-	def __str__(self):
+	def bounds(self):
+		"""Return the union of all bounding boxes of the contained
+		objects.  Like `Object.bounds`, the result is cached until
+		the document is modified."""
+
+		cache = self._boundsCache
+		if cache is None or cache[0] != _modificationCount:
+			cache = self._boundsCache = (
+				_modificationCount, Container.bounds(self))
+		result = Rect()
+		result(cache[1])
+		return result
+
+	def iterLines(self):
+		"""Generator yielding the XFig representation of this
+		compound in chunks of complete lines (one chunk per contained
+		object), see `File.iterLines`."""
+
+		return self._iterLines(None)
+
+	def _iterLines(self, exactBounds):
 		if len(self) < 1:
-			return ""
-		contents = ""
+			return
+		chunks = self._sourceChunks()
+		if chunks is not None:
+			for chunk in chunks:
+				yield chunk
+			return
+		# the written bounds must not depend on the cached bounds,
+		# which miss in-place modifications (see `Object.bounds`):
+		if exactBounds is None:
+			exactBounds = {}
+			_exactCompoundBounds(self, exactBounds)
+		b = exactBounds[id(self)]
+		yield _formatComment(self.comment) + \
+			  _join(ObjectType.CompoundBegin,
+					int(b.x1), int(b.y1),
+					int(b.x2), int(b.y2)) + "\n"
+		for o in self:
+			if isinstance(o, Compound):
+				for chunk in o._iterLines(exactBounds):
+					yield chunk
+			else:
+				yield o._sourceText()[0]
+		yield str(ObjectType.CompoundEnd) + "\n"
+
+	def __str__(self):
+		return "".join(self.iterLines())
+
+	def _sourceChunks(self):
+		"""Return list of the original source lines of this
+		(lazily read) compound, or None if it has been changed."""
+		source = self._source
+		if source is None:
+			return None
+		header, comment, objects, footer = source
+		if self.comment != comment or tuple(self) != objects:
+			return None
+		result = [_formatComment(comment) + header]
 		for o in self:
-			contents += str(o)
-		b = self.bounds()
-		return _formatComment(self.comment) + \
-			   _join(ObjectType.CompoundBegin,
-					 int(b.x1), int(b.y1),
-					 int(b.x2), int(b.y2)) + "\n" + \
-			   contents + str(ObjectType.CompoundEnd) + "\n"
+			if isinstance(o, Compound):
+				chunks = o._sourceChunks()
+				if chunks is None:
+					return None
+				result.extend(chunks)
+			else:
+				chunk, isOriginal = o._sourceText()
+				if not isOriginal:
+					return None
+				result.append(chunk)
+		result.append(footer)
+		return result
+
+def _exactCompoundBounds(compound, result):
+	"""Compute the bounds of `compound` and all nested compounds
+	without using any cached bounds, store them in the dict `result`
+	(by id), and return the bounds of `compound`."""
+	bounds = Rect()
+	for o in compound:
+		if isinstance(o, Compound):
+			bounds(_exactCompoundBounds(o, result))
+		else:
+			bounds(o._bounds())
+	result[id(compound)] = bounds
+	return bounds
+
+def _iterObjectLines(objects):
+	for o in objects:
+		if isinstance(o, Compound):
+			for chunk in o.iterLines():
+				yield chunk
+		else:
+			yield o._sourceText()[0]
+
+def _sourceLines(data, begin, end):
+	"""Return source text from `data`, ending with a newline."""
+	result = data[begin:end]
+	if not result.endswith("\n"):
+		result += "\n"
+	return result
 
 def _readCompound(params):
 	# ignore bounds passed in params, since we cannot guarantee proper
 	# updating later:
 	return Compound()
 
+# --------------------------------------------------------------------
+#                              tracing
+# --------------------------------------------------------------------
+
+_tracers = []
+
+def addTracer(tracer):
+	"""Register the callable `tracer`, which is then called with a
+	`TraceEvent` after each traced operation: reading a file (`File`,
+	`iterObjects`, `loadMany`), writing one (`File.write`,
+	`File.save`), `Container.findObjects`, and fig2dev runs
+	(`File.fig2dev`, `File.renderTo`, `exportMany`).  As long as no
+	tracer is registered, this costs nothing but one check per
+	operation.  Tracers may be called from the worker threads of
+	`exportMany`.  See `tracing` for a context manager."""
+	_tracers.append(tracer)
+
+def removeTracer(tracer):
+	"""Unregister a tracer registered with `addTracer`."""
+	_tracers.remove(tracer)
+
+def _startTrace(operation, filename = None):
+	"""Return a new `TraceEvent`, or None if tracing is disabled."""
+	if not _tracers:
+		return None
+	return TraceEvent(operation, filename)
+
+_objectTypeBases = (
+	(PolylineBase, ObjectType.Polygon),
+	(SplineBase,   ObjectType.Spline),
+	(ArcBase,      ObjectType.Arc),
+	(EllipseBase,  ObjectType.Ellipse),
+	(Text,         ObjectType.Text),
+	(Compound,     ObjectType.CompoundBegin),
+	)
+
+def _objectType(klass):
+	for base, objectType in _objectTypeBases:
+		if issubclass(klass, base):
+			return objectType
+	return None
+
+class TraceEvent(object):
+	"""Describes one traced operation (see `addTracer`) with the
+	following attributes:
+
+	`operation`
+	  "read", "write", "findObjects", or "fig2dev"
+	`filename`
+	  the file read or written, or the input of fig2dev (if known)
+	`duration`
+	  wall time of the operation in seconds
+	`phases`
+	  list of (name, seconds) pairs, i.e. the time spent on the
+	  "header", "colors", and "objects" of a file
+	`counts`
+	  dict with further numbers, e.g. "lines" and "bytes" read or
+	  written, or the number of objects "scanned" and "matched" by
+	  `Container.findObjects`
+	`objectTypes`
+	  dict mapping `ObjectType` values to the number of objects read
+	  or written (compounds are counted as `ObjectType.CompoundBegin`)"""
+
+	__slots__ = ("operation", "filename", "duration", "phases",
+				 "counts", "objectTypes", "_start", "_lap")
+
+	def __init__(self, operation, filename = None):
+		self.operation = operation
+		self.filename = filename
+		self.duration = None
+		self.phases = []
+		self.counts = {}
+		self.objectTypes = {}
+		self._start = self._lap = time.time()
+
+	def lap(self, phase):
+		"""Add the time since the previous call (or since the start of
+		the operation) to the given phase."""
+		now = time.time()
+		if self.phases and self.phases[-1][0] == phase:
+			self.phases[-1] = (phase, self.phases[-1][1] + now - self._lap)
+		else:
+			self.phases.append((phase, now - self._lap))
+		self._lap = now
+
+	def countObjects(self, objects):
+		"""Add the given objects to `objectTypes` (compounds are not
+		descended into, cf. `Container.allObjects`)."""
+		for klass, count in collections.Counter(itertools.imap(type, objects)).iteritems():
+			objectType = _objectType(klass)
+			self.objectTypes[objectType] = self.objectTypes.get(objectType, 0) + count
+
+	def finish(self):
+		"""Set `duration` and pass this event to all tracers."""
+		self.duration = time.time() - self._start
+		self.emit()
+
+	def emit(self):
+		"""Pass this event to all tracers."""
+		for tracer in list(_tracers):
+			tracer(self)
+
+	def __repr__(self):
+		return "<fig.TraceEvent %s%s: %.3fs>" % (
+			self.operation, self.filename and " %s" % self.filename or "",
+			self.duration or 0.0)
+
+class Metrics(object):
+	"""Tracer (see `addTracer`) that sums up the events per operation;
+	`dump()` writes a summary like this::
+
+	  read: 2 calls, 1.517s
+	    phases: header 0.000s, colors 0.001s, objects 1.516s
+	    bytes: 12180413, lines: 331904
+	    objects: Polygon 60151, Spline 14829, Text 17867, Arc 7153, CompoundBegin 6220
+	  findObjects: 1 call, 0.048s
+	    matched: 1733, scanned: 100000"""
+
+	def __init__(self):
+		import threading
+		self._lock = threading.Lock()
+		self.operations = []
+		self._stats = {}
+
+	def __call__(self, event):
+		self._lock.acquire()
+		try:
+			stats = self._stats.get(event.operation)
+			if stats is None:
+				self.operations.append(event.operation)
+				stats = self._stats[event.operation] = dict(
+					calls = 0, duration = 0.0, phases = [],
+					counts = {}, objectTypes = {})
+			stats["calls"] += 1
+			stats["duration"] += event.duration
+			phases = stats["phases"]
+			for name, seconds in event.phases:
+				for i, (known, total) in enumerate(phases):
+					if known == name:
+						phases[i] = (name, total + seconds)
+						break
+				else:
+					phases.append((name, seconds))
+			for sums, values in ((stats["counts"], event.counts),
+								 (stats["objectTypes"], event.objectTypes)):
+				for key, value in values.iteritems():
+					sums[key] = sums.get(key, 0) + value
+		finally:
+			self._lock.release()
+
+	def stats(self, operation):
+		"""Return dict with the sums for the given operation (keys
+		"calls", "duration", "phases", "counts", "objectTypes", cf.
+		`TraceEvent`), or None if it has not been traced."""
+		return self._stats.get(operation)
+
+	def dump(self, outputFile = None):
+		"""Write the summary to `outputFile` (default: sys.stderr)."""
+		(outputFile or sys.stderr).write(str(self))
+
+	def __str__(self):
+		result = []
+		for operation in self.operations:
+			stats = self._stats[operation]
+			result.append("%s: %d call%s, %.3fs\n" % (
+				operation, stats["calls"], stats["calls"] != 1 and "s" or "",
+				stats["duration"]))
+			if stats["phases"]:
+				result.append("  phases: %s\n" % ", ".join(
+					"%s %.3fs" % phase for phase in stats["phases"]))
+			if stats["counts"]:
+				result.append("  %s\n" % ", ".join(
+					"%s: %s" % item for item in sorted(stats["counts"].items())))
+			if stats["objectTypes"]:
+				result.append("  objects: %s\n" % ", ".join(
+					"%s %d" % (objectType is None and "other" or objectType.name(), count)
+					for objectType, count in sorted(stats["objectTypes"].items())))
+		return "".join(result)
+
+@contextlib.contextmanager
+def tracing(tracer = None):
+	"""Context manager registering `tracer` (default: a new `Metrics`
+	object) while the block is executed, see `addTracer`::
+
+	  with fig.tracing() as metrics:
+	      f = fig.File("huge.fig")
+	      f.findObjects(depth = 10)
+	  metrics.dump()"""
+
+	if tracer is None:
+		tracer = Metrics()
+	addTracer(tracer)
+	try:
+		yield tracer
+	finally:
+		removeTracer(tracer)
+
+def profileAtExit(outputFile = None):
+	"""Collect `Metrics` until the program exits, and dump them to
+	`outputFile` (default: sys.stderr) then.  This is what the
+	``--profile`` option of the command line tools does."""
+
+	import atexit
+	metrics = Metrics()
+	addTracer(metrics)
+	atexit.register(lambda: metrics.dump(outputFile))
+	return metrics
+
+def profileOption(argv = None):
+	"""For command line tools without an option parser: if `argv`
+	(default: sys.argv) contains ``--profile``, remove it and call
+	`profileAtExit()`.  Returns whether profiling was enabled."""
+
+	if argv is None:
+		argv = sys.argv
+	if "--profile" not in argv:
+		return False
+	while "--profile" in argv:
+		argv.remove("--profile")
+	profileAtExit()
+	return True
+
 # --------------------------------------------------------------------
 #                                file
 # --------------------------------------------------------------------
 
+# (the umask can only be read by setting it, which is not thread-safe,
+# so it is done only once:)
+_umask = os.umask(0)
+os.umask(_umask)
+
 class File(Container):
 	"""Main class of the `fig` module, represents an XFig document."""
 
 	__slots__ = ("comment", "landscape", "centered", "metric", "paperSize",
 				 "magnification", "singlePage", "transparentColor", "ppi",
-				 "filename", "colors", "_colorhash")
-	
-	def __init__(self, inputFile = None):
+				 "filename", "_colors", "_colorhash", "_colorIndex")
+
+	_transientSlots = Container._transientSlots + ("_colorIndex", )
+
+	def __init__(self, inputFile = None, compactPoints = False, lazy = False):
+		"""Create an empty document, or read one from `inputFile`
+		(a filename or file-like object).  If `compactPoints` is
+		True, the points of polylines and splines are stored in
+		`PointArray` objects, which needs much less memory for
+		figures with many vertices.
+
+		If `lazy` is True, the file is read into memory and only
+		scanned quickly for the objects' types, depths, and
+		compounds; all other properties of an object are read when
+		they are first accessed.  This is much faster for tools that
+		only look at the header, the layers, or a few objects.
+		Furthermore, the original text of all objects that have not
+		been changed is written verbatim when saving (i.e. small edits
+		of big files are saved quickly and lead to minimal diffs).
+		Until they are read or changed, such objects are instances of
+		a subclass of their actual class, so use ``isinstance()``
+		instead of comparing ``type(o)``."""
+
 		Container.__init__(self)
-		self.colors = []
+		self.colors = _ColorList()
 		self._colorhash = {}
+		self._colorIndex = None
 		self.filename = None
 
 		if inputFile == None:
@@ -2007,110 +4188,68 @@ class File(Container):
 			self.transparentColor = -2 # no transparency, -1 = background, else color#
 			self.ppi = 1200 # figure units per inch
 		else:
-			lineIndex = 0
-			extraLineCount = 0
-			stack = []
-			currentObject = None
-			currentComment = ""
-			subLineExpected = 0
 			if isinstance(inputFile, str):
 				self.filename = inputFile
-				inputFile = file(inputFile).readlines()
-			elif hasattr(inputFile, "readlines"):
-				if hasattr(inputFile, "name"):
-					self.filename = inputFile.name
-				inputFile = inputFile.readlines()
-			# for error messages:
-			filename = self.filename and "'%s'" % self.filename or "<unnamed>"
-			for line in inputFile:
-				if line.startswith("#"):
-					if lineIndex:
-						currentComment += line[1:]
-					extraLineCount += 1
-					continue
-				line = line.strip()
-				if not line:
-					extraLineCount += 1
-					continue
-				#print line
-				if lineIndex == 0:
-					self.landscape = (line.lower().startswith("landscape"))
-				elif lineIndex == 1:
-					self.centered = (line.lower().startswith("center"))
-				elif lineIndex == 2:
-					self.metric = (line.lower().startswith("metric"))
-				elif lineIndex == 3:
-					self.paperSize = line
-				elif lineIndex == 4:
-					self.magnification = float(line)
-				elif lineIndex == 5:
-					self.singlePage = (line.lower().startswith("single"))
-				elif lineIndex == 6:
-					self.transparentColor = int(line)
-				elif lineIndex == 7:
-					res, sysDummy = line.split()
-					self.ppi = int(res)
-					self.comment = currentComment
-					currentComment = ""
-				else:
-				  try:
-					params = line.split()
-					if subLineExpected:
-						subLineExpected = currentObject._readSub(params)
-					else:
-						objectType = ObjectType(int(params[0]))
-						subLineExpected = 0
-						if objectType == ObjectType.CustomColor:
-							cc = self.addColor(CustomColor(int(params[1]), params[2]))
-							assert cc.index == Color.Custom0 + len(self.colors) - 1, \
-								   "non-contiguous custom color indices found - not handled yet!"
-						elif objectType == ObjectType.Polygon:
-							currentObject, subLineExpected = _readPolylineBase(params[1:])
-							currentObject.comment = currentComment
-							currentComment = ""
-						elif objectType == ObjectType.Arc:
-							currentObject, subLineExpected = _readArcBase(params[1:])
-							currentObject.comment = currentComment
-							currentComment = ""
-						elif objectType == ObjectType.Spline:
-							currentObject, subLineExpected = _readSplineBase(params[1:])
-							currentObject.comment = currentComment
-							currentComment = ""
-						elif objectType == ObjectType.Text:
-							assert line[-4:] == "\\001"
-							currentObject, subLineExpected = _readText(
-								params[1:], (
-								line.split(None, 12)[-1]).split(" ", 1)[1][:-4])
-							currentObject.comment = currentComment
-							currentComment = ""
-						elif objectType == ObjectType.Ellipse:
-							currentObject, subLineExpected = _readEllipseBase(params[1:])
-							currentObject.comment = currentComment
-							currentComment = ""
-						elif objectType == ObjectType.CompoundBegin:
-							stack.append(_readCompound(params[1:]))
-							stack[-1].comment = currentComment
-							currentComment = ""
-						elif objectType == ObjectType.CompoundEnd:
-							currentObject = stack.pop()
-						else:
-							raise ValueError(
-								"Unhandled object type %s!" % (objectType, ))
-					if currentObject != None and not subLineExpected:
-						if stack:
-							stack[-1].append(currentObject)
-						else:
-							self.append(currentObject)
-						currentObject = None
-				  except ValueError:
-					  sys.stderr.write("Parse error in %s, line %i:\n%s\n\n" %
-									   (filename, lineIndex + extraLineCount + 1, line))
-					  raise
-				lineIndex += 1
-			assert lineIndex > 7, ".fig File truncated (header incomplete)"
+			elif hasattr(inputFile, "name"):
+				self.filename = inputFile.name
+			trace = _startTrace("read", self.filename)
+			if lazy:
+				list.extend(self, _readLazily(inputFile, self, compactPoints, trace))
+				self._link(self)
+			else:
+				for object in _readObjects(inputFile, self, compactPoints, trace):
+					Container.append(self, object)
+			if trace is not None:
+				trace.countObjects(self.allObjects(True))
+				trace.finish()
 			if not self:
 				sys.stderr.write("WARNING: File empty (no objects read)!\n")
 
+	def _getColors(self):
+		return self._colors
+
+	def _setColors(self, colors):
+		if type(colors) is not _ColorList:
+			colors = _ColorList(colors)
+		self._colors = colors
+
+	colors = property(_getColors, _setColors, doc =
+		"list of the `CustomColor` objects of this document (see `addColor`)")
+
+	@classmethod
+	def open(cls, filename, cache = False, compactPoints = False):
+		"""File.open(filename, cache = False, compactPoints = False) -> File
+
+		Read the given XFig file, like ``File(filename)``.  If `cache`
+		is True, a binary snapshot of the parsed document is stored
+		next to the file (with the extension '.figc' instead of
+		'.fig'), and subsequent calls load that snapshot instead of
+		parsing the file again, which is much faster for large
+		files.  The snapshot is only used as long as the file's
+		modification time and size (or, if only the time changed,
+		its SHA-1 hash) still match; otherwise it is replaced.
+		Failures to write the snapshot (e.g. in a read-only
+		directory) are ignored.
+
+		Snapshots contain pickled data, so loading them may execute
+		arbitrary code: only use `cache` for files in directories
+		whose writers you trust."""
+
+		if not cache:
+			return cls(filename, compactPoints)
+
+		snapshotFilename = os.path.splitext(filename)[0] + ".figc"
+		result = _loadSnapshot(snapshotFilename, filename, compactPoints)
+		if result is None:
+			sourceInfo = _sourceInfo(filename, compactPoints)
+			result = cls(filename, compactPoints)
+			try:
+				_saveSnapshot(result, snapshotFilename, sourceInfo)
+			except (IOError, OSError):
+				pass
+		result.filename = filename
+		return result
+
 	def append(self, object):
 		"""Adds the object to this document.  `object` is supposed to
 		be a `fig.Object`-derived object.  `CustomColor` objects are
@@ -2121,14 +4260,24 @@ class File(Container):
 		else:
 			Container.append(self, object)
 
+	def __deepcopy__(self, memo):
+		# Container.__deepcopy__ would pass the objects as inputFile;
+		# copy header, colors, and objects via the pickle state instead:
+		result = File.__new__(type(self))
+		memo[id(self)] = result
+		result.__setstate__(copy.deepcopy(self.__getstate__(), memo))
+		return result
+
 	def addColor(self, hexCode):
 		"""Adds a custom color to this document.  hexCode may be
 		either a hex code like #ffee00 or a CustomColor instance.
 		Returns the new `CustomColor` object.
-		See `getColor`, too."""
+		See `getColor`, too.
+
+		Note that the .fig file format does not allow more than 512
+		custom colors; more may be added, but have to be reduced
+		(see `quantizeColors`) before the document can be saved."""
 
-		assert len(self.colors) < 512, \
-			   ".fig file format does not allow more than 512 custom colors!"
 		if isinstance(hexCode, str):
 			result = CustomColor(Color.Custom0 + len(self.colors), hexCode)
 		elif isinstance(hexCode, CustomColor):
@@ -2136,8 +4285,14 @@ class File(Container):
 			hexCode = result.hexCode
 		else:
 			raise TypeError("addColor() should be called with a hexCode (e.g. #ffee00) or a CustomColor instance")
+		index = self._colorIndex
+		if index is not None and index.version != self.colors.version:
+			index = self._colorIndex = None # stale, rebuilt by getColor()
 		self.colors.append(result)
 		self._colorhash[hexCode] = result
+		if index is not None:
+			index.add(result)
+			index.version = self.colors.version
 		return result
 
 	def getColor(self, color, similarity = None):
@@ -2163,7 +4318,16 @@ class File(Container):
 
 		If `similarity` is given, but not > 0.0, `addColor()` will
 		*not* be called, but a `KeyError` will be raised, if the exact
-		color cannot be returned."""
+		color cannot be returned.
+
+		Colors are added even beyond the 512 custom colors supported
+		by the file format, so that `quantizeColors` can compute a
+		palette from the true colors before saving.
+
+		The nearest color is looked up in a bucket grid over the RGB
+		cube that is built on first use and kept up-to-date by
+		`addColor()`.  See `getColors` for converting many colors at
+		once."""
 
 		inputGiven = color
 
@@ -2187,28 +4351,200 @@ class File(Container):
 		assert len(color) == 7, \
 			   "too large values given for red, green, or blue: %s" % (inputGiven, )
 
+		return self._lookupColor(color, similarity)
+
+	def _lookupColor(self, color, similarity):
+		"""Second half of `getColor` for a normalized hex code."""
+
 		result = self._colorhash.get(color, None)
 		if result != None:
 			return result
 
 		if similarity == None:
 			return self.addColor(color)
-
-		if not similarity > 0.0:
+		elif not similarity > 0.0:
 			raise KeyError("getColor(%s): no similar color found" % color)
 
 		if self.colors: # don't choke when there are no colors yet
-			def rgbDiffSortTuple(otherRGB,
-								 searchRGB = CustomColor(None, color)):
-				return sum(map(lambda x: x*x, searchRGB-otherRGB)), otherRGB
-			matches = map(rgbDiffSortTuple, self.colors)
-			matches.sort()
-			bestSqDiff, bestColor = matches[0]
-			if bestSqDiff < similarity*similarity:
+			index = self._colorIndex
+			if index is None or index.version != self.colors.version:
+				index = self._colorIndex = _ColorIndex(self.colors)
+			bestSqDiff, bestColor = index.nearest(
+				int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16),
+				similarity)
+			if bestColor is not None:
 				return bestColor
 
 		return self.addColor(color)
 
+	def getColors(self, colors, similarity = None):
+		"""Batch version of `getColor`; returns the color indices for
+		a whole sequence of colors.  `colors` may be a sequence of
+		anything `getColor` accepts or an Nx3 array of R,G,B values
+		(integers 0..255 or floats 0.0..1.0).  The result is an
+		integer array if numpy is available, or a list otherwise.
+
+		The colors are processed in order, as if `getColor` was
+		called for each of them, except that every distinct color is
+		looked up only once (at its first occurrence), i.e. equal
+		colors are always mapped to the same index."""
+
+		if numpy is not None and not isinstance(colors, str):
+			rgb = numpy.asarray(colors)
+			if rgb.ndim == 2 and rgb.shape[1:] == (3, ) and rgb.dtype.kind in "biuf":
+				if rgb.dtype.kind == "f":
+					rgb = numpy.round(rgb * 255)
+				rgb = rgb.astype(numpy.int64)
+				assert not len(rgb) or (rgb.min() >= 0 and rgb.max() <= 255), \
+					   "too large values given for red, green, or blue"
+				keys = (rgb[:,0] << 16) | (rgb[:,1] << 8) | rgb[:,2]
+				keys, firstIndices, inverse = numpy.unique(
+					keys, return_index = True, return_inverse = True)
+				order = numpy.argsort(firstIndices, kind = "mergesort")
+				indices = numpy.empty(len(keys), numpy.int64)
+				if similarity is not None and similarity > 0.0:
+					keys = keys[order]
+					indices[order] = self._nearestColorIndices(numpy.column_stack(
+						(keys >> 16, (keys >> 8) & 255, keys & 255)), similarity)
+				else:
+					for i in order:
+						indices[i] = int(self._lookupColor(
+							"#%06x" % keys[i], similarity))
+				return indices[inverse]
+
+		cache = {}
+		result = []
+		for color in colors:
+			key = isinstance(color, list) and tuple(color) or color
+			index = cache.get(key)
+			if index is None:
+				index = cache[key] = int(self.getColor(color, similarity))
+			result.append(index)
+		return result
+
+	def _nearestColorIndices(self, rgb, similarity, blockSize = 2048):
+		"""Vectorized `getColor` with similarity for an Nx3 integer
+		array of (distinct) colors, returns an array of indices.
+		Whenever a color has to be added, only the distances of the
+		remaining colors of the current block to the new color have
+		to be checked."""
+
+		maxSqDiff = similarity * similarity
+		result = numpy.empty(len(rgb), numpy.int64)
+		for start in range(0, len(rgb), blockSize):
+			block = rgb[start:start+blockSize]
+			blockResult = result[start:start+blockSize]
+			if self.colors:
+				best, blockResult[:] = self._nearestPaletteColors(block)
+			else:
+				best = numpy.empty(len(block), numpy.int64)
+				best.fill(maxSqDiff + 1)
+
+			pos = 0
+			while True:
+				misses = numpy.flatnonzero(best[pos:] >= maxSqDiff)
+				if not len(misses):
+					break
+				pos += misses[0]
+				color = self.addColor("#%02x%02x%02x" % tuple(block[pos]))
+				blockResult[pos] = color.index
+				pos += 1
+				sqDiffs = ((block[pos:] - block[pos-1])**2).sum(1)
+				closer = numpy.flatnonzero(sqDiffs < best[pos:]) + pos
+				best[closer] = sqDiffs[closer - pos]
+				blockResult[closer] = color.index
+		return result
+
+	def _nearestPaletteColors(self, rgb):
+		"""Return the squared distances and indices of the custom
+		colors nearest to each color in the Nx3 integer array `rgb`
+		(there must be at least one custom color)."""
+
+		palette = numpy.array([c.rgb() for c in self.colors], numpy.int64)
+		sqDiffs = sum([(rgb[:,i,None] - palette[None,:,i])**2
+					   for i in range(3)])
+		nearest = sqDiffs.argmin(1)
+		return (sqDiffs[numpy.arange(len(rgb)), nearest],
+				numpy.array([c.index for c in self.colors], numpy.int64)[nearest])
+
+	def quantizeColors(self, maxColors = 512, method = "median-cut"):
+		"""Reduce the custom colors of this document to (at most)
+		`maxColors` colors, if there are more.  The new palette is
+		computed from the pen and fill colors of all objects
+		(weighted by their usage) with the given `method`, which may
+		be "median-cut" or "kmeans" (slower, but closer to the
+		original colors; initialized with the median cut palette).
+		Afterwards, all objects' `penColor`/`fillColor` (and the
+		`transparentColor`) are remapped to the new palette; custom
+		colors that are not used at all are dropped.
+
+		This is useful for documents generated from images or other
+		data with many colors, whose palette has been filled by
+		`getColor` in order of appearance, since the file format
+		allows only 512 custom colors.  Needs numpy.
+
+		Returns a dictionary mapping the old custom color indices to
+		the new ones (empty if nothing had to be changed)."""
+
+		if len(self.colors) <= maxColors:
+			return {}
+		if method == "median-cut":
+			quantize = _medianCut
+		elif method == "kmeans":
+			quantize = _kMeans
+		else:
+			raise ValueError("quantizeColors(): unknown method %r (should be 'median-cut' or 'kmeans')" % (method, ))
+		if numpy is None:
+			raise ImportError("quantizeColors() needs numpy")
+
+		objects = list(self.allObjects())
+		# color indices offset by one, so that Color.Default (-1)
+		# becomes zero:
+		penColors = numpy.fromiter(
+			(int(o.penColor) for o in objects), numpy.intp, len(objects)) + 1
+		fillColors = numpy.fromiter(
+			(int(o.fillColor) for o in objects), numpy.intp, len(objects)) + 1
+		counts = numpy.bincount(
+			numpy.concatenate((penColors, fillColors)),
+			minlength = Color.Custom0 + 1 + len(self.colors))[Color.Custom0 + 1:]
+		if self.transparentColor >= Color.Custom0:
+			counts[self.transparentColor - Color.Custom0] += 1
+
+		usedIndices = numpy.flatnonzero(counts)
+		rgb = numpy.array([self.colors[i].rgb() for i in usedIndices], numpy.intp)
+		if len(usedIndices) > maxColors:
+			palette, labels = quantize(rgb, counts[usedIndices], maxColors)
+			# rounding may lead to duplicate colors:
+			palette = numpy.clip(numpy.round(palette), 0, 255).astype(numpy.intp)
+			palette, inverse = numpy.unique(
+				(palette[:,0] << 16) | (palette[:,1] << 8) | palette[:,2],
+				return_inverse = True)
+			labels = inverse[labels]
+		else:
+			palette = (rgb[:,0] << 16) | (rgb[:,1] << 8) | rgb[:,2]
+			labels = numpy.arange(len(rgb))
+
+		mapping = dict(zip([int(self.colors[i]) for i in usedIndices],
+						   [Color.read(Color.Custom0 + label) for label in labels]))
+
+		# remap all colors at once, then only assign the changed ones:
+		lookup = numpy.arange(-1, Color.Custom0 + len(self.colors))
+		lookup[Color.Custom0 + 1 + usedIndices] = Color.Custom0 + labels
+		newColors = [Color.read(Color.Custom0 + i) for i in range(len(palette))]
+		for attr, old in (("penColor", penColors), ("fillColor", fillColors)):
+			new = lookup[old]
+			for i in numpy.flatnonzero(new != old - 1):
+				setattr(objects[i], attr, newColors[new[i] - Color.Custom0])
+		if self.transparentColor >= Color.Custom0:
+			self.transparentColor = int(mapping[self.transparentColor])
+
+		self.colors = _ColorList()
+		self._colorhash = {}
+		self._colorIndex = None
+		for color in palette:
+			self.addColor("#%06x" % color)
+		return mapping
+
 	def colorRGB(self, colorIndex):
 		"""Return a the R,G,B tuple for the given color index.
 		(With values from the range 0..255.)"""
@@ -2262,26 +4598,74 @@ class File(Container):
 		(but not the custom colors).  This is the same as str(object)
 		concatenated for each object in `figfile`."""
 		
-		return "".join(map(str, self))
+		return "".join(_iterObjectLines(self))
+
+	def iterLines(self):
+		"""figfile.iterLines() -> iterator
+
+		Generator yielding the contents of this file in the XFig
+		file format, in chunks of complete lines (the header, one
+		chunk per custom color, and one per object, with compounds
+		split up into their contained objects).  This allows to
+		write large documents without building the whole string
+		in memory, see `write()`."""
+
+		assert len(self.colors) <= 512, \
+			   ".fig file format does not allow more than 512 custom colors (see quantizeColors())!"
+		yield self.headerStr()
+		for color in self.colors:
+			yield repr(color)
+		for chunk in _iterObjectLines(self):
+			yield chunk
+
+	def write(self, outputFile):
+		"""figfile.write(outputFile)
+
+		Writes the contents of this file in the XFig file format to
+		the file-like object `outputFile`, chunk by chunk (see
+		`iterLines()`).  Use `save()` for writing to a named file."""
+
+		trace = _startTrace("write", self.filename)
+		if trace is None:
+			outputFile.writelines(self.iterLines())
+			return
+
+		byteCount = lineCount = 0
+		chunks = self.iterLines()
+		for phase, count in (("header", 1), ("colors", len(self.colors)),
+							 ("objects", None)):
+			for chunk in itertools.islice(chunks, count):
+				outputFile.write(chunk)
+				byteCount += len(chunk)
+				lineCount += chunk.count("\n")
+			trace.lap(phase)
+		trace.counts["bytes"] = byteCount
+		trace.counts["lines"] = lineCount
+		trace.countObjects(self.allObjects(True))
+		trace.finish()
 
 	def __str__(self):
 		"""Return the contents of this file as string in the XFig file format.
 		See save()."""
 		
-		assert len(self.colors) < 512, \
-			   ".fig file format does not allow more than 512 custom colors!"
-		result = self.headerStr() + \
-				 "".join(map(repr, self.colors)) + \
-				 self.objectsStr()
-		return result
+		return "".join(self.iterLines())
 
 	def save(self, filename = None, fig2dev = None):
 		"""figfile.save(filename = None)
 
 		Saves the contents of this file in the XFig file format to
-		the file 'filename'.  Equivalent to::
+		the file 'filename'.  Roughly equivalent to::
 		
-		  file(filename, "w").write(str(figfile))
+		  figfile.write(file(filename, "w"))
+
+		but the output is first written to a temporary file in the
+		same directory, which is then renamed, so that an existing
+		file is not destroyed if an exception occurs.  (For files
+		read with ``lazy = True``, unchanged objects are copied
+		verbatim from the original file, see `File`.)  If the file
+		is a symbolic link, its target is replaced (keeping the
+		link), but other hard links to an existing file keep
+		referring to the old contents.
 
 		If filename is not given, and figfile was constructed from an
 		existing file, that one is overwritten (-> figfile.filename).
@@ -2303,18 +4687,37 @@ class File(Container):
 			self.filename = filename
 		assert self.filename, "figfile.save() needs a filename!"
 
-		# construct whole string in memory for exception safety:
-		output = str(self)
-		# everything's fine, *now* write to file:
-		file(self.filename, "w").write(output)
+		# write to a temporary file first for exception safety:
+		target = os.path.realpath(self.filename)
+		fd, tempName = tempfile.mkstemp(".fig", ".figpy",
+										os.path.dirname(target))
+		try:
+			outputFile = os.fdopen(fd, "w")
+			try:
+				self.write(outputFile)
+			finally:
+				outputFile.close()
+			if os.path.exists(target):
+				mode = os.stat(target).st_mode
+			else:
+				mode = 0666 & ~_umask
+			os.chmod(tempName, mode & 07777)
+			if os.name == "nt" and os.path.exists(target):
+				os.remove(target) # no atomic replace on Windows
+			# everything's fine, *now* replace the file:
+			os.rename(tempName, target)
+		except:
+			if os.path.exists(tempName):
+				os.remove(tempName)
+			raise
 
 		if fig2dev:
 			return self.fig2dev(lang = fig2dev)
 
 		return self.filename
 
-	def fig2dev(self, input = None, output = None, lang = "eps"):
-		"""figfile.fig2dev(input = None, output = None, lang = "eps")
+	def fig2dev(self, input = None, output = None, lang = "eps", cache = None):
+		"""figfile.fig2dev(input = None, output = None, lang = "eps", cache = None)
 		
 		Calls fig2dev on the file `input` to produce the file `output`.
 		(Both default to the current figfile's filename and the same
@@ -2333,11 +4736,23 @@ class File(Container):
 		following convenience shortcut::
 
 		   figfile.save(fig2dev = "pdf")
-		"""
+
+		If `cache` (default: the module's `exportCache`) is a
+		directory, the result is looked up there first (see
+		`exportCache`) and fig2dev is only run if the input file, or
+		any picture included by it, has changed since the last
+		export."""
 		
 		if input == None:
 			input = self.filename
 
+		if cache is None:
+			cache = exportCache
+		if cache:
+			cacheKey = _exportCacheKey(input, lang, ())
+			if cacheKey is None:
+				cache = None # let fig2dev report the problem
+
 		path, basename = os.path.split(input)
 
 		if not output:
@@ -2345,30 +4760,1075 @@ class File(Container):
 			if output.endswith(".fig"):
 				output = output[:-4]
 			output += "." + lang
-		
-		oldcwd = None
-		if path:
-			oldcwd = os.path.abspath(".")
-			os.chdir(path)
+
+		outputPath = os.path.normpath(os.path.join(path, output))
+		if cache and _fetchCachedExport(cache, cacheKey, outputPath):
+			return outputPath
+
+		import subprocess
+		if os.path.exists(outputPath):
+			os.remove(outputPath) # might be a (cached) hard link
+		outFile = file(outputPath, "w")
+		trace = _startTrace("fig2dev", input)
+		try:
+			# fig2dev runs in the input's directory (for relative
+			# picture filenames); cwd = ... does not affect other threads:
+			returncode = subprocess.call(["fig2dev", "-L", lang, basename],
+										 stdout = outFile, cwd = path or None)
+		finally:
+			outFile.close()
+		if trace is not None:
+			trace.counts["failed"] = int(returncode != 0)
+			trace.finish()
+		if cache and returncode == 0:
+			_storeCachedExport(cache, cacheKey, outputPath)
+
+		return outputPath
+
+	def render(self, lang = "eps", cwd = None, **options):
+		"""figfile.render(lang = "eps", cwd = None, **options) -> str
+
+		Converts this document with fig2dev and returns the result.
+		In contrast to `fig2dev()`, the document does not need to be
+		saved first, since it is piped into fig2dev directly, so
+		this may be used from several threads at once (e.g. in a web
+		service)::
+
+		  pdfData = figfile.render("pdf")
+		  pngData = figfile.render("png", m = 2, S = 4)
+
+		Keyword arguments are passed to fig2dev as options (True for
+		options without value, i.e. ``-m 2 -S 4`` above).  Relative
+		picture filenames are resolved relative to `cwd`, which
+		defaults to the directory of `figfile.filename` (if set).
+
+		Raises a subprocess.CalledProcessError (whose `output`
+		contains the error messages) if fig2dev fails.  See
+		`renderTo` for writing the result to a file."""
+
+		import cStringIO
+		result = cStringIO.StringIO()
+		self.renderTo(result, lang, cwd, **options)
+		return result.getvalue()
+
+	def renderTo(self, outputFile, lang = "eps", cwd = None, **options):
+		"""figfile.renderTo(outputFile, lang = "eps", cwd = None, **options)
+
+		Like `render()`, but writes the result to the file-like
+		object `outputFile` while fig2dev produces it.  (Real files
+		are passed to fig2dev directly.)"""
+
+		import subprocess, threading
+
+		command = ["fig2dev", "-L", lang]
+		for option, value in sorted(options.items()):
+			command.append("-" + option)
+			if value is not True:
+				command.append(str(value))
+
+		if cwd is None and self.filename:
+			cwd = os.path.dirname(os.path.abspath(self.filename))
 
 		try:
-			outFile = file(output, "w")
+			outputFile.fileno()
+		except (AttributeError, IOError): # no real file (e.g. StringIO)
+			stdout = subprocess.PIPE
+		else:
+			outputFile.flush()
+			stdout = outputFile
+
+		trace = _startTrace("fig2dev", self.filename)
+		fig2dev = subprocess.Popen(
+			command, cwd = cwd or None, stdin = subprocess.PIPE,
+			stdout = stdout, stderr = subprocess.PIPE)
+
+		# feed stdin and collect stderr in threads, so that fig2dev
+		# never blocks on a full pipe; stdin is always closed, so that
+		# fig2dev terminates even if writing the document fails (the
+		# exception is re-raised below):
+		feedErrors = []
+		def feed():
 			try:
-				import subprocess
-			except ImportError:
-				cin, cout = os.popen4("fig2dev -L %s '%s'" % (lang, basename))
-				cin.close()
-				outFile.write(cout.read())
-				cout.close()
+				try:
+					self.write(fig2dev.stdin)
+				except IOError: # fig2dev exited early (error reported below)
+					pass
+				except:
+					feedErrors.append(sys.exc_info())
+			finally:
+				try:
+					fig2dev.stdin.close()
+				except IOError:
+					pass
+		errors = []
+		threads = [threading.Thread(target = feed),
+				   threading.Thread(target = lambda: errors.append(fig2dev.stderr.read()))]
+		for thread in threads:
+			thread.start()
+
+		if stdout is subprocess.PIPE:
+			for chunk in iter(lambda: fig2dev.stdout.read(65536), ""):
+				outputFile.write(chunk)
+
+		for thread in threads:
+			thread.join()
+		returncode = fig2dev.wait()
+		if trace is not None:
+			trace.counts["failed"] = int(returncode != 0 or bool(feedErrors))
+			trace.finish()
+		if feedErrors:
+			excType, excValue, excTraceback = feedErrors[0]
+			raise excType, excValue, excTraceback
+		if returncode:
+			raise subprocess.CalledProcessError(returncode, command, errors[0])
+
+# --------------------------------------------------------------------
+
+def _readTextLine(params, line, tables):
+	assert line[-4:] == "\\001"
+	return _readText(params, (line.split(None, 12)[-1]).split(" ", 1)[1][:-4], tables)
+
+_objectReaders = {
+	ObjectType.Polygon : lambda params, line, tables: _readPolylineBase(params, tables),
+	ObjectType.Arc     : lambda params, line, tables: _readArcBase(params, tables),
+	ObjectType.Spline  : lambda params, line, tables: _readSplineBase(params, tables),
+	ObjectType.Text    : _readTextLine,
+	ObjectType.Ellipse : lambda params, line, tables: _readEllipseBase(params, tables),
+	}
+
+def _readObject(objectType, params, line, compactPoints, tables):
+	"""Parse the first line of an object (`params` are the fields of
+	the stripped `line`), return the object and whether sub-lines
+	are expected (to be passed to its `_readSub()`).  Values are
+	shared via the given `_InternTables`."""
+	result, subLineExpected = _objectReaders[objectType](params[1:], line, tables)
+	if compactPoints and objectType in (ObjectType.Polygon, ObjectType.Spline):
+		result.points = PointArray()
+		if objectType == ObjectType.Spline:
+			result._shapeFactors = array.array("d")
+	return result, subLineExpected
+
+def _readObjects(inputFile, figFile, compactPoints = False, trace = None):
+	"""Generator behind `File.__init__` and `iterObjects`: parses
+	the header and custom colors of `inputFile` into `figFile` and
+	yields each top-level object (or `Compound`) as soon as it has
+	been read completely.  If `compactPoints` is set, polyline and
+	spline points are read into `PointArray` objects.  The phases,
+	lines, and bytes read are recorded in the `TraceEvent` `trace`
+	(if given)."""
+
+	lineIndex = 0
+	extraLineCount = 0
+	stack = []
+	currentObject = None
+	currentComment = ""
+	subLineExpected = 0
+	tables = _InternTables()
+	ownFile = None
+	if isinstance(inputFile, str):
+		inputFile = ownFile = file(inputFile)
+	# for error messages:
+	filename = figFile.filename and "'%s'" % figFile.filename or "<unnamed>"
+	try:
+		for line in inputFile:
+			if line.startswith("#"):
+				if lineIndex:
+					currentComment += line[1:]
+				extraLineCount += 1
+				continue
+			line = line.strip()
+			if not line:
+				extraLineCount += 1
+				continue
+			#print line
+			if lineIndex == 0:
+				figFile.landscape = (line.lower().startswith("landscape"))
+			elif lineIndex == 1:
+				figFile.centered = (line.lower().startswith("center"))
+			elif lineIndex == 2:
+				figFile.metric = (line.lower().startswith("metric"))
+			elif lineIndex == 3:
+				figFile.paperSize = line
+			elif lineIndex == 4:
+				figFile.magnification = float(line)
+			elif lineIndex == 5:
+				figFile.singlePage = (line.lower().startswith("single"))
+			elif lineIndex == 6:
+				figFile.transparentColor = int(line)
+			elif lineIndex == 7:
+				res, sysDummy = line.split()
+				figFile.ppi = int(res)
+				figFile.comment = currentComment
+				currentComment = ""
+				if trace is not None:
+					trace.lap("header")
 			else:
-				subprocess.call(["fig2dev", "-L", lang, basename],
-								stdout = outFile)
-			outFile.close()
-		finally:
-			if oldcwd:
-				os.chdir(oldcwd)
+			  try:
+				params = line.split()
+				if subLineExpected:
+					subLineExpected = currentObject._readSub(params, tables)
+				else:
+					objectType = ObjectType(int(params[0]))
+					subLineExpected = 0
+					if objectType == ObjectType.CustomColor:
+						cc = figFile.addColor(CustomColor(int(params[1]), params[2]))
+						assert cc.index == Color.Custom0 + len(figFile.colors) - 1, \
+							   "non-contiguous custom color indices found - not handled yet!"
+						if trace is not None:
+							trace.lap("colors")
+					elif objectType in _objectReaders:
+						currentObject, subLineExpected = _readObject(
+							objectType, params, line, compactPoints, tables)
+						currentObject.comment = currentComment
+						currentComment = ""
+					elif objectType == ObjectType.CompoundBegin:
+						stack.append(_readCompound(params[1:]))
+						stack[-1].comment = currentComment
+						currentComment = ""
+					elif objectType == ObjectType.CompoundEnd:
+						currentObject = stack.pop()
+					else:
+						raise ValueError(
+							"Unhandled object type %s!" % (objectType, ))
+			  except ValueError:
+				  sys.stderr.write("Parse error in %s, line %i:\n%s\n\n" %
+								   (filename, lineIndex + extraLineCount + 1, line))
+				  raise
+			  if currentObject != None and not subLineExpected:
+				  if stack:
+					  stack[-1].append(currentObject)
+					  currentObject = None
+				  else:
+					  # reset before yielding, the consumer may take its time:
+					  object, currentObject = currentObject, None
+					  yield object
+			lineIndex += 1
+		if trace is not None:
+			trace.lap("objects")
+			trace.counts["lines"] = lineIndex + extraLineCount
+			try:
+				trace.counts["bytes"] = inputFile.tell()
+			except (AttributeError, EnvironmentError, ValueError): # no real file
+				pass
+	finally:
+		if ownFile is not None:
+			ownFile.close()
+	assert lineIndex > 7, ".fig File truncated (header incomplete)"
+
+_lazyClasses = {}
+
+_unreadClasses = {}
+
+def _unreadClass(cls):
+	"""Return (cached) subclass of `cls` for objects created by
+	`_scanObjects`.  Assigning any attribute (except for the internal
+	`Object._transientSlots`) turns them into plain `cls` instances,
+	which clears their `Object._unread` flag."""
+	result = _unreadClasses.get(cls)
+	if result is None:
+		def __setattr__(self, name, value):
+			if name not in Object._transientSlots:
+				object.__setattr__(self, "__class__", cls)
+			object.__setattr__(self, name, value)
+		def __reduce_ex__(self, protocol):
+			# (__newobj__ would insist on the exact class)
+			return (copy_reg._reconstructor, (cls, object, None),
+					self.__getstate__())
+		result = _unreadClasses[cls] = type(cls.__name__, (cls, ), dict(
+			__slots__ = (), __module__ = cls.__module__,
+			__setattr__ = __setattr__, __reduce_ex__ = __reduce_ex__,
+			_unread = True, _readClass = cls))
+	return result
+
+def _lazyClass(objectType, subType):
+	"""Return (cached) class of objects with the given type and sub
+	type (as determined by the `changeType()` methods)."""
+	result = _lazyClasses.get((objectType, subType))
+	if result is None:
+		if objectType == ObjectType.Text:
+			result = Text
+		else:
+			prototype = {ObjectType.Polygon : PolylineBase,
+						 ObjectType.Arc     : ArcBase,
+						 ObjectType.Spline  : SplineBase,
+						 ObjectType.Ellipse : EllipseBase}[objectType]()
+			prototype.changeType(subType)
+			result = type(prototype)
+		_lazyClasses[objectType, subType] = result
+	return result
+
+# indices of (depth, forward arrow, backward arrow, point count) fields:
+_lazyFieldIndices = {
+	ObjectType.Polygon : (6, 13, 14, 15),
+	ObjectType.Arc     : (6, 12, 13, None),
+	ObjectType.Spline  : (6, 11, 12, 13),
+	ObjectType.Text    : (3, None, None, None),
+	ObjectType.Ellipse : (6, None, None, None),
+	}
+
+def _scanObjects(data, pos, compactPoints):
+	"""Quick pass over the objects in `data` (a string with the
+	contents of an XFig file) from offset `pos` on, used for
+	``File(..., lazy = True)``.  Returns the list of top-level
+	objects, which only have their class, depth, and comment set
+	(and the location of their source, see `Object._readLazily`).
+	Compounds are read immediately."""
+
+	result = []
+	stack = []
+	comment = []
+	ints = _InternTable(int)
+	size = len(data)
+	while pos < size:
+		lineStart = pos
+		pos = data.find("\n", pos) + 1 or size
+		line = data[lineStart:pos]
+		if line.startswith("#"):
+			comment.append(line[1:])
+			continue
+		params = line.split()
+		if not params:
+			continue
+
+		objectType = int(params[0])
+		if objectType == ObjectType.CompoundBegin:
+			stack.append(_readCompound(params[1:]))
+			stack[-1].comment = "".join(comment)
+			stack[-1]._source = _sourceLines(data, lineStart, pos)
+			comment = []
+			continue
+
+		if objectType == ObjectType.CompoundEnd:
+			o = stack.pop()
+			# (for reusing the source text when saving, see
+			# `Compound._sourceChunks`:)
+			o._source = (o._source, o.comment, tuple(o),
+						 _sourceLines(data, lineStart, pos))
+		else:
+			if objectType not in _lazyFieldIndices:
+				raise ValueError("Unhandled object type %s!" % (objectType, ))
+			depthIndex, forwardIndex, backwardIndex, countIndex = \
+						_lazyFieldIndices[objectType]
+			subType = int(params[1])
+			cls = _lazyClasses.get((objectType, subType)) or \
+				  _lazyClass(objectType, subType)
+			o = cls.__new__(cls)
+			o._parent = None
+			o._depthIndices = None
+			o._boundsCache = None
+			o._depth = ints[params[depthIndex]]
+			o.comment = ""
+			if comment:
+				o.comment = "".join(comment)
+				comment = []
+
+			# skip sub-lines (arrows, picture filename, points):
+			subLines = 0
+			if forwardIndex:
+				subLines += int(params[forwardIndex]) + int(params[backwardIndex])
+			if objectType == ObjectType.Polygon and \
+				   subType == PolygonType.PictureBBox:
+				subLines += 1
+			counts = ()
+			if countIndex:
+				pointCount = int(params[countIndex])
+				counts = (2*pointCount, )
+				if objectType == ObjectType.Spline:
+					counts = (2*pointCount, pointCount)
+			for count in (subLines, ) + counts:
+				while count > 0 and pos < size:
+					subLineStart = pos
+					pos = data.find("\n", pos) + 1 or size
+					line = data[subLineStart:pos]
+					if line.startswith("#"): # belongs to the next object
+						comment.append(line[1:])
+						continue
+					params = line.split()
+					if params:
+						if subLines:
+							count -= 1
+						else:
+							count -= len(params)
+				subLines = 0
+
+			o._lazySource = (data, lineStart, pos, compactPoints)
+			o._source = (data, lineStart, pos, o._depth, o.comment, None)
+			o.__class__ = _unreadClasses.get(cls) or _unreadClass(cls)
 
-		return os.path.normpath(os.path.join(path, output))
+		if stack:
+			stack[-1].append(o)
+		else:
+			result.append(o)
+
+	return result
+
+def _readLazily(inputFile, figFile, compactPoints, trace = None):
+	"""Read the header of `inputFile` into `figFile`, and return its
+	top-level objects (see `_scanObjects`)."""
+	# (the contents are read into memory instead of memory-mapping
+	# the file, which would crash as soon as the file is truncated,
+	# e.g. when the document is written back to it)
+	ownFile = None
+	if isinstance(inputFile, str):
+		inputFile = ownFile = file(inputFile, "rb")
+	try:
+		data = inputFile.read()
+	finally:
+		if ownFile is not None:
+			ownFile.close()
+
+	# find the end of the header (eight lines + custom colors):
+	headerLines = 0
+	pos = objectsStart = 0
+	while pos < len(data):
+		lineStart = pos
+		pos = data.find("\n", pos) + 1 or len(data)
+		line = data[lineStart:pos]
+		if line.startswith("#") or not line.strip():
+			continue
+		if headerLines >= 8 and not line.startswith("0 "):
+			break
+		headerLines += 1
+		objectsStart = pos
+
+	for o in _readObjects(data[:objectsStart].splitlines(True), figFile,
+						  trace = trace):
+		pass
+	result = _scanObjects(data, objectsStart, compactPoints)
+	if trace is not None:
+		trace.lap("objects")
+		trace.counts["lines"] = data.count("\n")
+		trace.counts["bytes"] = len(data)
+	return result
+
+def iterObjects(inputFile, header = None, compactPoints = False):
+	"""iterObjects(inputFile, header = None, compactPoints = False) -> iterator
+
+	Iterates over the top-level objects (including complete
+	`Compound` objects) of the given XFig file, without ever
+	building a `File` for the whole document.  Each object is
+	yielded as soon as it has been read, so huge files can be
+	filtered or transformed in bounded memory::
+
+	  for o in fig.iterObjects("huge.fig"):
+	      if o.depth == 10:
+	          ...
+
+	`inputFile` may be a filename or any iterable of lines (e.g. an
+	open file object).  If an (empty) `File` object is passed as
+	`header`, the document properties (`File.landscape`,
+	`File.paperSize`, ...) and the custom colors are stored in it
+	while reading; they are all complete as soon as the first object
+	is yielded.  `compactPoints` has the same meaning as for `File`."""
+
+	if header is None:
+		header = File()
+	if isinstance(inputFile, str):
+		header.filename = inputFile
+	elif hasattr(inputFile, "name"):
+		header.filename = inputFile.name
+	trace = _startTrace("read", header.filename)
+	if trace is None:
+		return _readObjects(inputFile, header, compactPoints)
+	return _tracedObjects(_readObjects(inputFile, header, compactPoints, trace), trace)
+
+def _tracedObjects(objects, trace):
+	"""Yield the given top-level objects, counting them in the
+	`TraceEvent` `trace`, which is finished after the last one."""
+	for o in objects:
+		trace.countObjects((o, ))
+		if isinstance(o, Compound):
+			trace.countObjects(o.allObjects(True))
+		yield o
+	trace.finish()
+
+class LoadError(Exception):
+	"""Raised by (or yielded from) `loadMany` / `iterLoadMany` if a
+	file could not be read.  The `filename` attribute contains the
+	offending filename, `message` the description of the original
+	error, and `traceback` its formatted traceback (from the worker
+	process)."""
+
+	def __init__(self, filename, message, traceback = None):
+		Exception.__init__(self, filename, message, traceback)
+		self.filename = filename
+		self.message = message
+		self.traceback = traceback
+
+	def __str__(self):
+		return "%s: %s" % (self.filename, self.message)
+
+def _loadWorker(job):
+	"""Reads one file for `iterLoadMany`, in a worker process.  If
+	`traced` is set, the `TraceEvent` objects are collected and
+	returned, too (for the tracers of the main process)."""
+	index, filename, compactPoints, lazy, traced = job
+	events = None
+	if traced:
+		events = []
+		_tracers[:] = [events.append]
+	try:
+		return index, File(filename, compactPoints, lazy), events
+	except Exception, e:
+		import traceback
+		message = traceback.format_exception_only(type(e), e)[-1].strip()
+		return index, LoadError(filename, message, traceback.format_exc()), events
+
+def iterLoadMany(paths, workers = None, compactPoints = False, ordered = False,
+				 lazy = False):
+	"""iterLoadMany(paths, workers = None, compactPoints = False, ordered = False, lazy = False) -> iterator
+
+	Reads all given XFig files in a pool of `workers` processes
+	(default: one per CPU) and yields ``(filename, result)`` pairs,
+	where `result` is either the `File` object or a `LoadError` if
+	the file could not be read.  Results are yielded as soon as they
+	are available, unless `ordered` is True, in which case they are
+	yielded in the order of `paths`.
+
+	The parsed objects are pickled for the transfer to this process,
+	which is cheapest with `compactPoints` = True, or with `lazy` =
+	True (see `File`), in which case unread objects are transferred
+	as their source text (which is still written verbatim when
+	saving)."""
+
+	paths = list(paths)
+	if workers is None:
+		import multiprocessing
+		workers = multiprocessing.cpu_count()
+	workers = min(workers, len(paths))
+	# events traced in the worker processes are passed to the tracers here:
+	traced = workers > 1 and bool(_tracers)
+	jobs = [(index, filename, compactPoints, lazy, traced)
+			for index, filename in enumerate(paths)]
+
+	if workers <= 1:
+		for job in jobs:
+			index, result, events = _loadWorker(job)
+			yield paths[index], result
+		return
+
+	import multiprocessing
+	pool = multiprocessing.Pool(workers)
+	try:
+		chunkSize = max(1, len(jobs) / (4 * workers))
+		if ordered:
+			results = pool.imap(_loadWorker, jobs, chunkSize)
+		else:
+			results = pool.imap_unordered(_loadWorker, jobs, chunkSize)
+		for index, result, events in results:
+			for event in events or ():
+				event.emit()
+			yield paths[index], result
+		pool.close()
+	finally:
+		pool.terminate()
+		pool.join()
+
+def loadMany(paths, workers = None, compactPoints = False, lazy = False):
+	"""loadMany(paths, workers = None, compactPoints = False, lazy = False) -> list
+
+	Reads all given XFig files in parallel (see `iterLoadMany`) and
+	returns the list of `File` objects, in the order of `paths`.
+	Raises a `LoadError` for the first file (in that order) that
+	could not be read; use `iterLoadMany` for reporting errors per
+	file (or for processing the files as soon as they are read)::
+
+	  for filename, result in fig.iterLoadMany(filenames):
+	      if isinstance(result, fig.LoadError):
+	          sys.stderr.write("%s\n" % result)
+	      else:
+	          ...
+
+	`compactPoints` and `lazy` have the same meaning as for `File`."""
+
+	result = []
+	for filename, figFile in iterLoadMany(paths, workers, compactPoints,
+										  ordered = True, lazy = lazy):
+		if isinstance(figFile, LoadError):
+			raise figFile
+		result.append(figFile)
+	return result
+
+exportCache = None
+"""Directory for caching fig2dev results (default: None, i.e. no
+caching), used by `File.fig2dev` and `exportMany`.  Results are
+stored under a hash of the XFig file's name and contents, the output
+language, the fig2dev options, and the contents of all included
+pictures, so that unchanged figures are not converted again; instead,
+the cached result is copied (or hard-linked, see `exportCacheLinks`)."""
+
+exportCacheLinks = False
+"""If True, results from the `exportCache` are hard-linked instead of
+copied (where possible).  This saves time and space, but the cached
+file is then modified, too, if the output file is modified in-place."""
+
+def _exportCacheKey(input, lang, options):
+	"""Return the `exportCache` key for converting the XFig file
+	`input` into `lang` with the given fig2dev `options`, or None if
+	the file cannot be read (which is left to fig2dev to report)."""
+	import cStringIO
+	try:
+		data = file(input, "rb").read()
+		# (only the picture objects are actually parsed:)
+		pictureFilenames = set([
+			o.filename for o in File(cStringIO.StringIO(data), lazy = True).allObjects()
+			if isinstance(o, PictureBBox)])
+	except Exception:
+		return None
+	# fig2dev puts the input filename into some formats (e.g. EPS titles):
+	key = hashlib.sha1("figpy export cache 1\0%s\0%s\0%s\0" % (
+		os.path.basename(input), lang, "\0".join(options)))
+	key.update(hashlib.sha1(data).hexdigest())
+	path = os.path.dirname(input)
+	for pictureFilename in sorted(pictureFilenames):
+		try:
+			digest = hashlib.sha1(
+				file(os.path.join(path, pictureFilename), "rb").read()).hexdigest()
+		except IOError:
+			digest = "missing"
+		key.update("\0%s\0%s" % (pictureFilename, digest))
+	return key.hexdigest()
+
+def _cachedExportFilename(cache, key):
+	return os.path.join(cache, key[:2], key[2:])
+
+def _fetchCachedExport(cache, key, output):
+	"""Copy (or link) the cached export result with the given key to
+	`output`, return False if there is none."""
+	cached = _cachedExportFilename(cache, key)
+	if not os.path.exists(cached):
+		return False
+	if os.path.exists(output):
+		os.remove(output)
+	if exportCacheLinks and hasattr(os, "link"):
+		try:
+			os.link(cached, output)
+			return True
+		except OSError: # e.g. different file systems
+			pass
+	shutil.copyfile(cached, output)
+	return True
+
+def _storeCachedExport(cache, key, output):
+	"""Store `output` in the export cache under the given key."""
+	cached = _cachedExportFilename(cache, key)
+	cacheDir = os.path.dirname(cached)
+	if not os.path.isdir(cacheDir):
+		try:
+			os.makedirs(cacheDir)
+		except OSError: # created concurrently?
+			if not os.path.isdir(cacheDir):
+				raise
+	# copy to a temporary file first, so that concurrent exports never
+	# see incomplete cache entries:
+	fd, tempName = tempfile.mkstemp("", ".figpy", cacheDir)
+	os.close(fd)
+	try:
+		shutil.copyfile(output, tempName)
+		if os.name == "nt" and os.path.exists(cached):
+			os.remove(cached)
+		os.rename(tempName, cached)
+	except:
+		if os.path.exists(tempName):
+			os.remove(tempName)
+		raise
+
+class ExportResult(object):
+	"""Result of one fig2dev conversion run by `exportMany`:
+
+	- input, lang, output (the job; `output` is an absolute path)
+	- returncode (exit code of fig2dev, 127 if it could not be run)
+	- stderr (error output of fig2dev)
+	- skipped (True if the job was already done in a previous run,
+	  according to the journal)
+	- cached (True if the result was taken from the `exportCache`)"""
+
+	__slots__ = ("input", "lang", "output", "returncode", "stderr", "skipped",
+				 "cached")
+
+	def __init__(self, input, lang, output, returncode = 0, stderr = "",
+				 skipped = False, cached = False):
+		self.input = input
+		self.lang = lang
+		self.output = output
+		self.returncode = returncode
+		self.stderr = stderr
+		self.skipped = skipped
+		self.cached = cached
+
+	def ok(self):
+		"""Return whether the conversion was successful."""
+		return self.returncode == 0
+
+	def __repr__(self):
+		return "<fig.ExportResult %s -> %s: %s>" % (
+			self.input, self.output,
+			self.skipped and "skipped" or "exit code %d" % self.returncode)
+
+def _exportJob(job):
+	"""Runs fig2dev for one `exportMany` job (in a worker thread)."""
+	index, input, lang, output, options, cache = job
+	import subprocess
+	path, basename = os.path.split(input)
+	if cache:
+		cacheKey = _exportCacheKey(input, lang, options)
+		if cacheKey is None:
+			cache = None # let fig2dev report the problem
+		elif _fetchCachedExport(cache, cacheKey, output):
+			return index, ExportResult(input, lang, output, cached = True)
+	if os.path.exists(output):
+		os.remove(output) # might be a (cached) hard link
+	trace = _startTrace("fig2dev", input)
+	try:
+		fig2dev = subprocess.Popen(
+			["fig2dev", "-L", lang] + list(options) + [basename, output],
+			cwd = path or None,
+			stdout = subprocess.PIPE, stderr = subprocess.PIPE)
+		stdout, stderr = fig2dev.communicate()
+		returncode = fig2dev.returncode
+	except OSError, e:
+		returncode, stderr = 127, "could not run fig2dev: %s\n" % e
+	if trace is not None:
+		trace.counts["failed"] = int(returncode != 0)
+		trace.finish()
+	if cache and returncode == 0:
+		_storeCachedExport(cache, cacheKey, output)
+	return index, ExportResult(input, lang, output, returncode, stderr)
+
+def _upToDate(input, output):
+	"""Return whether `input` and `output` exist and `output` is not
+	older than `input` (used for skipping `exportMany` jobs)."""
+	try:
+		return os.path.getmtime(output) >= os.path.getmtime(input)
+	except OSError:
+		return False
+
+def _journalKey(input, lang, output):
+	return "%s\t%s\t%s\t%s" % (
+		os.path.getmtime(input), lang, os.path.abspath(input), output)
+
+def exportMany(jobs, workers = None, journal = None, options = (), cache = None):
+	"""exportMany(jobs, workers = None, journal = None, options = (), cache = None) -> list
+
+	Runs fig2dev for many conversion jobs concurrently, with at most
+	`workers` (default: one per CPU) fig2dev processes at a time.
+	Each job is a tuple ``(input, lang)`` or ``(input, lang,
+	output)``, e.g. ``("plot.fig", "pdf")``; `output` defaults to
+	the input filename with the extension replaced by `lang`.  (In
+	contrast to `File.fig2dev`, a relative `output` is relative to
+	the current directory.)  `options` are additional command line
+	arguments for fig2dev.
+
+	Returns a list of `ExportResult` objects (in the order of
+	`jobs`) with the exit code and error output of each conversion.
+
+	If a `journal` filename is given, each successful conversion is
+	recorded there immediately, and jobs recorded in an existing
+	journal are skipped as long as their input file has not been
+	modified since, and their output still exists and is not older
+	than the input.  Thus, an interrupted run can be resumed by
+	calling exportMany() with the same journal again.
+
+	Unchanged figures are taken from the `cache` directory (default:
+	the module's `exportCache`) if given, see `exportCache`."""
+
+	if cache is None:
+		cache = exportCache
+
+	pending = []
+	results = []
+	for index, job in enumerate(jobs):
+		input, lang = job[:2]
+		if len(job) > 2:
+			output = job[2]
+		else:
+			output = os.path.splitext(input)[0] + "." + lang
+		results.append(ExportResult(input, lang, os.path.abspath(output)))
+		pending.append((index, input, lang, os.path.abspath(output), options,
+						cache))
+
+	journalFile = None
+	if journal is not None:
+		done = set()
+		if os.path.exists(journal):
+			done = set(file(journal).read().splitlines())
+		todo = []
+		for job in pending:
+			# (_upToDate() first, since it checks that the input exists)
+			if _upToDate(job[1], job[3]) and _journalKey(*job[1:4]) in done:
+				results[job[0]].skipped = True
+			else:
+				todo.append(job)
+		pending = todo
+		journalFile = file(journal, "a")
+
+	if workers is None:
+		import multiprocessing
+		workers = multiprocessing.cpu_count()
+	workers = max(1, min(workers, len(pending)))
+
+	from multiprocessing.pool import ThreadPool
+	pool = ThreadPool(workers)
+	try:
+		for index, result in pool.imap_unordered(_exportJob, pending):
+			results[index] = result
+			if journalFile is not None and result.ok():
+				journalFile.write(_journalKey(
+					result.input, result.lang, result.output) + "\n")
+				journalFile.flush()
+		pool.close()
+	finally:
+		pool.terminate()
+		pool.join()
+		if journalFile is not None:
+			journalFile.close()
+
+	return results
+
+# --------------------------------------------------------------------
+#                          binary snapshots
+# --------------------------------------------------------------------
+
+_marshalTypes = set((int, long, float, bool, str, unicode, type(None)))
+
+_transientSlots = set(Object._transientSlots + Compound._transientSlots +
+					  File._transientSlots)
+
+_unset = object()
+
+_snapshotSlots = {}
+
+def _snapshotSlotNames(cls):
+	"""Return (cached) list of all slots of `cls` that are stored in
+	snapshots, and of those that are just reset to None."""
+	result = _snapshotSlots.get(cls)
+	if result is None:
+		stored, transient = [], []
+		for klass in reversed(cls.__mro__):
+			for name in getattr(klass, "__slots__", ()):
+				if name in _transientSlots:
+					transient.append(name)
+				elif name not in stored:
+					stored.append(name)
+		result = _snapshotSlots[cls] = (stored, transient)
+	return result
+
+def _snapshotLayout():
+	"""Return a string identifying the figpy version and the slots of
+	all classes stored in snapshots, so that snapshots written by
+	other versions are never loaded."""
+	classes = [cls for cls in globals().values()
+			   if isinstance(cls, type) and issubclass(cls, (Object, File))]
+	layout = sorted([(cls.__name__, _snapshotSlotNames(cls)[0])
+					 for cls in classes])
+	return "figpy %s snapshot %s" % (
+		__version__, hashlib.sha1(repr(layout)).hexdigest()[:12])
+
+_snapshotMagic = _snapshotLayout()
+
+def _encodeColumn(values, pickled):
+	"""Encode the values of one slot of all objects of a class in a
+	form that can be marshalled efficiently (see `_decodeColumn`).
+	Values that need to be pickled are appended to `pickled`."""
+	types = set(map(type, values))
+	if types <= _marshalTypes:
+		return ("raw", values)
+	if types == set((Vector, )):
+		xs, ys = [v._x for v in values], [v._y for v in values]
+		if set(map(type, xs + ys)) <= _marshalTypes:
+			return ("vectors", xs, ys)
+	elif types <= set((_NamedInt, int)):
+		namespaces = set([v._namespace for v in values if type(v) is _NamedInt])
+		if len(namespaces) == 1:
+			namespace, = namespaces
+			if globals().get(namespace.__name__) is namespace:
+				return ("constants", namespace.__name__, map(int, values))
+	elif types <= set((list, _PointList)):
+		points = [p for pointList in values for p in pointList]
+		if set(map(type, points)) <= set((Vector, )):
+			xs, ys = [v._x for v in points], [v._y for v in points]
+			if set(map(type, xs + ys)) <= _marshalTypes:
+				return ("vectorLists", map(len, values), xs, ys)
+	elif types == set((PointArray, )):
+		return ("pointArrays", [p._xy.tostring() for p in values])
+	pickled.append(values)
+	return ("pickled", len(pickled) - 1)
+
+def _newInstances(cls, count):
+	"""Return list of `count` new (uninitialized) `cls` instances."""
+	return list(itertools.starmap(cls.__new__, itertools.repeat((cls, ), count)))
+
+def _makeVectors(xs, ys):
+	result = _newInstances(Vector, len(xs))
+	map(Vector._x.__set__, result, xs)
+	map(Vector._y.__set__, result, ys)
+	return result
+
+def _decodeColumn(column, pickled):
+	kind = column[0]
+	if kind == "raw":
+		return column[1]
+	if kind == "vectors":
+		return _makeVectors(column[1], column[2])
+	if kind == "constants":
+		lookup = globals()[column[1]].__reverse__.get
+		return map(lookup, column[2], column[2])
+	if kind == "vectorLists":
+		vectors = _makeVectors(column[2], column[3])
+		result, end = [], 0
+		for count in column[1]:
+			begin, end = end, end + count
+			result.append(_PointList(vectors[begin:end]))
+		return result
+	if kind == "pointArrays":
+		result = _newInstances(PointArray, len(column[1]))
+		for pointArray, data in zip(result, column[1]):
+			pointArray._xy = array.array("i")
+			pointArray._xy.fromstring(data)
+		return result
+	return pickled[column[1]]
+
+def _sourceInfo(filename, compactPoints):
+	"""Return the information stored in snapshots for checking
+	whether the source file is unchanged: ``(mtime, size, sha1)``
+	(+ the `compactPoints` setting)."""
+	stat = os.stat(filename)
+	digest = hashlib.sha1(file(filename, "rb").read()).hexdigest()
+	return (stat.st_mtime, stat.st_size, digest, bool(compactPoints))
+
+def _saveSnapshot(figFile, snapshotFilename, sourceInfo):
+	"""Write `figFile` into a snapshot (see `File.open`)."""
+	classes, classIndex, objects = [], {}, []
+	order, childCounts = [], []
+	def visit(container):
+		for o in container:
+			cls = getattr(type(o), "_readClass", type(o))
+			index = classIndex.get(cls)
+			if index is None:
+				index = classIndex[cls] = len(classes)
+				classes.append(cls)
+				objects.append([])
+			order.append(index)
+			objects[index].append(o)
+			if isinstance(o, Compound):
+				childCounts.append(len(o))
+				visit(o)
+	visit(figFile)
+
+	pickled = []
+	columns = []
+	for cls, instances in zip(classes, objects):
+		classColumns = []
+		for name in _snapshotSlotNames(cls)[0]:
+			values = [getattr(o, name, _unset) for o in instances]
+			indices = None
+			if _unset in values:
+				indices = [i for i, v in enumerate(values) if v is not _unset]
+				values = [v for v in values if v is not _unset]
+			classColumns.append((name, indices, _encodeColumn(values, pickled)))
+		columns.append(classColumns)
+
+	header = dict([(name, getattr(figFile, name))
+				   for name in _snapshotSlotNames(File)[0]
+				   if hasattr(figFile, name)])
+	import cPickle
+	body = ([cls.__name__ for cls in classes], order, childCounts, len(figFile),
+			columns, cPickle.dumps((header, pickled), 2))
+
+	# write to a temporary file first, so that no incomplete snapshot
+	# is ever read:
+	fd, tempName = tempfile.mkstemp(".figc", ".figpy",
+									os.path.dirname(os.path.abspath(snapshotFilename)))
+	try:
+		outputFile = os.fdopen(fd, "wb")
+		try:
+			marshal.dump((_snapshotMagic, sourceInfo), outputFile)
+			marshal.dump(body, outputFile)
+		finally:
+			outputFile.close()
+		if os.name == "nt" and os.path.exists(snapshotFilename):
+			os.remove(snapshotFilename)
+		os.rename(tempName, snapshotFilename)
+	except:
+		if os.path.exists(tempName):
+			os.remove(tempName)
+		raise
+
+def _loadSnapshot(snapshotFilename, filename, compactPoints):
+	"""Return the `File` stored in the given snapshot, or None if
+	there is no (valid) snapshot for the current contents of the
+	source file `filename`."""
+	try:
+		inputFile = file(snapshotFilename, "rb")
+	except IOError:
+		return None
+	try:
+		try:
+			magic, sourceInfo = marshal.load(inputFile)
+		except (EOFError, ValueError, TypeError):
+			return None
+		if magic != _snapshotMagic or sourceInfo[3] != bool(compactPoints):
+			return None
+		stat = os.stat(filename)
+		if (stat.st_mtime, stat.st_size) != sourceInfo[:2]:
+			# e.g. touched or copied, but maybe not modified:
+			if stat.st_size != sourceInfo[1] or \
+				   _sourceInfo(filename, compactPoints) [2] != sourceInfo[2]:
+				return None
+		classNames, order, childCounts, topLevelCount, columns, pickledData = \
+					marshal.load(inputFile)
+	finally:
+		inputFile.close()
+
+	# lots of objects are created below, none of which are garbage:
+	gcEnabled = gc.isenabled()
+	gc.disable()
+	try:
+		return _restoreSnapshot(
+			classNames, order, childCounts, topLevelCount, columns, pickledData)
+	finally:
+		if gcEnabled:
+			gc.enable()
+
+def _restoreSnapshot(classNames, order, childCounts, topLevelCount, columns,
+					 pickledData):
+	import cPickle
+	header, pickled = cPickle.loads(pickledData)
+
+	objects = []
+	for className, classColumns in zip(classNames, columns):
+		cls = globals()[className]
+		instances = _newInstances(cls, order.count(len(objects)))
+		n = len(instances)
+		for name in _snapshotSlotNames(cls)[1]:
+			map(setattr, instances, [name] * n, [None] * n)
+		for name, indices, column in classColumns:
+			values = _decodeColumn(column, pickled)
+			if indices is None:
+				targets = instances
+			else:
+				targets = map(instances.__getitem__, indices)
+			map(setattr, targets, [name] * len(values), values)
+		objects.append(iter(instances))
+
+	# objects in document order (compounds followed by their contents):
+	objects = map(next, map(objects.__getitem__, order))
+	childCounts = iter(childCounts)
+	objectIter = iter(objects)
+	def fill(container, count):
+		for i in xrange(count):
+			o = objectIter.next()
+			list.append(container, o)
+			o._parent = container
+			if isinstance(o, Compound):
+				fill(o, childCounts.next())
+
+	result = File()
+	for name, value in header.items():
+		setattr(result, name, value)
+	fill(result, topLevelCount)
+	_documentModified(result)
+	return result
 
 # --------------------------------------------------------------------
 
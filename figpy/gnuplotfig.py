@@ -145,6 +145,7 @@ class GnuplotFig(fig.File):
 		return line
 
 if __name__ == "__main__":
+	fig.profileOption()
 	for fn in sys.argv[1:]:
 		f = GnuplotFig(fn)
 		if f.needsFixing():
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""Tests for the cached bounds of objects and compounds, which must
+be invalidated by all kinds of modifications."""
+
+import os, unittest
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+class BoundsTest(unittest.TestCase):
+	def setUp(self):
+		self.figFile = fig.File(os.path.join(testDir, "figpy-testcompounds.fig"))
+		self.compound = [o for o in self.figFile.allObjects(includeCompounds = True)
+						 if isinstance(o, fig.Compound)][0]
+		self.polyline = [o for o in self.compound.allObjects()
+						 if isinstance(o, fig.PolylineBase)][0]
+		# fill the caches:
+		self.figFile.bounds()
+		self.compound.bounds()
+		self.polyline.bounds()
+
+	def checkRight(self, x2):
+		self.assertEqual(self.polyline.bounds().x2, x2)
+		self.assertEqual(self.compound.bounds().x2, x2)
+		self.assertEqual(self.figFile.bounds().x2, x2)
+
+	def testVectorAttribute(self):
+		self.polyline.points[0].x = 900000
+		self.checkRight(900000)
+
+	def testVectorItem(self):
+		self.polyline.points[0][0] = 900000
+		self.checkRight(900000)
+
+	def testIteration(self):
+		for point in self.polyline.points:
+			point.x += 900000
+		self.assertTrue(self.polyline.bounds().x1 >= 900000)
+		self.assertTrue(self.compound.bounds().x2 >= 900000)
+
+	def testAppend(self):
+		self.polyline.points.append(fig.Vector(900000, 0))
+		self.checkRight(900000)
+
+	def testListItem(self):
+		self.polyline.points[0] = fig.Vector(900000, 0)
+		self.checkRight(900000)
+
+	def testAssignment(self):
+		self.polyline.points = [fig.Vector(0, 0), fig.Vector(900000, 0)]
+		self.checkRight(900000)
+		self.polyline.points.append(fig.Vector(950000, 0))
+		self.checkRight(950000)
+
+	def testRemove(self):
+		self.assertEqual(self.figFile.bounds().y1, self.compound.bounds().y1)
+		self.figFile.remove(self.compound)
+		self.assertTrue(self.figFile.bounds().y1 > self.compound.bounds().y1)
+
+if __name__ == "__main__":
+	unittest.main()
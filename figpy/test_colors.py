@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""Tests for custom colors, in particular for reducing documents with
+more than the 512 custom colors supported by the file format with
+`File.quantizeColors`."""
+
+import unittest, math, copy, random
+import fig
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+def heatMap(size = 64):
+	"""Return a document with size x size boxes filled with
+	(size*size distinct) colors of a smooth gradient, and the list of
+	the original R,G,B tuples of the boxes."""
+
+	result = fig.File()
+	rgbs = []
+	step = 255.0 / (size - 1)
+	for y in range(size):
+		for x in range(size):
+			rgb = (int(round(x * step)), int(round(y * step)),
+				   int(round((x + y) * step / 2)))
+			box = fig.PolyBox(x * 100, y * 100, x * 100 + 90, y * 100 + 90)
+			box.fillColor = result.getColor(rgb)
+			box.fillStyle = fig.FillStyle.Solid
+			result.append(box)
+			rgbs.append(rgb)
+	return result, rgbs
+
+class ColorTest(unittest.TestCase):
+	def testManyColors(self):
+		figFile, rgbs = heatMap()
+		self.assertEqual(len(figFile.colors), len(rgbs))
+		self.assertEqual([figFile.colorRGB(int(o.fillColor)) for o in figFile],
+						 rgbs)
+		self.assertRaises(AssertionError, str, figFile)
+
+	def testSimilarity(self):
+		figFile = fig.File()
+		red = figFile.getColor((255, 0, 0))
+		self.assertEqual(figFile.getColor((250, 0, 0), similarity = 10), red)
+		self.assertRaises(KeyError, figFile.getColor, (0, 0, 255), 0.0)
+
+	def testNearestColor(self):
+		rnd = random.Random(42)
+		figFile = fig.File()
+		for i in range(300):
+			figFile.addColor("#%02x%02x%02x" % (
+				rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+		rgbs = [c.rgb() for c in figFile.colors]
+		for i in range(200):
+			rgb = (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256))
+			sqDiffs = [sum([(a - b)**2 for a, b in zip(rgb, other)])
+					   for other in rgbs]
+			best = min(sqDiffs)
+			color = figFile.getColor(rgb, similarity = 1000)
+			self.assertEqual(sqDiffs[int(color) - fig.Color.Custom0], best)
+			if best >= 20**2:
+				self.assertRaises(KeyError, figFile.getColor, rgb, -1)
+				self.assertEqual(len(figFile.colors), len(rgbs))
+
+	def testModifiedColorList(self):
+		# the nearest color index must notice direct changes of colors:
+		figFile = fig.File()
+		figFile.getColor((255, 0, 0))
+		figFile.getColor((250, 0, 0), similarity = 10)
+		del figFile.colors[:]
+		figFile._colorhash.clear()
+		blue = figFile.getColor((0, 0, 255))
+		self.assertEqual(figFile.getColor((250, 0, 0), similarity = 10).hexCode,
+						 "#fa0000")
+		self.assertEqual(figFile.getColor((5, 0, 250), similarity = 10), blue)
+
+	def testGetColors(self):
+		rnd = random.Random(42)
+		colors = [(rnd.randrange(0, 256, 16), rnd.randrange(0, 256, 16), 0)
+				  for i in range(500)]
+		for similarity in (None, 30):
+			# getColors() looks up every distinct color only once, at
+			# its first occurrence:
+			expected = fig.File()
+			firstIndices = {}
+			for c in colors:
+				if c not in firstIndices:
+					firstIndices[c] = int(expected.getColor(c, similarity))
+			indices = [firstIndices[c] for c in colors]
+			figFile = fig.File()
+			self.assertEqual(list(figFile.getColors(colors, similarity)), indices)
+			self.assertEqual([c.hexCode for c in figFile.colors],
+							 [c.hexCode for c in expected.colors])
+
+	if numpy is not None:
+		def testQuantize(self):
+			figFile, rgbs = heatMap()
+			for method in ("median-cut", "kmeans"):
+				quantized = copy.deepcopy(figFile)
+				mapping = quantized.quantizeColors(method = method)
+				self.assertEqual(len(mapping), len(rgbs))
+				self.assertTrue(len(quantized.colors) <= 512)
+				sqDiffs = [sum([(a - b)**2 for a, b in zip(
+					quantized.colorRGB(int(o.fillColor)), rgb)])
+						   for o, rgb in zip(quantized, rgbs)]
+				rmsError = math.sqrt(float(sum(sqDiffs)) / len(sqDiffs))
+				self.assertTrue(rmsError < 10, "%s: RMS error %.1f" % (method, rmsError))
+				str(quantized) # must not fail anymore
+
+		def testQuantizeFewColors(self):
+			figFile = fig.File()
+			box = fig.PolyBox(0, 0, 10, 10)
+			box.penColor = figFile.getColor((1, 2, 3))
+			figFile.append(box)
+			self.assertEqual(figFile.quantizeColors(), {})
+			self.assertEqual(figFile.colorRGB(int(box.penColor)), (1, 2, 3))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""Tests for the depth index (`Container.enableDepthIndex`), with which
+`layer()` and `layers()` must return the same as without it, also
+after the document has been modified."""
+
+import os, unittest, random
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+class DepthIndexTest(unittest.TestCase):
+	def setUp(self):
+		self.figFile = fig.File(os.path.join(testDir, "figpy-testcompounds.fig"))
+		self.figFile.enableDepthIndex()
+
+	def check(self):
+		depths = dict.fromkeys(
+			[o.depth for o in self.figFile.allObjects()]).keys()
+		depths.sort()
+		self.assertEqual(self.figFile.layers(), depths)
+		for depth in depths + [12345]:
+			self.assertEqual(
+				map(id, self.figFile.layer(depth)),
+				[id(o) for o in self.figFile.allObjects() if o.depth == depth])
+
+	def newPolyline(self, depth):
+		result = fig.Polyline([(0, 0), (100, 100)])
+		result.depth = depth
+		return result
+
+	def testUnmodified(self):
+		self.check()
+
+	def testDepthChange(self):
+		obj = list(self.figFile.allObjects())[0]
+		obj.depth = 999
+		self.check()
+		self.assertEqual(list(self.figFile.layer(999)), [obj])
+
+	def testAppendRemove(self):
+		polyline = self.newPolyline(7)
+		self.figFile.append(polyline)
+		self.check()
+		self.figFile.remove(polyline)
+		self.check()
+		self.figFile.insert(0, self.newPolyline(8))
+		self.check()
+		del self.figFile[0]
+		self.check()
+
+	def testCompounds(self):
+		compound = [o for o in self.figFile.allObjects(includeCompounds = True)
+					if isinstance(o, fig.Compound)][0]
+		polyline = self.newPolyline(7)
+		compound.append(polyline)
+		self.check()
+		polyline.depth = 9
+		self.check()
+		self.figFile.remove(compound)
+		self.check()
+
+	def testRandomEdits(self):
+		rnd = random.Random(42)
+		for step in range(200):
+			objects = list(self.figFile.allObjects())
+			r = rnd.random()
+			if r < 0.4 and objects:
+				rnd.choice(objects).depth = rnd.choice([10, 20, 50, 99])
+			elif r < 0.6 and objects:
+				self.figFile.remove(rnd.choice(objects))
+			else:
+				compounds = [c for c in self.figFile.allObjects(True)
+							 if isinstance(c, fig.Compound)]
+				rnd.choice([self.figFile] + compounds).append(
+					self.newPolyline(rnd.choice([10, 20, 50])))
+			self.check()
+
+	def testDisable(self):
+		list(self.figFile.allObjects())[0].depth = 999
+		self.figFile.disableDepthIndex()
+		self.check()
+
+	def testStateExcludesIndex(self):
+		obj = list(self.figFile.allObjects())[0]
+		copied = type(obj).__new__(type(obj))
+		copied.__setstate__(obj.__getstate__())
+		self.assertEqual(copied.depth, obj.depth)
+		copied.depth = 999
+		self.assertFalse(999 in self.figFile.layers())
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""Tests for the keys of the fig2dev export cache (see
+`fig.exportCache`), which must change whenever the output of fig2dev
+might change."""
+
+import os, unittest, tempfile, shutil
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+class ExportCacheKeyTest(unittest.TestCase):
+	def setUp(self):
+		self.tempDir = tempfile.mkdtemp()
+		self.filename = self.copy("figpy-testwalter.fig")
+
+	def tearDown(self):
+		shutil.rmtree(self.tempDir)
+
+	def copy(self, name, subdir = ""):
+		path = os.path.join(self.tempDir, subdir)
+		if not os.path.isdir(path):
+			os.makedirs(path)
+		result = os.path.join(path, name)
+		shutil.copy(os.path.join(testDir, name), result)
+		return result
+
+	def key(self, filename = None, lang = "pdf", options = ()):
+		return fig._exportCacheKey(filename or self.filename, lang, options)
+
+	def testEqualFiles(self):
+		other = self.copy("figpy-testwalter.fig", "other")
+		os.utime(other, (1, 1))
+		self.assertEqual(self.key(other), self.key())
+
+	def testJobParameters(self):
+		key = self.key()
+		self.assertNotEqual(self.key(lang = "eps"), key)
+		self.assertNotEqual(self.key(options = ("-m", "2")), key)
+		renamed = os.path.join(self.tempDir, "renamed.fig")
+		shutil.copy(self.filename, renamed)
+		self.assertNotEqual(self.key(renamed), key)
+
+	def testContents(self):
+		key = self.key()
+		file(self.filename, "a").write("# appended comment\n")
+		self.assertNotEqual(self.key(), key)
+
+	def testPictures(self):
+		figFile = fig.File(self.filename)
+		picture = fig.PictureBBox(0, 0, 100, 100, "picture.png")
+		figFile.append(picture)
+		figFile.save()
+		missingKey = self.key()
+		pictureFilename = os.path.join(self.tempDir, "picture.png")
+		file(pictureFilename, "wb").write("first")
+		firstKey = self.key()
+		file(pictureFilename, "wb").write("second")
+		self.assertEqual(len(set([missingKey, firstKey, self.key()])), 3)
+
+	def testStoreFetch(self):
+		cache = os.path.join(self.tempDir, "cache")
+		output = os.path.join(self.tempDir, "output.pdf")
+		key = self.key()
+		self.assertFalse(fig._fetchCachedExport(cache, key, output))
+		file(output, "wb").write("converted")
+		fig._storeCachedExport(cache, key, output)
+		file(output, "wb").write("overwritten")
+		self.assertTrue(fig._fetchCachedExport(cache, key, output))
+		self.assertEqual(file(output, "rb").read(), "converted")
+
+	def testUnreadable(self):
+		self.assertEqual(self.key(os.path.join(self.tempDir, "missing.fig")), None)
+
+if __name__ == "__main__":
+	unittest.main()
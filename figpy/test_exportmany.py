@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""Tests for the batch export driver `fig.exportMany` (only for the
+bookkeeping, so that fig2dev does not need to be installed)."""
+
+import os, unittest, tempfile, shutil
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+class ExportManyTest(unittest.TestCase):
+	def setUp(self):
+		self.tempDir = tempfile.mkdtemp()
+		self.journal = os.path.join(self.tempDir, "journal")
+		self.inputs = []
+		for i in range(3):
+			filename = os.path.join(self.tempDir, "input%d.fig" % i)
+			shutil.copy(os.path.join(testDir, "figpy-testcase1.fig"), filename)
+			os.utime(filename, (1000, 1000))
+			self.inputs.append(filename)
+
+	def tearDown(self):
+		shutil.rmtree(self.tempDir)
+
+	def markDone(self, input, lang = "pdf"):
+		"""Pretend that `input` has been converted in a previous run."""
+		output = os.path.splitext(input)[0] + "." + lang
+		file(output, "w").write("converted")
+		file(self.journal, "a").write(
+			fig._journalKey(input, lang, output) + "\n")
+		return output
+
+	def testResults(self):
+		missing = os.path.join(self.tempDir, "missing.fig")
+		jobs = [(missing, "pdf"), (missing, "eps", "out.eps")]
+		results = fig.exportMany(jobs, workers = 2, journal = self.journal)
+		self.assertEqual([(r.input, r.lang, r.output) for r in results],
+						 [(missing, "pdf", os.path.join(self.tempDir, "missing.pdf")),
+						  (missing, "eps", os.path.abspath("out.eps"))])
+		self.assertFalse(any([r.ok() or r.skipped for r in results]))
+		# failed jobs are not recorded:
+		self.assertEqual(file(self.journal).read(), "")
+
+	def testJournalSkips(self):
+		outputs = map(self.markDone, self.inputs)
+		results = fig.exportMany([(input, "pdf") for input in self.inputs],
+								 journal = self.journal)
+		self.assertTrue(all([r.skipped and r.ok() for r in results]))
+		self.assertEqual([r.output for r in results], outputs)
+		self.assertEqual([file(output).read() for output in outputs],
+						 ["converted"] * 3)
+
+	def testModifiedInput(self):
+		map(self.markDone, self.inputs)
+		os.utime(self.inputs[1], (2000, 2000))
+		os.utime(os.path.splitext(self.inputs[2])[0] + ".pdf", (10, 10))
+		results = fig.exportMany([(input, "pdf") for input in self.inputs],
+								 journal = self.journal)
+		self.assertEqual([r.skipped for r in results], [True, False, False])
+
+	def testOtherLanguage(self):
+		self.markDone(self.inputs[0])
+		results = fig.exportMany([(self.inputs[0], "pdf"), (self.inputs[0], "eps")],
+								 journal = self.journal)
+		self.assertEqual([r.skipped for r in results], [True, False])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+"""Tests for the workload generator script figgen."""
+
+import sys, os, unittest, subprocess, StringIO
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+def figgen(*args):
+	return subprocess.Popen(
+		[sys.executable, os.path.join(testDir, "figgen")] + list(args),
+		stdout = subprocess.PIPE).communicate()[0]
+
+class FiggenTest(unittest.TestCase):
+	def testReproducible(self):
+		output = figgen("-n", "300", "-s", "7")
+		self.assertEqual(figgen("-n", "300", "-s", "7"), output)
+		self.assertNotEqual(figgen("-n", "300", "-s", "8"), output)
+
+	def testObjects(self):
+		figFile = fig.File(StringIO.StringIO(figgen("-n", "300", "--colors", "5")))
+		self.assertEqual(len(list(figFile.allObjects())), 300)
+		self.assertEqual(len(figFile.colors), 5)
+		self.assertTrue(any([isinstance(o, fig.Compound) for o in figFile]))
+
+	def testNoCompounds(self):
+		figFile = fig.File(StringIO.StringIO(figgen("-n", "300", "--nesting", "0")))
+		self.assertEqual(len(figFile), 300)
+		self.assertFalse(any([isinstance(o, fig.Compound) for o in figFile]))
+
+	def testMix(self):
+		figFile = fig.File(StringIO.StringIO(figgen("-n", "50", "-m", "text=1")))
+		self.assertTrue(all([isinstance(o, fig.Text) for o in figFile.allObjects()]))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""Golden-output tests: the fixture files must be saved exactly like
+the reference output in the golden/ directory (which was produced by
+fig.py before the save path was optimized)."""
+
+import sys, os, glob, copy, unittest, StringIO
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+goldenFiles = ["figpy-testwalter.fig", "figpy-testcase1.fig"]
+
+def golden(name):
+	return file(os.path.join(testDir, "golden", name), "rb").read()
+
+class GoldenOutputTest(unittest.TestCase):
+	def check(self, name, **kwargs):
+		figFile = fig.File(os.path.join(testDir, name), **kwargs)
+		expected = golden(name)
+		self.assertEqual(str(figFile), expected)
+		output = StringIO.StringIO()
+		figFile.write(output)
+		self.assertEqual(output.getvalue(), expected)
+
+	def testWalter(self):
+		self.check("figpy-testwalter.fig")
+
+	def testWalterCompactPoints(self):
+		self.check("figpy-testwalter.fig", compactPoints = True)
+
+	def testCase1(self):
+		self.check("figpy-testcase1.fig")
+
+	def testCase1CompactPoints(self):
+		self.check("figpy-testcase1.fig", compactPoints = True)
+
+	def testObjectsStr(self):
+		# the formatting of single objects must not depend on the
+		# document they are in:
+		for name in goldenFiles:
+			figFile = fig.File(os.path.join(testDir, name))
+			self.assertEqual(figFile.headerStr() +
+							 "".join(map(repr, figFile.colors)) +
+							 "".join(map(str, figFile)), golden(name))
+
+	def testDeepCopy(self):
+		for name in glob.glob(os.path.join(testDir, "figpy-test*.fig")):
+			figFile = fig.File(name)
+			self.assertEqual(str(copy.deepcopy(figFile)), str(figFile))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Tests for saving lazily read files, which must write the original
+text of all unchanged objects verbatim."""
+
+import os, unittest, glob, tempfile, shutil, difflib
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+def objectsText(figFile):
+	"""Return the part of the output of `figFile` after the header
+	and the custom colors."""
+	chunks = list(figFile.iterLines())
+	return "".join(chunks[1 + len(figFile.colors):])
+
+def leafObjects(container):
+	return [o for o in container.allObjects() if not isinstance(o, fig.Compound)]
+
+class IncrementalSaveTest(unittest.TestCase):
+	def setUp(self):
+		self.tempDir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.tempDir)
+
+	def testUnchanged(self):
+		for filename in glob.glob(os.path.join(testDir, "figpy-test*.fig")):
+			original = file(filename).read()
+			lazy = fig.File(filename, lazy = True)
+			self.assertTrue(original.endswith(objectsText(lazy)), filename)
+			# reading the objects does not change anything:
+			for o in leafObjects(lazy):
+				o.bounds()
+			self.assertTrue(original.endswith(objectsText(lazy)), filename)
+
+	def testChanged(self):
+		filename = os.path.join(testDir, "figpy-testwalter.fig")
+		original = file(filename).read()
+		lazy = fig.File(filename, lazy = True)
+		expected = fig.File(filename)
+		for objects in (leafObjects(lazy), leafObjects(expected)):
+			objects[3].penColor = fig.Color.Red
+			objects[5].points[0].x += 10
+
+		outputFilename = os.path.join(self.tempDir, "out.fig")
+		lazy.save(outputFilename)
+		output = file(outputFilename).read()
+		self.assertEqual(str(fig.File(outputFilename)), str(expected))
+
+		# only the lines of the two changed objects differ:
+		lineCount = objectsText(lazy).count("\n")
+		diff = list(difflib.ndiff(original.splitlines(True)[-lineCount:],
+								  output.splitlines(True)[-lineCount:]))
+		added = "".join([line[2:] for line in diff if line.startswith("+ ")])
+		removed = [line for line in diff if line.startswith("- ")]
+		changedObjects = leafObjects(lazy)[3:6:2]
+		self.assertEqual(added, "".join(map(str, changedObjects)))
+		self.assertEqual(len(removed), added.count("\n"))
+
+	def testChangedBack(self):
+		# objects that were read, changed, and restored are saved
+		# verbatim again:
+		filename = os.path.join(testDir, "figpy-testwalter.fig")
+		lazy = fig.File(filename, lazy = True)
+		obj = leafObjects(lazy)[3]
+		penColor = obj.penColor # (reads the object)
+		obj.penColor = fig.Color.Red
+		obj.penColor = penColor
+		self.assertTrue(file(filename).read().endswith(objectsText(lazy)))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+"""Tests for reading files object by object with `fig.iterObjects`."""
+
+import os, unittest, glob
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+fixtures = sorted(glob.glob(os.path.join(testDir, "figpy-test*.fig")))
+
+class IterObjectsTest(unittest.TestCase):
+	def testSameAsFile(self):
+		for filename in fixtures:
+			for compactPoints in (False, True):
+				expected = fig.File(filename, compactPoints)
+				header = fig.File()
+				objects = list(fig.iterObjects(filename, header, compactPoints))
+				self.assertEqual(map(str, objects), map(str, expected))
+				header.extend(objects)
+				self.assertEqual(str(header), str(expected))
+				self.assertEqual(header.filename, filename)
+
+	def testHeaderCompleteAtFirstObject(self):
+		filename = os.path.join(testDir, "figpy-testwalter.fig")
+		expected = fig.File(filename)
+		header = fig.File()
+		objects = fig.iterObjects(file(filename), header)
+		objects.next()
+		self.assertEqual(header.headerStr(), expected.headerStr())
+		self.assertEqual([c.hexCode for c in header.colors],
+						 [c.hexCode for c in expected.colors])
+
+	def testLines(self):
+		filename = os.path.join(testDir, "figpy-testcompounds.fig")
+		lines = file(filename).read().splitlines(True)
+		self.assertEqual(map(str, fig.iterObjects(lines)),
+						 map(str, fig.File(filename)))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""Tests for lazily read files (``File(..., lazy = True)``), which must
+behave exactly like completely parsed ones."""
+
+import os, unittest, glob, cPickle, StringIO
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+fixtures = sorted(glob.glob(os.path.join(testDir, "figpy-test*.fig")))
+
+headerAttributes = ("landscape", "centered", "metric", "paperSize",
+					"magnification", "singlePage", "transparentColor",
+					"ppi", "comment", "filename")
+
+def leafObjects(container):
+	return [o for o in container.allObjects() if not isinstance(o, fig.Compound)]
+
+class LazyFileTest(unittest.TestCase):
+	def testEquivalent(self):
+		for filename in fixtures:
+			for compactPoints in (False, True):
+				expected = fig.File(filename, compactPoints)
+				lazy = fig.File(filename, compactPoints, lazy = True)
+				for name in headerAttributes:
+					self.assertEqual(getattr(lazy, name), getattr(expected, name))
+				self.assertEqual([c.hexCode for c in lazy.colors],
+								 [c.hexCode for c in expected.colors])
+				self.assertEqual(lazy.layers(), expected.layers())
+				self.assertEqual([o.comment for o in lazy.allObjects(True)],
+								 [o.comment for o in expected.allObjects(True)])
+				for o, e in zip(leafObjects(lazy), leafObjects(expected)):
+					self.assertTrue(isinstance(o, type(e)))
+					self.assertEqual(str(o), str(e))
+					self.assertEqual(o.bounds(), e.bounds())
+
+	def testUnread(self):
+		lazy = fig.File(os.path.join(testDir, "figpy-testwalter.fig"), lazy = True)
+		lazy.layers()
+		lazy.findObjects(depth = 50)
+		self.assertTrue(all([o._isUnreadSource() for o in leafObjects(lazy)]))
+		obj = leafObjects(lazy)[0]
+		obj.penColor
+		self.assertFalse(obj._isUnreadSource())
+		self.assertTrue(leafObjects(lazy)[1]._isUnreadSource())
+
+	def testModify(self):
+		filename = os.path.join(testDir, "figpy-testwalter.fig")
+		lazy = fig.File(filename, lazy = True)
+		expected = fig.File(filename)
+		for objects in (leafObjects(lazy), leafObjects(expected)):
+			objects[0].penColor = fig.Color.Red
+			objects[1].depth = 7
+			objects[2].points[0].x += 10
+		self.assertEqual(str(fig.File(StringIO.StringIO(str(lazy)))), str(expected))
+
+	def testFileObject(self):
+		filename = os.path.join(testDir, "figpy-testcompounds.fig")
+		lazy = fig.File(file(filename), lazy = True)
+		self.assertEqual(str(fig.File(StringIO.StringIO(str(lazy)))),
+						 str(fig.File(filename)))
+
+	def testPickle(self):
+		for filename in fixtures:
+			lazy = fig.File(filename, lazy = True)
+			unpickled = cPickle.loads(cPickle.dumps(lazy, 2))
+			# (unchanged objects keep their original text:)
+			self.assertEqual(str(unpickled), str(lazy))
+			self.assertEqual(str(fig.File(StringIO.StringIO(str(unpickled)))),
+							 str(fig.File(filename)))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""Tests for reading many files in parallel (`fig.loadMany`,
+`fig.iterLoadMany`)."""
+
+import os, unittest, glob
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+fixtures = sorted(glob.glob(os.path.join(testDir, "figpy-test*.fig")))
+
+class LoadManyTest(unittest.TestCase):
+	def testSameAsFile(self):
+		for compactPoints, lazy in ((False, False), (True, False), (False, True)):
+			expected = [str(fig.File(filename, compactPoints, lazy))
+						for filename in fixtures]
+			for workers in (1, 3):
+				files = fig.loadMany(fixtures, workers, compactPoints, lazy)
+				self.assertEqual(map(str, files), expected)
+				self.assertEqual([f.filename for f in files], fixtures)
+
+	def testLazyKeepsSource(self):
+		# unchanged objects of lazily read files are saved verbatim,
+		# also after the transfer from the worker processes:
+		files = fig.loadMany(fixtures, workers = 3, lazy = True)
+		for filename, figFile in zip(fixtures, files):
+			objects = [o for o in figFile.allObjects() if o.comment == ""]
+			expected = str(fig.File(filename, lazy = True))
+			self.assertEqual(str(figFile), expected)
+			objects[0].depth = 998
+			self.assertNotEqual(str(figFile), expected)
+
+	def testUnordered(self):
+		results = dict(fig.iterLoadMany(fixtures, workers = 3))
+		self.assertEqual(sorted(results), fixtures)
+		for filename, figFile in results.items():
+			self.assertEqual(str(figFile), str(fig.File(filename)))
+
+	def testErrors(self):
+		missing = os.path.join(testDir, "missing.fig")
+		for workers in (1, 2):
+			results = list(fig.iterLoadMany(
+				[fixtures[0], missing], workers, ordered = True))
+			self.assertTrue(isinstance(results[0][1], fig.File))
+			self.assertEqual(results[1][0], missing)
+			self.assertTrue(isinstance(results[1][1], fig.LoadError))
+			self.assertEqual(results[1][1].filename, missing)
+			self.assertRaises(fig.LoadError, fig.loadMany, [missing, fixtures[0]], workers)
+
+	def testTracing(self):
+		events = []
+		fig.addTracer(events.append)
+		try:
+			fig.loadMany(fixtures[:2], workers = 2)
+		finally:
+			fig.removeTracer(events.append)
+		self.assertEqual(sorted([(e.operation, e.filename) for e in events]),
+						 [("read", filename) for filename in fixtures[:2]])
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""Tests for reading and setting attributes of all objects in an
+`ObjectProxy` at once."""
+
+import os, unittest
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+def commonValue(objects, key):
+	"""Reference implementation of `ObjectProxy.__getattr__`."""
+	values = [getattr(o, key) for o in objects if hasattr(o, key)]
+	if not values:
+		raise AttributeError(key)
+	for value in values[1:]:
+		if value != values[0]:
+			return None
+	return values[0]
+
+class ObjectProxyTest(unittest.TestCase):
+	def setUp(self):
+		self.figFile = fig.File(os.path.join(testDir, "figpy-testwalter.fig"))
+		self.proxy = self.figFile.findObjects()
+
+	def testGetAttribute(self):
+		for proxy in [self.proxy] + map(self.figFile.layer, self.figFile.layers()[:3]):
+			for key in ("depth", "penColor", "font", "fontSize", "points",
+						"lineWidth", "text", "radius", "nothing"):
+				try:
+					expected = commonValue(proxy, key)
+				except AttributeError:
+					self.assertRaises(AttributeError, getattr, proxy, key)
+				else:
+					self.assertEqual(getattr(proxy, key), expected)
+
+	def testValues(self):
+		counts, order = {}, []
+		for o in self.figFile.allObjects():
+			if o.depth not in counts:
+				order.append(o.depth)
+			counts[o.depth] = counts.get(o.depth, 0) + 1
+		values = self.proxy.values("depth")
+		self.assertEqual([value for value, count in values], order)
+		self.assertEqual(dict(values), counts)
+		# unhashable values:
+		points = self.proxy.values("points")
+		self.assertEqual(sum([count for value, count in points]),
+						 len([o for o in self.proxy if hasattr(o, "points")]))
+		self.assertEqual(self.proxy.values("nothing"), [])
+
+	def testUpdate(self):
+		self.proxy.update(lineWidth = 3, fontSize = 9, depth = 77)
+		self.assertTrue(all([o.lineWidth == 3 for o in self.proxy]))
+		self.assertTrue(all([o.fontSize == 9 for o in self.proxy
+							 if isinstance(o, fig.Text)]))
+		self.assertFalse(any([hasattr(o, "fontSize") for o in self.proxy
+							  if not isinstance(o, fig.Text)]))
+		self.assertEqual(self.figFile.layers(), [77])
+
+	def testSetAttribute(self):
+		self.proxy.penColor = fig.Color.Red
+		self.assertEqual(self.proxy.penColor, fig.Color.Red)
+		texts = self.figFile.findObjects(type = fig.Text)
+		texts.font = fig.Font.Courier
+		self.assertTrue(all([o.font == fig.Font.Courier for o in texts]))
+
+	def testUnsetSlot(self):
+		texts = self.figFile.findObjects(type = fig.Text)
+		text = texts[0]
+		del text.comment
+		texts.comment = "new"
+		self.assertFalse(hasattr(text, "comment"))
+		self.assertEqual(texts[1].comment, "new")
+
+	def testMethodNames(self):
+		compound = fig.Compound(self.figFile)
+		compound.append(fig.Polyline([(0, 0), (10, 10)]))
+		proxy = self.figFile.findObjects(type__in = (fig.Compound, fig.Polyline))
+		self.assertTrue(any([o is compound for o in proxy]))
+		proxy.findObjects = 5
+		self.assertTrue(callable(compound.findObjects))
+
+if __name__ == "__main__":
+	unittest.main()
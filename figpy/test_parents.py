@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""Tests for the parent pointers of objects (`Object.parentContainer`)
+and for moving objects between containers (`Object.detach`,
+`Container.adopt`)."""
+
+import os, unittest, copy, cPickle
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+class ParentTest(unittest.TestCase):
+	def setUp(self):
+		self.figFile = fig.File(os.path.join(testDir, "figpy-testcompounds.fig"))
+		self.objects = list(self.figFile.allObjects())
+
+	def checkParents(self, container):
+		for o in container:
+			self.assertTrue(o.parentContainer() is container)
+			if isinstance(o, fig.Compound):
+				self.checkParents(o)
+
+	def testParsed(self):
+		self.checkParents(self.figFile)
+		self.checkParents(fig.File(os.path.join(testDir, "figpy-testcompounds.fig"),
+								   lazy = True))
+		self.checkParents(cPickle.loads(cPickle.dumps(self.figFile, 2)))
+		self.checkParents(copy.deepcopy(self.figFile))
+
+	def testListOperations(self):
+		polyline = fig.Polyline([(0, 0), (10, 10)])
+		self.assertTrue(polyline.parentContainer() is None)
+		self.figFile.append(polyline)
+		self.assertTrue(polyline.parentContainer() is self.figFile)
+		self.assertTrue(self.figFile.pop() is polyline)
+		self.assertTrue(polyline.parentContainer() is None)
+		self.figFile.insert(0, polyline)
+		self.checkParents(self.figFile)
+		first = self.figFile[1]
+		self.figFile[0:2] = [fig.Polyline([(0, 0), (1, 1)])]
+		self.assertTrue(polyline.parentContainer() is None)
+		self.assertTrue(first.parentContainer() is None)
+		self.checkParents(self.figFile)
+		self.figFile[0] = polyline
+		del self.figFile[1]
+		self.checkParents(self.figFile)
+
+	def testRemove(self):
+		obj = self.objects[-1]
+		self.figFile.remove(obj)
+		self.assertTrue(obj.parentContainer() is None)
+		self.checkParents(self.figFile)
+
+	def testDetach(self):
+		obj = self.objects[len(self.objects) // 2]
+		parent = obj.parentContainer()
+		count = len(parent)
+		obj.detach()
+		self.assertEqual(len(parent), count - 1)
+		self.assertTrue(obj.parentContainer() is None)
+		self.assertFalse(obj in list(self.figFile.allObjects()))
+
+	def testAdopt(self):
+		compound = fig.Compound(self.figFile)
+		compound.adopt(self.objects[:3])
+		self.assertEqual(map(id, compound), map(id, self.objects[:3]))
+		self.checkParents(self.figFile)
+		self.assertEqual(len(list(self.figFile.allObjects())), len(self.objects))
+
+	def testAdoptCycle(self):
+		compound = fig.Compound(self.figFile)
+		self.assertRaises(ValueError, compound.adopt, [compound])
+		inner = fig.Compound(compound)
+		self.assertRaises(ValueError, inner.adopt, [compound])
+
+	def testProxyIsNoParent(self):
+		proxy = self.figFile.findObjects()
+		for o in proxy:
+			self.assertFalse(o.parentContainer() is proxy)
+		self.checkParents(self.figFile)
+
+	def testCopyHasNoParent(self):
+		self.assertTrue(copy.deepcopy(self.objects[0]).parentContainer() is None)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+"""Tests for the compact `PointArray` storage of points, whose items
+must write through to the array."""
+
+import os, unittest
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+class PointArrayTest(unittest.TestCase):
+	def setUp(self):
+		self.points = fig.PointArray([(0, 0), (10, 20), (30, 40)])
+
+	def testItemAttribute(self):
+		self.points[1].x = 7
+		self.points[-1].y = 8.4
+		self.assertEqual(list(self.points.flat()), [0, 0, 7, 20, 30, 8])
+
+	def testItemIndex(self):
+		self.points[0][0] = 5
+		self.points[0][1] = 6
+		self.assertEqual(tuple(self.points[0]), (5, 6))
+
+	def testIteration(self):
+		for point in self.points:
+			point.x += 100
+		self.assertEqual([p.x for p in self.points], [100, 110, 130])
+
+	def testAssignment(self):
+		self.points[2] = (1, 2)
+		self.assertEqual(tuple(self.points[2]), (1, 2))
+
+	def testDocument(self):
+		figFile = fig.File(os.path.join(testDir, "figpy-testwalter.fig"),
+						   compactPoints = True)
+		polyline = [o for o in figFile.allObjects()
+					if isinstance(o, fig.PolylineBase)][0]
+		self.assertTrue(isinstance(polyline.points, fig.PointArray))
+		polyline.bounds()
+		polyline.points[0].x = 900000
+		self.assertEqual(polyline.points[0].x, 900000)
+		self.assertEqual(polyline.bounds().x2, 900000)
+		self.assertTrue("900000" in str(figFile))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Tests for compiled queries (`Query`, `Container.findObjects`, and
+`Container.query`), whose results must match a plain scan over all
+objects, with and without indices."""
+
+import os, unittest
+import fig
+from fig import Query
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+class QueryTest(unittest.TestCase):
+	def cases(self, figFile):
+		depths = figFile.layers()
+		d0, d1 = depths[0], depths[-1]
+		rect = fig.Rect(0, 0, 5000, 5000)
+		return [
+			((), dict(depth = d0), lambda o: o.depth == d0),
+			((), dict(depth__in = (d0, d1)), lambda o: o.depth in (d0, d1)),
+			((), dict(depth__range = (d0, d1 - 1)), lambda o: d0 <= o.depth <= d1 - 1),
+			((), dict(lineWidth__gt = 1),
+			 lambda o: hasattr(o, "lineWidth") and o.lineWidth > 1),
+			((), dict(type__in = (fig.Text, fig.Polyline)),
+			 lambda o: isinstance(o, (fig.Text, fig.Polyline))),
+			((Query(depth = d0) | Query(type = fig.Text), ), {},
+			 lambda o: o.depth == d0 or isinstance(o, fig.Text)),
+			((Query(depth = d0) | Query(depth = d1), ),
+			 dict(penColor__ne = fig.Color.Black),
+			 lambda o: o.depth in (d0, d1) and o.penColor != fig.Color.Black),
+			((~Query(depth = d0), ), {}, lambda o: o.depth != d0),
+			((), dict(within = rect), lambda o: rect.contains(o.bounds())),
+			((), dict(within = rect, depth = d1),
+			 lambda o: rect.contains(o.bounds()) and o.depth == d1),
+			((), dict(font = fig.Font.Default),
+			 lambda o: getattr(o, "font", None) == fig.Font.Default),
+			]
+
+	def check(self, figFile):
+		objects = list(figFile.allObjects())
+		for queries, conditions, predicate in self.cases(figFile):
+			result = figFile.findObjects(*queries, **conditions)
+			self.assertTrue(isinstance(result, fig.ObjectProxy))
+			expected = map(id, filter(predicate, objects))
+			self.assertEqual(map(id, result), expected, conditions)
+			view = figFile.query(*queries, **conditions)
+			self.assertEqual(map(id, view), expected)
+			self.assertEqual(view.count(), len(expected))
+			self.assertEqual(view.exists(), bool(expected))
+			if expected:
+				self.assertEqual(id(view.first()), expected[0])
+		self.assertEqual(map(id, figFile.findObjects(type = fig.Compound)),
+						 [id(o) for o in figFile.allObjects(True)
+						  if isinstance(o, fig.Compound)])
+
+	def testFixtures(self):
+		for name in ("figpy-testwalter.fig", "figpy-testcase1.fig",
+					 "figpy-testcompounds.fig"):
+			for depthIndex in (False, True):
+				for spatialIndex in (False, True):
+					figFile = fig.File(os.path.join(testDir, name))
+					if depthIndex:
+						figFile.enableDepthIndex()
+					if spatialIndex:
+						figFile.enableSpatialIndex()
+					self.check(figFile)
+
+	def testModified(self):
+		figFile = fig.File(os.path.join(testDir, "figpy-testwalter.fig"))
+		figFile.enableDepthIndex()
+		figFile.enableSpatialIndex()
+		self.check(figFile)
+		objects = list(figFile.allObjects())
+		objects[0].depth = figFile.layers()[-1]
+		objects[1].lineWidth = 5
+		objects[2].points[0].x = 100
+		self.check(figFile)
+
+	def testProxy(self):
+		figFile = fig.File(os.path.join(testDir, "figpy-testwalter.fig"))
+		polylines = figFile.findObjects(type = fig.PolylineBase)
+		self.assertEqual(map(id, polylines.findObjects(depth__lt = 60)),
+						 [id(o) for o in polylines if o.depth < 60])
+
+	def testInvalidOperator(self):
+		self.assertRaises(TypeError, Query, depth__foo = 1)
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""Tests for lazy query views (`Container.query`, `QueryView`)."""
+
+import os, unittest
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+class QueryViewTest(unittest.TestCase):
+	def setUp(self):
+		self.figFile = fig.File(os.path.join(testDir, "figpy-testwalter.fig"))
+		self.depth = self.figFile.layers()[0]
+
+	def expected(self, predicate):
+		return [o for o in self.figFile.allObjects() if predicate(o)]
+
+	def testChained(self):
+		view = self.figFile.query(depth = self.depth).findObjects(type = fig.Polyline)
+		self.assertTrue(isinstance(view, fig.QueryView))
+		expected = self.expected(
+			lambda o: o.depth == self.depth and isinstance(o, fig.Polyline))
+		self.assertEqual(map(id, view), map(id, expected))
+		self.assertEqual(view.count(), len(expected))
+		self.assertTrue(view.first() is expected[0])
+		self.assertTrue(view.exists() and bool(view))
+
+	def testEmpty(self):
+		view = self.figFile.query(depth = -99)
+		self.assertFalse(view.exists())
+		self.assertFalse(view)
+		self.assertTrue(view.first() is None)
+		self.assertEqual(view.count(), 0)
+
+	def testLazy(self):
+		view = self.figFile.query(depth = 7)
+		self.assertEqual(view.count(), 0)
+		list(self.figFile.allObjects())[0].depth = 7
+		self.assertEqual(view.count(), 1)
+
+	def testNoLen(self):
+		self.assertRaises(TypeError, len, self.figFile.query())
+
+	def testProxy(self):
+		proxy = self.figFile.query(depth = self.depth).proxy()
+		self.assertTrue(isinstance(proxy, fig.ObjectProxy))
+		self.assertTrue(proxy.parent is self.figFile)
+		self.assertEqual(map(id, proxy),
+						 map(id, self.expected(lambda o: o.depth == self.depth)))
+
+	def testAttributes(self):
+		view = self.figFile.query(type = fig.Polyline)
+		view.lineWidth = 7
+		self.assertEqual(view.lineWidth, 7)
+		self.assertTrue(all([o.lineWidth == 7 for o in
+							 self.expected(lambda o: isinstance(o, fig.Polyline))]))
+
+	def testChangeQueriedAttribute(self):
+		for depthIndex in (False, True):
+			figFile = fig.File(os.path.join(testDir, "figpy-testwalter.fig"))
+			if depthIndex:
+				figFile.enableDepthIndex()
+			count = figFile.query(depth = self.depth).count()
+			figFile.query(depth = self.depth).depth = 998
+			self.assertEqual(figFile.query(depth = 998).count(), count)
+			self.assertFalse(figFile.query(depth = self.depth).exists())
+			self.assertEqual(len(figFile.layer(998)), count)
+
+	def testRemove(self):
+		view = self.figFile.query(type = fig.Text)
+		self.assertTrue(view.exists())
+		count = len(list(self.figFile.allObjects()))
+		removed = view.count()
+		view.remove()
+		self.assertFalse(view.exists())
+		self.assertEqual(len(list(self.figFile.allObjects())), count - removed)
+
+if __name__ == "__main__":
+	unittest.main()
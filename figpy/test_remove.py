@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""Tests for removing objects from containers (`Container.remove`,
+`Container.removeAll`, and `ObjectProxy.remove`)."""
+
+import os, unittest
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+class RemoveTest(unittest.TestCase):
+	def setUp(self):
+		self.figFile = fig.File(os.path.join(testDir, "figpy-testcompounds.fig"))
+		self.objects = list(self.figFile.allObjects())
+
+	def testRemoveAll(self):
+		removed = self.objects[::2]
+		self.assertEqual(self.figFile.removeAll(removed), len(removed))
+		self.assertEqual(list(self.figFile.allObjects()), self.objects[1::2])
+		self.assertEqual(self.figFile.removeAll(removed), 0)
+
+	def testRemoveNested(self):
+		compound = [o for o in self.figFile.allObjects(includeCompounds = True)
+					if isinstance(o, fig.Compound)][0]
+		nested = compound[0]
+		self.figFile.remove(nested)
+		self.assertFalse(nested in list(self.figFile.allObjects()))
+		self.assertRaises(ValueError, self.figFile.remove, nested)
+
+	def testProxyRemove(self):
+		proxy = self.figFile.findObjects(type = fig.PolylineBase)
+		self.assertTrue(len(proxy) > 0)
+		proxy.remove()
+		self.assertEqual(len(self.figFile.findObjects(type = fig.PolylineBase)), 0)
+		self.assertEqual(len(list(self.figFile.allObjects())),
+						 len(self.objects) - len(proxy))
+
+	def testProxyRemoveMissing(self):
+		proxy = self.figFile.findObjects(type = fig.PolylineBase)
+		self.figFile.remove(proxy[0])
+		self.assertRaises(ValueError, proxy.remove)
+		# all other objects have been removed nevertheless:
+		self.assertEqual(len(self.figFile.findObjects(type = fig.PolylineBase)), 0)
+
+	def testProxyRemoveObject(self):
+		proxy = self.figFile.findObjects(type = fig.PolylineBase)
+		obj = proxy[0]
+		proxy.remove(obj)
+		self.assertFalse(obj in proxy)
+		self.assertTrue(obj in list(self.figFile.allObjects()))
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""Tests for converting documents in memory with `File.render` and
+`File.renderTo` (most of them need fig2dev)."""
+
+import os, unittest, subprocess, tempfile, StringIO
+from distutils.spawn import find_executable
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+haveFig2dev = find_executable("fig2dev") is not None
+
+class RenderTest(unittest.TestCase):
+	def setUp(self):
+		self.figFile = fig.File(os.path.join(testDir, "figpy-testcase1.fig"))
+
+	@unittest.skipIf(haveFig2dev, "fig2dev is installed")
+	def testMissingFig2dev(self):
+		self.assertRaises(OSError, self.figFile.render, "eps")
+
+	@unittest.skipUnless(haveFig2dev, "needs fig2dev")
+	def testRender(self):
+		eps = self.figFile.render("eps")
+		self.assertTrue(eps.startswith("%!PS"))
+		self.assertTrue(self.figFile.render("fig").startswith("#FIG"))
+
+	@unittest.skipUnless(haveFig2dev, "needs fig2dev")
+	def testRenderTo(self):
+		expected = self.figFile.render("fig")
+		output = StringIO.StringIO()
+		self.figFile.renderTo(output, "fig")
+		self.assertEqual(output.getvalue(), expected)
+		outputFile = tempfile.TemporaryFile()
+		outputFile.write("prefix\n")
+		self.figFile.renderTo(outputFile, "fig")
+		outputFile.seek(0)
+		self.assertEqual(outputFile.read(), "prefix\n" + expected)
+
+	@unittest.skipUnless(haveFig2dev, "needs fig2dev")
+	def testFig2devError(self):
+		try:
+			self.figFile.render("no-such-language")
+		except subprocess.CalledProcessError, e:
+			self.assertTrue(e.output)
+		else:
+			self.fail("CalledProcessError not raised")
+
+	@unittest.skipUnless(haveFig2dev, "needs fig2dev")
+	def testWriteError(self):
+		# errors while writing the document are passed on:
+		for i in range(513):
+			self.figFile.addColor("#%06x" % i)
+		self.assertRaises(AssertionError, self.figFile.render, "eps")
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+"""Tests for the arrows shared between parsed objects in order to save
+memory, which must behave as if every object had its own copy."""
+
+import os, unittest, pickle, cPickle, copy
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+class SharingTest(unittest.TestCase):
+	def setUp(self):
+		self.filename = os.path.join(testDir, "figpy-testarrows.fig")
+		self.figFile = fig.File(self.filename)
+		self.arrowObjects = [o for o in self.figFile.allObjects()
+							 if o.forwardArrow is not None]
+		self.assertTrue(len(self.arrowObjects) > 1)
+
+	def testArrowCopyOnAccess(self):
+		first, second = self.arrowObjects[:2]
+		before = str(second.forwardArrow)
+		first.forwardArrow.width = 1234.0
+		self.assertEqual(first.forwardArrow.width, 1234.0)
+		self.assertEqual(str(second.forwardArrow), before)
+		self.assertTrue(first.forwardArrow is first.forwardArrow)
+
+	def testPickle(self):
+		expected = str(self.figFile)
+		for module in (pickle, cPickle):
+			for protocol in (0, 1, 2):
+				unpickled = module.loads(module.dumps(self.figFile, protocol))
+				self.assertEqual(str(unpickled), expected)
+				objects = [o for o in unpickled.allObjects()
+						   if o.forwardArrow is not None]
+				objects[0].forwardArrow.width = 1234.0
+				self.assertEqual(str(unpickled).count(" 1234.0 "), 1)
+
+	def testDeepCopy(self):
+		expected = str(self.figFile)
+		copied = copy.deepcopy(self.figFile)
+		self.assertEqual(str(copied), expected)
+		[o for o in copied.allObjects()
+		 if o.forwardArrow is not None][0].forwardArrow.width = 1234.0
+		self.assertEqual(str(self.figFile), expected)
+		self.assertEqual(str(copied).count(" 1234.0 "), 1)
+
+if __name__ == "__main__":
+	unittest.main()
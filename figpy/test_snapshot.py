@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""Tests for the binary snapshots of parsed documents written and
+loaded by ``File.open(filename, cache = True)``, which must only be
+used as long as they match the source file."""
+
+import os, unittest, tempfile, shutil
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+class SnapshotTest(unittest.TestCase):
+	def setUp(self):
+		self.tempDir = tempfile.mkdtemp()
+		self.filename = os.path.join(self.tempDir, "figpy-testcompounds.fig")
+		shutil.copy(os.path.join(testDir, "figpy-testcompounds.fig"),
+					self.filename)
+		self.snapshotFilename = os.path.join(self.tempDir, "figpy-testcompounds.figc")
+		self.reads = []
+		fig.addTracer(self.traced)
+
+	def tearDown(self):
+		fig.removeTracer(self.traced)
+		shutil.rmtree(self.tempDir)
+
+	def traced(self, event):
+		if event.operation == "read":
+			self.reads.append(event.filename)
+
+	def open(self, **kwargs):
+		"""Return File.open(..., cache = True) and whether the file
+		had to be parsed (i.e. the snapshot was not used)."""
+		del self.reads[:]
+		result = fig.File.open(self.filename, cache = True, **kwargs)
+		self.assertEqual(result.filename, self.filename)
+		return result, bool(self.reads)
+
+	def testSnapshotUsed(self):
+		for compactPoints in (False, True):
+			expected = str(fig.File(self.filename, compactPoints))
+			figFile, parsed = self.open(compactPoints = compactPoints)
+			self.assertTrue(parsed)
+			self.assertTrue(os.path.exists(self.snapshotFilename))
+			self.assertEqual(str(figFile), expected)
+			figFile, parsed = self.open(compactPoints = compactPoints)
+			self.assertFalse(parsed)
+			self.assertEqual(str(figFile), expected)
+			self.assertEqual(isinstance(list(figFile.allObjects())[0].points,
+										fig.PointArray), compactPoints)
+
+	def testSourceModified(self):
+		self.open()
+		figFile = fig.File(self.filename)
+		figFile[0].comment = "changed"
+		figFile.save()
+		figFile, parsed = self.open()
+		self.assertTrue(parsed)
+		self.assertEqual(figFile[0].comment.strip(), "changed")
+		figFile, parsed = self.open()
+		self.assertFalse(parsed)
+		self.assertEqual(figFile[0].comment.strip(), "changed")
+
+	def testTouched(self):
+		# only the modification time changed -> the hash still matches:
+		self.open()
+		os.utime(self.filename, (1, 1))
+		figFile, parsed = self.open()
+		self.assertFalse(parsed)
+
+	def testCorruptSnapshot(self):
+		self.open()
+		file(self.snapshotFilename, "wb").write("garbage")
+		figFile, parsed = self.open()
+		self.assertTrue(parsed)
+		self.assertEqual(str(figFile), str(fig.File(self.filename)))
+
+	def testModifyLoaded(self):
+		self.open()
+		figFile, parsed = self.open()
+		figFile.enableDepthIndex()
+		obj = list(figFile.allObjects())[-1]
+		obj.depth = 3
+		self.assertTrue(obj in list(figFile.layer(3)))
+		figFile.append(fig.Polyline([(0, 0), (10, 10)]))
+		self.assertTrue(figFile[-1].parentContainer() is figFile)
+
+if __name__ == "__main__":
+	unittest.main()
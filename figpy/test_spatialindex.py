@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""Tests for the spatial index (`Container.enableSpatialIndex`), whose
+query results must always match a brute-force scan over all objects,
+also after the document has been modified."""
+
+import os, unittest, StringIO
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+class SpatialIndexTest(unittest.TestCase):
+	def setUp(self):
+		self.figFile = fig.File(os.path.join(testDir, "figpy-testwalter.fig"))
+		self.figFile.enableSpatialIndex()
+		bounds = self.figFile.bounds()
+		w, h = bounds.width(), bounds.height()
+		self.rects = [fig.Rect(bounds.x1 + i * w / 4, bounds.y1 + j * h / 4,
+							   bounds.x1 + (i + 2) * w / 4, bounds.y1 + (j + 2) * h / 4)
+					  for i in range(3) for j in range(3)]
+		self.rects.append(fig.Rect(899000, -10**7, 901000, 10**7))
+
+	def check(self):
+		# compare with the bounds of a freshly parsed copy, so that
+		# stale cached bounds cannot hide a stale index:
+		objects = list(self.figFile.allObjects())
+		bounds = [o.bounds() for o in
+				  fig.File(StringIO.StringIO(str(self.figFile))).allObjects()]
+		self.assertEqual(len(bounds), len(objects))
+		for rect in self.rects:
+			self.assertEqual(
+				set(self.figFile.objectsIntersecting(rect)),
+				set([o for o, b in zip(objects, bounds) if rect.intersects(b)]))
+			self.assertEqual(
+				set(self.figFile.objectsWithin(rect)),
+				set([o for o, b in zip(objects, bounds) if rect.contains(b)]))
+
+	def polylines(self):
+		return [o for o in self.figFile.allObjects()
+				if isinstance(o, fig.PolylineBase)]
+
+	def testUnmodified(self):
+		self.check()
+
+	def testPointEdits(self):
+		self.check()
+		polylines = self.polylines()
+		polylines[0].points[0].x = 900000
+		self.check()
+		polylines[1].points[0][1] = -5000
+		self.check()
+		polylines[2].points.append(fig.Vector(900000, 0))
+		self.check()
+		for point in polylines[3].points:
+			point.x += 900000
+		self.check()
+
+	def testPointArrayEdits(self):
+		self.figFile = fig.File(os.path.join(testDir, "figpy-testwalter.fig"),
+								compactPoints = True)
+		self.figFile.enableSpatialIndex()
+		self.check()
+		self.polylines()[0].points[0].x = 900000
+		self.check()
+
+	def testObjectChanges(self):
+		self.check()
+		polyline = self.polylines()[0]
+		polyline.points = [fig.Vector(900000, 0), fig.Vector(900500, 10)]
+		self.check()
+		self.figFile.remove(polyline)
+		self.check()
+		self.figFile.append(polyline)
+		self.check()
+
+if __name__ == "__main__":
+	unittest.main()
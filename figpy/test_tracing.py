@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""Tests for tracing (`fig.addTracer`)."""
+
+from __future__ import with_statement
+
+import os, unittest, StringIO
+import fig
+
+testDir = os.path.dirname(os.path.abspath(__file__))
+
+class TracingTest(unittest.TestCase):
+	def setUp(self):
+		self.events = []
+		fig.addTracer(self.events.append)
+
+	def tearDown(self):
+		fig.removeTracer(self.events.append)
+
+	def testReadWrite(self):
+		filename = os.path.join(testDir, "figpy-testwalter.fig")
+		figFile = fig.File(filename)
+		figFile.write(StringIO.StringIO())
+		self.assertEqual([(e.operation, e.filename) for e in self.events],
+						 [("read", filename), ("write", filename)])
+		self.assertEqual(self.events[0].counts["lines"],
+						 self.events[1].counts["lines"])
+
+	def testFindObjects(self):
+		figFile = fig.File(os.path.join(testDir, "figpy-testwalter.fig"))
+		del self.events[:]
+		proxy = figFile.findObjects(type = fig.PolylineBase)
+		proxy.findObjects(depth = 50)
+		self.assertEqual([(e.operation, e.filename) for e in self.events],
+						 [("findObjects", figFile.filename),
+						  ("findObjects", None)])
+		self.assertEqual(self.events[0].counts["matched"], len(proxy))
+		self.assertEqual(self.events[1].counts["scanned"], len(proxy))
+
+	def testDisabled(self):
+		fig.removeTracer(self.events.append)
+		try:
+			fig.File(os.path.join(testDir, "figpy-testwalter.fig")).findObjects()
+		finally:
+			fig.addTracer(self.events.append)
+		self.assertEqual(self.events, [])
+
+	def testMetrics(self):
+		with fig.tracing() as metrics:
+			fig.File(os.path.join(testDir, "figpy-testwalter.fig"))
+		self.assertEqual(metrics.operations, ["read"])
+		self.assertEqual([e.operation for e in self.events], ["read"])
+
+if __name__ == "__main__":
+	unittest.main()